@@ -127,6 +127,11 @@ const ChatPage = () => {
                 if (typeof parsed.data === "string") {
                   setStatusMessages((prev) => [...prev, parsed.data]);
                 }
+              } else if (parsed.event === "queued") {
+                setStatusMessages((prev) => [
+                  ...prev,
+                  `Waiting in queue (position ${parsed.data?.position})`,
+                ]);
               } else if (parsed.event === "references") {
                 // save server-provided references to attach at the end
                 if (Array.isArray(parsed.data)) {
@@ -0,0 +1,11 @@
+from fastapi import APIRouter
+from fastapi.responses import Response
+from core.metrics import metrics, PROMETHEUS_CONTENT_TYPE
+
+router = APIRouter()
+
+
+@router.get("/metrics")
+def get_metrics():
+    """Prometheus scrape endpoint for stage timings, counters and gauges."""
+    return Response(metrics.render(), media_type=PROMETHEUS_CONTENT_TYPE)
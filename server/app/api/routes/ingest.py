@@ -0,0 +1,62 @@
+from fastapi import APIRouter, HTTPException, Request
+from core.admission import admission
+from core.sse import Verbosity, sse_response
+from models.api_models import CorpusIngestRequest
+from services.ingestion import CorpusFile, CorpusIngestion, INGEST_CONCURRENCY
+
+router = APIRouter()
+
+
+@router.post("/ingest-corpus-stream")
+async def ingest_corpus_stream(payload: CorpusIngestRequest, request: Request):
+    """
+    Ingest a list of PDFs in one run, streaming aggregate progress and ending
+    with a per-file summary of pages, chunks, vectors, entities and durations.
+    """
+    files = [
+        CorpusFile(
+            entry.file_url,
+            file_id=entry.file_id,
+            file_name=entry.file_name,
+            metadata=entry.metadata,
+        )
+        for entry in payload.files
+    ]
+    # Local paths are for the CLI only
+    if not files or not all(file.is_url for file in files):
+        raise HTTPException(400, "files must be a non-empty list of http(s) URLs")
+
+    # The run holds a single embed admission slot, so clients may only lower
+    # its concurrency, never raise it
+    concurrency = min(payload.concurrency or INGEST_CONCURRENCY, INGEST_CONCURRENCY)
+    ingestion = CorpusIngestion(
+        files,
+        user_id=payload.user_id,
+        batch_size=payload.batch_size,
+        concurrency=max(1, concurrency),
+        metadata=payload.metadata,
+    )
+
+    async def generate_status():
+        ticket = admission.ticket("embed", payload.user_id)
+        try:
+            async for position in ticket.wait():
+                yield {
+                    "status": "queued",
+                    "message": f"Waiting for a free slot (position {position})",
+                    "position": position,
+                }
+            async for event in ingestion.run():
+                yield event
+        except Exception as e:
+            yield {"status": "error", "message": str(e)}
+        finally:
+            ticket.release()
+
+    return sse_response(
+        generate_status(),
+        verbosity=Verbosity[payload.verbosity.upper()],
+        event_ids=payload.event_ids,
+        request=request,
+        detach_on_disconnect=payload.detach_on_disconnect,
+    )
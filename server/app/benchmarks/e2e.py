@@ -0,0 +1,311 @@
+"""
+End-to-end benchmark of /embed-pdf-stream and /query-stream on local fakes.
+
+Swaps the registry's Pinecone, Neo4j, LlamaParse and chat model clients for the
+stand-ins in benchmarks.fakes, serves generated PDFs over local HTTP, runs the
+app under uvicorn in a background thread and drives both endpoints at the
+requested concurrency. Results (pages/s, chunks/s, query latency and TTFT
+percentiles, mean stage timings) are written as JSON; pass --baseline with an
+earlier file to print the change per metric.
+
+    python -m benchmarks.e2e --files 8 --pages 6 --queries 200 --concurrency 16 \\
+        --output benchmarks/results/e2e.json --baseline benchmarks/results/e2e-main.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import httpx
+import orjson
+import uvicorn
+from benchmarks.fakes import (
+    FakeChatModel,
+    FakeGraphQAChain,
+    FakeGraphStore,
+    FakeGraphTransformer,
+    FakeParser,
+    FakeVectorIndex,
+    VOCABULARY,
+    make_pdf,
+)
+from core.registry import registry
+
+
+def install_fakes(args) -> dict:
+    # Import the app first so its modules register their real factories before we override them
+    import main  # noqa: F401
+    from services.model_router import get_model_router
+    from services.rate_limit import rate_limiter, Budget
+    from services.graph_schema import profile_names
+
+    fakes = {
+        "pinecone_index": FakeVectorIndex(
+            upsert_latency=args.upsert_ms / 1000, search_latency=args.search_ms / 1000
+        ),
+        "neo4j_graph": FakeGraphStore(),
+        "graph_qa_chain": FakeGraphQAChain(latency=args.cypher_ms / 1000),
+        "llama_parser": FakeParser(latency_per_page=args.parse_ms / 1000),
+        "gemini_model": FakeChatModel(
+            "gemini",
+            ttft=args.ttft_ms / 1000,
+            jitter=args.ttft_ms / 4000,
+            token_interval=1 / args.token_rate,
+            tokens=args.answer_tokens,
+        ),
+        "mistral_model": FakeChatModel(
+            "mistral",
+            ttft=args.ttft_ms / 1000 * 1.5,
+            token_interval=1 / args.token_rate,
+            tokens=args.answer_tokens,
+        ),
+    }
+    transformer = FakeGraphTransformer(latency=args.extract_ms / 1000)
+    for profile in profile_names():
+        fakes[f"llm_graph_transformer:{profile}"] = transformer
+    registry.reset()
+    for name, fake in fakes.items():
+        registry.register(name, lambda fake=fake: fake)
+    # Provider quotas are not what this benchmark measures
+    rate_limiter.budgets.clear()
+    if args.graph_pacing:
+        rate_limiter.budgets["mistral"] = Budget(60 / args.graph_pacing)
+    get_model_router.cache_clear()
+    return fakes
+
+
+def serve_pdfs(files: dict[str, bytes]) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = files.get(self.path.lstrip("/"))
+            if body is None:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "application/pdf")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def start_app() -> tuple[uvicorn.Server, str]:
+    import main
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(
+        uvicorn.Config(main.app, host="127.0.0.1", port=port, log_level="warning")
+    )
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, f"http://127.0.0.1:{port}"
+
+
+async def read_events(client: httpx.AsyncClient, path: str, payload: dict):
+    """Yield (seconds since request start, event) for every SSE data frame."""
+    started = time.perf_counter()
+    async with client.stream("POST", path, json=payload) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if line.startswith("data: "):
+                yield time.perf_counter() - started, orjson.loads(line[6:])
+
+
+def percentile(values: list[float], q: float) -> float | None:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 1)
+
+
+def mean_stage_ms(timings: list[dict]) -> dict:
+    totals: dict[str, float] = {}
+    for timing in timings:
+        for stage, entry in timing.get("stages", {}).items():
+            totals[stage] = totals.get(stage, 0.0) + entry["ms"]
+    return {stage: round(ms / len(timings), 1) for stage, ms in sorted(totals.items())}
+
+
+async def run_embed(client, pdf_base: str, args) -> dict:
+    semaphore = asyncio.Semaphore(args.concurrency)
+    pages = chunks = 0
+    durations, timings, errors = [], [], []
+
+    async def one(i: int):
+        nonlocal pages, chunks
+        payload = {
+            "user_id": f"bench-{i}",
+            "file_id": f"bench-{i}",
+            "file_url": f"{pdf_base}/file-{i}.pdf",
+            "file_name": f"file-{i}.pdf",
+            "batch_size": args.batch_size,
+            "verbosity": "batch",
+        }
+        async with semaphore:
+            async for elapsed, event in read_events(
+                client, "/embed-pdf-stream", payload
+            ):
+                status = event.get("status")
+                if status == "chunked":
+                    chunks += event["chunk_count"]
+                elif status == "completed":
+                    pages += event["total_pages"]
+                    durations.append(elapsed)
+                    timings.append(event["timings"])
+                elif status == "error":
+                    errors.append(event["message"])
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(args.files)))
+    wall = time.perf_counter() - started
+    return {
+        "files": args.files,
+        "pages": pages,
+        "chunks": chunks,
+        "errors": len(errors),
+        "error_samples": errors[:3],
+        "seconds": round(wall, 3),
+        "pages_per_second": round(pages / wall, 2),
+        "chunks_per_second": round(chunks / wall, 2),
+        "p50_file_ms": percentile(durations, 0.5),
+        "p99_file_ms": percentile(durations, 0.99),
+        "mean_stage_ms": mean_stage_ms(timings),
+    }
+
+
+async def run_queries(client, args) -> dict:
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies, ttfts, timings, errors = [], [], [], []
+
+    async def one(i: int):
+        payload = {
+            "query": " ".join(VOCABULARY[i % len(VOCABULARY) :][:4]),
+            "top_k": 5,
+            "model": "gemini",
+            "verbosity": "minimal",
+        }
+        first_token = None
+        async with semaphore:
+            async for elapsed, event in read_events(client, "/query-stream", payload):
+                kind = event.get("event")
+                if kind == "token" and first_token is None:
+                    first_token = elapsed
+                elif kind == "done":
+                    latencies.append(elapsed)
+                    timings.append(event["data"]["timings"])
+                elif kind == "error":
+                    errors.append(event["data"])
+        if first_token is not None:
+            ttfts.append(first_token)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(args.queries)))
+    wall = time.perf_counter() - started
+    return {
+        "queries": args.queries,
+        "errors": len(errors),
+        "error_samples": errors[:3],
+        "seconds": round(wall, 3),
+        "queries_per_second": round(args.queries / wall, 2),
+        "p50_latency_ms": percentile(latencies, 0.5),
+        "p99_latency_ms": percentile(latencies, 0.99),
+        "p50_ttft_ms": percentile(ttfts, 0.5),
+        "p99_ttft_ms": percentile(ttfts, 0.99),
+        "mean_stage_ms": mean_stage_ms(timings),
+    }
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def compare(current: dict, baseline: dict):
+    """Print the relative change of every numeric metric against a baseline run."""
+    for phase in ("embed", "query"):
+        for key, value in current[phase].items():
+            before = baseline.get(phase, {}).get(key)
+            if isinstance(value, (int, float)) and isinstance(before, (int, float)):
+                change = (value - before) / before * 100 if before else 0.0
+                print(f"{phase}.{key}: {before} -> {value} ({change:+.1f}%)")
+
+
+async def run(args) -> dict:
+    install_fakes(args)
+    pdfs = {f"file-{i}.pdf": make_pdf(args.pages, seed=i) for i in range(args.files)}
+    pdf_server = serve_pdfs(pdfs)
+    app_server, base_url = start_app()
+    pdf_base = f"http://127.0.0.1:{pdf_server.server_address[1]}"
+    try:
+        async with httpx.AsyncClient(base_url=base_url, timeout=None) as client:
+            embed = await run_embed(client, pdf_base, args)
+            query = await run_queries(client, args)
+    finally:
+        app_server.should_exit = True
+        pdf_server.shutdown()
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "config": vars(args),
+        "embed": embed,
+        "query": query,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--files", type=int, default=4)
+    parser.add_argument("--pages", type=int, default=6)
+    parser.add_argument("--batch-size", type=int, default=2)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--parse-ms", type=float, default=300, help="Per page")
+    parser.add_argument("--upsert-ms", type=float, default=20)
+    parser.add_argument("--search-ms", type=float, default=50)
+    parser.add_argument("--extract-ms", type=float, default=150)
+    parser.add_argument("--cypher-ms", type=float, default=300)
+    parser.add_argument("--ttft-ms", type=float, default=400)
+    parser.add_argument("--token-rate", type=float, default=80, help="Tokens/s")
+    parser.add_argument("--answer-tokens", type=int, default=60)
+    parser.add_argument(
+        "--graph-pacing", type=float, default=0, help="Seconds between extractions"
+    )
+    parser.add_argument("--output", default="benchmarks/results/e2e.json")
+    parser.add_argument("--baseline", default=None)
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(json.dumps({"embed": results["embed"], "query": results["query"]}, indent=2))
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+"""
+Deterministic local stand-ins for the external services, with configurable
+latency, for benchmarking without provider keys or network: chat models
+(`astream`/`stream`/`invoke` returning chunks with `.content`), the Pinecone
+text index, Neo4j graph store, LLMGraphTransformer, Cypher QA chain and
+LlamaParse. They mirror only the surface the services call.
+"""
+
+import asyncio
+import random
+import time
+import zlib
+from types import SimpleNamespace
+from services.retrieval import matches_filter
+
+
+class FakeChunk:
+    __slots__ = ("content",)
+
+    def __init__(self, content: str):
+        self.content = content
+
+
+class FakeChatModel:
+    """
+    Async chat model whose first token arrives after `ttft` seconds (with
+    `jitter` spread) and each later token `token_interval` seconds apart.
+    Fails before the first token with probability `fail_rate`.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        ttft: float = 0.2,
+        jitter: float = 0.0,
+        token_interval: float = 0.01,
+        tokens: int = 20,
+        fail_rate: float = 0.0,
+        seed: int | None = None,
+    ):
+        self.name = name
+        self.ttft = ttft
+        self.jitter = jitter
+        self.token_interval = token_interval
+        self.tokens = tokens
+        self.fail_rate = fail_rate
+        self.random = random.Random(seed)
+        self.calls = 0
+        self.cancelled = 0
+
+    def _first_delay(self) -> float:
+        return max(0.0, self.ttft + self.random.uniform(-self.jitter, self.jitter))
+
+    def _words(self):
+        return [f" {self.name}-{i}" for i in range(self.tokens)]
+
+    async def astream(self, messages):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self._first_delay())
+            if self.random.random() < self.fail_rate:
+                raise RuntimeError(f"{self.name} unavailable")
+            for i, word in enumerate(self._words()):
+                if i:
+                    await asyncio.sleep(self.token_interval)
+                yield FakeChunk(word)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+
+
+class FakeSyncChatModel(FakeChatModel):
+    """Blocking variant that only offers `stream` and `invoke`, like some providers."""
+
+    def __getattribute__(self, name):
+        if name == "astream":
+            raise AttributeError(name)
+        return super().__getattribute__(name)
+
+    def stream(self, messages):
+        self.calls += 1
+        time.sleep(self._first_delay())
+        if self.random.random() < self.fail_rate:
+            raise RuntimeError(f"{self.name} unavailable")
+        for i, word in enumerate(self._words()):
+            if i:
+                time.sleep(self.token_interval)
+            yield FakeChunk(word)
+
+    def invoke(self, messages):
+        return FakeChunk("".join(chunk.content for chunk in self.stream(messages)))
+
+
+def _terms(text: str) -> set[str]:
+    return {word.strip(".,:;()[]#*").lower() for word in text.split()} - {""}
+
+
+def _embed(text: str, dims: int = 64) -> list[float]:
+    # Hashed bag of words; stable across runs, unlike hash()
+    vector = [0.0] * dims
+    for term in _terms(text):
+        vector[zlib.crc32(term.encode()) % dims] += 1.0
+    norm = sum(v * v for v in vector) ** 0.5 or 1.0
+    return [v / norm for v in vector]
+
+
+class FakeVectorIndex:
+    """
+    In-memory stand-in for the Pinecone integrated-text index: `upsert_records`,
+    `search` (with metadata filters), `list`, `fetch` and `delete` with the
+    same record and hit shapes. Scores are term overlap, so results are
+    deterministic. Each call sleeps for the configured latency.
+    """
+
+    def __init__(self, upsert_latency: float = 0.02, search_latency: float = 0.05):
+        self.upsert_latency = upsert_latency
+        self.search_latency = search_latency
+        self.records: dict[str, dict] = {}
+        self._terms: dict[str, set[str]] = {}
+
+    def upsert_records(self, namespace: str, records: list[dict]):
+        time.sleep(self.upsert_latency)
+        for record in records:
+            self.records[record["_id"]] = record
+            self._terms[record["_id"]] = _terms(record["text"])
+
+    def search(self, namespace: str, query: dict):
+        time.sleep(self.search_latency)
+        terms = _terms(query["inputs"]["text"])
+        scored = sorted(
+            (
+                (len(terms & record_terms) / (len(terms | record_terms) or 1), _id)
+                for _id, record_terms in self._terms.items()
+                if matches_filter(self.records[_id], query.get("filter"))
+            ),
+            reverse=True,
+        )[: query.get("top_k", 5)]
+        hits = [
+            {
+                "_id": _id,
+                "_score": score,
+                "fields": {k: v for k, v in self.records[_id].items() if k != "_id"},
+            }
+            for score, _id in scored
+        ]
+        return SimpleNamespace(result=SimpleNamespace(hits=hits))
+
+    def fetch(self, ids: list[str], namespace: str = ""):
+        time.sleep(self.search_latency)
+        return SimpleNamespace(
+            vectors={
+                _id: SimpleNamespace(
+                    id=_id,
+                    values=_embed(self.records[_id]["text"]),
+                    metadata={k: v for k, v in self.records[_id].items() if k != "_id"},
+                )
+                for _id in ids
+                if _id in self.records
+            }
+        )
+
+    def delete(self, ids: list[str], namespace: str = ""):
+        for _id in ids:
+            self.records.pop(_id, None)
+            self._terms.pop(_id, None)
+
+    # Defined last so the name doesn't shadow `list` in the annotations above
+    def list(self, prefix: str = "", namespace: str = ""):
+        yield sorted(_id for _id in self.records if _id.startswith(prefix))
+
+
+class FakeGraphStore:
+    """Neo4jGraph stand-in that counts what `add_graph_documents` writes."""
+
+    def __init__(self, write_latency: float = 0.02):
+        self.write_latency = write_latency
+        self.documents = 0
+        self.nodes = 0
+        self.relationships = 0
+
+    def query(self, query: str, params: dict | None = None) -> list[dict]:
+        return []
+
+    def add_graph_documents(self, graph_documents, baseEntityLabel: bool = False):
+        time.sleep(self.write_latency)
+        self.documents += len(graph_documents)
+        for document in graph_documents:
+            self.nodes += len(document.nodes)
+            self.relationships += len(document.relationships)
+
+
+class FakeGraphTransformer:
+    """LLMGraphTransformer stand-in: longer terms of each chunk become a chain of nodes."""
+
+    def __init__(self, latency: float = 0.2):
+        self.latency = latency
+
+    async def aconvert_to_graph_documents(self, documents):
+        await asyncio.sleep(self.latency)
+        converted = []
+        for document in documents:
+            nodes = sorted({w for w in _terms(document.page_content) if len(w) > 6})[:8]
+            converted.append(
+                SimpleNamespace(
+                    nodes=nodes,
+                    relationships=list(zip(nodes, nodes[1:])),
+                    source=document,
+                )
+            )
+        return converted
+
+
+class FakeGraphQAChain:
+    """GraphCypherQAChain stand-in answering after a fixed latency."""
+
+    def __init__(self, latency: float = 0.3):
+        self.latency = latency
+
+    async def ainvoke(self, inputs: dict) -> dict:
+        await asyncio.sleep(self.latency)
+        return {"query": inputs["query"], "result": ""}
+
+
+class FakeParser:
+    """
+    LlamaParse stand-in: `aload_data` returns deterministic markdown for every
+    page of the PDF bytes it is given, after `latency_per_page` seconds each.
+    """
+
+    def __init__(self, latency_per_page: float = 0.5, words_per_page: int = 400):
+        self.latency_per_page = latency_per_page
+        self.words_per_page = words_per_page
+
+    async def aload_data(self, file_bytes: bytes, extra_info: dict | None = None):
+        import fitz
+
+        with fitz.open(stream=file_bytes, filetype="pdf") as doc:
+            pages = [page.get_text() for page in doc]
+        await asyncio.sleep(self.latency_per_page * len(pages))
+        return [
+            SimpleNamespace(text=markdown_page(text, self.words_per_page))
+            for text in pages
+        ]
+
+
+VOCABULARY = (
+    "patient dosage hypertension metformin renal clearance contraindicated "
+    "diagnosis cardiology infusion glucose insulin antibiotic amoxicillin "
+    "pharmacokinetics creatinine hepatic therapy adverse reaction trial"
+).split()
+
+
+def synthetic_text(seed: int, words: int) -> str:
+    rng = random.Random(seed)
+    return " ".join(rng.choice(VOCABULARY) for _ in range(words))
+
+
+def markdown_page(page_text: str, words: int) -> str:
+    seed = sum(page_text.encode()) if page_text else 0
+    paragraphs = [synthetic_text(seed + i, words // 4) for i in range(4)]
+    return (
+        "## "
+        + (page_text.strip().splitlines() or ["Page"])[0]
+        + "\n\n"
+        + "\n\n".join(paragraphs)
+    )
+
+
+def make_pdf(pages: int, seed: int = 0) -> bytes:
+    """A small text PDF with `pages` pages, built with PyMuPDF."""
+    import fitz
+
+    doc = fitz.open()
+    for number in range(pages):
+        page = doc.new_page()
+        page.insert_text((72, 72), f"Document {seed} page {number + 1}")
+        page.insert_textbox(
+            fitz.Rect(72, 100, 540, 760), synthetic_text(seed * 1000 + number, 120)
+        )
+    data = doc.tobytes()
+    doc.close()
+    return data
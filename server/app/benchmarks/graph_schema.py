@@ -0,0 +1,138 @@
+"""
+Extraction prompt size and latency per graph schema profile.
+
+By default it counts the tokens of the schema each profile adds to an
+LLMGraphTransformer prompt: the flat lib/graph.py list ("legacy"), every
+typed triple ("full") and the per-domain narrowed schemas. Counts use
+tiktoken's cl100k_base as a stand-in for the Mistral tokenizer, so compare
+profiles against each other rather than reading them as billed tokens.
+
+With --text, it also runs real extractions over chunks of that file with
+each requested profile, reporting the prompt tokens the provider billed and
+the extraction time. That needs MISTRAL_API_KEY and langchain_experimental.
+
+    python -m benchmarks.graph_schema
+    python -m benchmarks.graph_schema --text cardiology.md --profiles legacy,Cardiology --chunks 10
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from services.graph_schema import (
+    ALIASES,
+    DOMAIN_GROUPS,
+    full_schema,
+    profile_names,
+    transformer_kwargs,
+)
+
+
+def schema_prompt_text(kwargs: dict) -> str:
+    # With tool calling, the transformer puts the node labels and the distinct
+    # relationship types into the tool definition as enums; typed triples are
+    # only checked against its output (strict mode) and never reach the prompt.
+    relationships = kwargs["allowed_relationships"]
+    types = list(
+        dict.fromkeys(r if isinstance(r, str) else r[1] for r in relationships)
+    )
+    parts = [f"Available options are {types}"]
+    if kwargs.get("allowed_nodes"):
+        parts.append(f"Available options are {kwargs['allowed_nodes']}")
+    return "\n".join(parts)
+
+
+def static_report() -> dict:
+    import tiktoken
+    from lib.graph import allowed_relationships
+
+    encoding = tiktoken.get_encoding("cl100k_base")
+    schema = full_schema()
+    unmapped = [
+        rel
+        for rel in dict.fromkeys(allowed_relationships)
+        if rel not in ALIASES and rel not in schema.relationship_types
+    ]
+    profiles = {}
+    for profile in profile_names():
+        kwargs = transformer_kwargs(profile)
+        profiles[profile] = {
+            "node_labels": len(kwargs.get("allowed_nodes", [])),
+            "relationships": len(kwargs["allowed_relationships"]),
+            "schema_tokens": len(encoding.encode(schema_prompt_text(kwargs))),
+        }
+    legacy = profiles["legacy"]["schema_tokens"]
+    domains = [profiles[domain]["schema_tokens"] for domain in DOMAIN_GROUPS]
+    return {
+        "legacy_types": len(allowed_relationships),
+        "legacy_unique_types": len(set(allowed_relationships)),
+        "canonical_types": len(schema.relationship_types),
+        "unmapped_legacy_types": unmapped,
+        "profiles": profiles,
+        "mean_domain_schema_tokens": round(statistics.mean(domains), 1),
+        "mean_domain_reduction": round(1 - statistics.mean(domains) / legacy, 3),
+    }
+
+
+async def live_report(args) -> dict:
+    from langchain_core.callbacks import BaseCallbackHandler
+    from langchain_core.documents import Document
+    from langchain_experimental.graph_transformers import LLMGraphTransformer
+    from services.data_processing import get_text_splitter
+    from services.llm_models import get_mistral_model
+
+    class Usage(BaseCallbackHandler):
+        def __init__(self):
+            self.prompt_tokens = 0
+
+        def on_llm_end(self, response, **kwargs):
+            usage = (response.llm_output or {}).get("token_usage") or {}
+            self.prompt_tokens += usage.get("prompt_tokens", 0)
+
+    with open(args.text) as f:
+        chunks = get_text_splitter().split_text(f.read())[: args.chunks]
+    results = {}
+    for profile in args.profiles.split(","):
+        transformer = LLMGraphTransformer(
+            llm=get_mistral_model(), **transformer_kwargs(profile)
+        )
+        usage = Usage()
+        durations, nodes, relationships = [], 0, 0
+        for chunk in chunks:
+            started = time.perf_counter()
+            documents = await transformer.aconvert_to_graph_documents(
+                [Document(page_content=chunk)], config={"callbacks": [usage]}
+            )
+            durations.append(time.perf_counter() - started)
+            nodes += sum(len(doc.nodes) for doc in documents)
+            relationships += sum(len(doc.relationships) for doc in documents)
+            # Stay inside the provider's per-minute quota
+            await asyncio.sleep(args.pause)
+        results[profile] = {
+            "chunks": len(chunks),
+            "prompt_tokens_per_chunk": round(usage.prompt_tokens / len(chunks), 1),
+            "extract_p50_ms": round(statistics.median(durations) * 1000, 1),
+            "extract_mean_ms": round(statistics.mean(durations) * 1000, 1),
+            "nodes": nodes,
+            "relationships": relationships,
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--text", default=None, help="Markdown/text to extract from")
+    parser.add_argument("--profiles", default="legacy,full,default")
+    parser.add_argument("--chunks", type=int, default=5)
+    parser.add_argument("--pause", type=float, default=1.0)
+    args = parser.parse_args()
+
+    report = {"static": static_report()}
+    if args.text:
+        report["live"] = asyncio.run(live_report(args))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
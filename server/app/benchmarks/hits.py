@@ -0,0 +1,133 @@
+"""
+Post-processing cost of vector search hits: normalizing them, building the
+references and assembling the prompt context. Compares the per-hit loop
+query_stream used to run inline with services.hits, on synthetic Pinecone
+search responses. No network or provider keys needed.
+
+    python -m benchmarks.hits --top-k 5 50 200 --repeat 2000
+"""
+
+import argparse
+import json
+import random
+import timeit
+from types import SimpleNamespace
+from benchmarks.fakes import VOCABULARY
+from services.hits import build_hit_context, to_hits
+
+
+def make_response(top_k: int, seed: int = 0):
+    rng = random.Random(seed)
+    hits = []
+    for i in range(top_k):
+        start = rng.randint(1, 400)
+        hits.append(
+            {
+                "_id": f"file-{i % 7}_{start}_{start + 1}_{i}",
+                "_score": rng.random(),
+                "fields": {
+                    "text": " ".join(rng.choices(VOCABULARY, k=120)),
+                    "file_id": f"file-{i % 7}",
+                    "file_name": f"file-{i % 7}.pdf",
+                    "file_url": f"https://example.com/file-{i % 7}.pdf",
+                    "page_range": f"{start}_{start + 1}",
+                    "chunk_id": str(i),
+                },
+            }
+        )
+    return SimpleNamespace(result=SimpleNamespace(hits=hits))
+
+
+def legacy(response, top_k: int):
+    # The loop query_stream ran before services.hits, kept for comparison
+    references = []
+    vector_contexts = []
+    for rec in response.result.hits:
+        if "fields" in rec:
+            fields = rec["fields"]
+            text = fields.get("text", "")
+            file_id = fields.get("file_id")
+            file_name = fields.get("file_name")
+            file_url = fields.get("file_url")
+            page_range = fields.get("page_range")
+            chunk_id = fields.get("chunk_id")
+            level = fields.get("level", 0)
+            score = rec.get("_score")
+        else:
+            text = rec.get("text") or rec.get("values") or ""
+            file_id = rec.get("file_id")
+            file_name = rec.get("file_name")
+            file_url = rec.get("file_url")
+            page_range = rec.get("page_range")
+            chunk_id = rec.get("chunk_id")
+            level = rec.get("level", 0)
+            score = rec.get("score")
+        page_tuple = None
+        try:
+            if isinstance(page_range, str) and "_" in page_range:
+                s, e = page_range.split("_", 1)
+                page_tuple = (int(s), int(e))
+            elif isinstance(page_range, (list, tuple)) and len(page_range) == 2:
+                page_tuple = (int(page_range[0]), int(page_range[1]))
+        except Exception:
+            page_tuple = None
+        references.append(
+            {
+                "file_id": file_id,
+                "file_name": file_name,
+                "file_url": file_url,
+                "page_range": page_tuple,
+                "chunk_id": chunk_id,
+                "level": level,
+                "score": score,
+                "source": "vector_db",
+            }
+        )
+        if text:
+            vector_contexts.append(text)
+    parts = []
+    for idx, (context, ref) in enumerate(
+        zip(vector_contexts[:top_k], references[:top_k]), 1
+    ):
+        ref_info = f"[Reference {idx}]\n"
+        if ref.get("file_name"):
+            ref_info += f"File: {ref['file_name']}\n"
+        if ref.get("file_url"):
+            ref_info += f"URL: {ref['file_url']}\n"
+        if ref.get("page_range"):
+            ref_info += f"Pages: {ref['page_range'][0]}-{ref['page_range'][1]}\n"
+        ref_info += f"Content: {context}"
+        parts.append(ref_info)
+    return references, "\n\n---\n\n".join(parts)
+
+
+def current(response, top_k: int):
+    hits = to_hits(response)
+    references = [hit.reference() for hit in hits]
+    return references, build_hit_context([hit for hit in hits[:top_k] if hit.text])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--top-k", type=int, nargs="+", default=[5, 50, 200])
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    results = []
+    for top_k in args.top_k:
+        response = make_response(top_k)
+        # Same prompt either way (references now carry integer chunk ids)
+        assert legacy(response, top_k)[1] == current(response, top_k)[1]
+        timings = {}
+        for name, fn in (("legacy", legacy), ("hits", current)):
+            seconds = min(
+                timeit.repeat(lambda: fn(response, top_k), number=args.repeat, repeat=5)
+            )
+            timings[f"{name}_us"] = round(seconds / args.repeat * 1e6, 1)
+        timings["speedup"] = round(timings["legacy_us"] / timings["hits_us"], 2)
+        results.append({"top_k": top_k, **timings})
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
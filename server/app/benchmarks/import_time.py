@@ -0,0 +1,93 @@
+"""
+Import-time budget for the API and worker entry points.
+
+Runs `python -X importtime -c "import <module>"` in a fresh interpreter, reports
+the cumulative time and the slowest top-level imports, and exits non-zero if
+the budget is exceeded or a module that should load lazily was imported.
+Intended to run in CI next to the load benchmarks.
+
+    python -m benchmarks.import_time --module main --budget-ms 1500
+"""
+
+import argparse
+import json
+import re
+import subprocess
+import sys
+
+# Heavy clients that must only be imported on first use
+LAZY_MODULES = (
+    "fitz",
+    "langchain",
+    "langchain_core",
+    "langchain_experimental",
+    "langchain_neo4j",
+    "llama_cloud_services",
+    "llama_index",
+    "pinecone",
+)
+
+LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def measure(module: str) -> list[tuple[int, int, str]]:
+    """(self_us, cumulative_us, depth, name) for every import, in import order."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise SystemExit(result.stderr.strip().splitlines()[-1])
+    rows = []
+    for line in result.stderr.splitlines():
+        match = LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            rows.append((int(self_us), int(cumulative_us), len(indent) // 2, name))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--module", action="append", default=None)
+    parser.add_argument("--budget-ms", type=float, default=1500)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    failed = False
+    for module in args.module or ["main", "workers.runtime"]:
+        rows = measure(module)
+        total_ms = next(c for _, c, _, name in reversed(rows) if name == module) / 1000
+        # Direct imports of the module sit one level below it in the tree
+        depth = module.count(".") + 1
+        top_level = sorted(
+            (row for row in rows if row[2] == depth),
+            key=lambda row: row[1],
+            reverse=True,
+        )
+        eager = sorted(
+            {name for *_, name in rows if name.split(".")[0] in LAZY_MODULES}
+        )
+        over_budget = total_ms > args.budget_ms
+        failed |= over_budget or bool(eager)
+        print(
+            json.dumps(
+                {
+                    "module": module,
+                    "total_ms": round(total_ms, 1),
+                    "budget_ms": args.budget_ms,
+                    "over_budget": over_budget,
+                    "eager_heavy_imports": eager,
+                    "slowest": [
+                        {"name": name, "ms": round(cumulative / 1000, 1)}
+                        for _, cumulative, _, name in top_level[: args.top]
+                    ],
+                }
+            )
+        )
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Time-to-first-token under a slow or flaky primary model, with and without the
+router's fallback and hedging. Uses fake chat models, so no provider keys or
+network are needed.
+
+    python -m benchmarks.model_routing --requests 200 --slow-rate 0.1 --hedge-after 0.5
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from benchmarks.fakes import FakeChatModel
+from services.model_router import ModelRouter
+from services.rate_limit import rate_limiter
+
+
+class SlowSometimes(FakeChatModel):
+    """Primary that stalls for `stall` seconds on a fraction of requests."""
+
+    def __init__(self, *args, slow_rate: float, stall: float, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.slow_rate = slow_rate
+        self.stall = stall
+
+    def _first_delay(self) -> float:
+        if self.random.random() < self.slow_rate:
+            return self.stall
+        return super()._first_delay()
+
+
+def make_models(args) -> dict:
+    return {
+        "gemini": SlowSometimes(
+            "gemini",
+            ttft=0.15,
+            jitter=0.05,
+            fail_rate=args.fail_rate,
+            slow_rate=args.slow_rate,
+            stall=args.stall,
+            seed=1,
+        ),
+        "mistral": FakeChatModel("mistral", ttft=0.3, jitter=0.1, seed=2),
+    }
+
+
+async def run_mode(label: str, hedge_after: float | None, args) -> dict:
+    models = make_models(args)
+    router = ModelRouter(models, policy="preferred", hedge_after=hedge_after)
+    semaphore = asyncio.Semaphore(args.concurrency)
+    ttfts, errors = [], 0
+
+    async def one():
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                async for _ in router.stream([], preferred="gemini"):
+                    ttfts.append(time.perf_counter() - started)
+                    break
+            except Exception:
+                errors += 1
+
+    await asyncio.gather(*(one() for _ in range(args.requests)))
+    ttfts.sort()
+
+    def pct(q):
+        return (
+            round(ttfts[min(len(ttfts) - 1, int(q * len(ttfts)))], 3) if ttfts else None
+        )
+
+    return {
+        "mode": label,
+        "requests": args.requests,
+        "errors": errors,
+        "p50_ttft": pct(0.5),
+        "p95_ttft": pct(0.95),
+        "p99_ttft": pct(0.99),
+        "hedges": router.hedges,
+        "hedge_wins": router.hedge_wins,
+        "cancelled_streams": sum(m.cancelled for m in models.values()),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--slow-rate", type=float, default=0.1)
+    parser.add_argument("--stall", type=float, default=3.0)
+    parser.add_argument("--fail-rate", type=float, default=0.05)
+    parser.add_argument("--hedge-after", type=float, default=0.5)
+    args = parser.parse_args()
+    random.seed(0)
+    # Provider quotas are not what this benchmark measures
+    rate_limiter.budgets.clear()
+
+    print(json.dumps(await run_mode("fallback_only", None, args)))
+    print(json.dumps(await run_mode("hedged", args.hedge_after, args)))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
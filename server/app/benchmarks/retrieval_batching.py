@@ -0,0 +1,98 @@
+"""
+Throughput and latency of concurrent vector searches, one backend call per
+request versus the RetrievalBatcher. Uses the local backend over a synthetic
+index with a fake query embedder whose cost is mostly a fixed round trip,
+like a hosted embedding API, so no provider keys or network are needed.
+
+    python -m benchmarks.retrieval_batching --records 50000 --clients 64 --window-ms 3
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+from benchmarks.fakes import VOCABULARY, _embed
+from core.registry import registry
+from services.retrieval import LocalVectorIndex, RetrievalBatcher
+
+
+def make_index(records: int, dims: int, seed: int = 0) -> LocalVectorIndex:
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    matrix = rng.standard_normal((records, dims)).astype(np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    fields = [
+        {"text": f"chunk {i}", "file_id": f"file-{i % 50}", "chunk_id": str(i)}
+        for i in range(records)
+    ]
+    return LocalVectorIndex([f"r{i}" for i in range(records)], matrix, fields)
+
+
+def make_embedder(dims: int, round_trip: float, per_text: float):
+    def embed(texts: list[str]) -> list[list[float]]:
+        time.sleep(round_trip + per_text * len(texts))
+        return [_embed(text, dims) for text in texts]
+
+    return embed
+
+
+async def run(args, batched: bool) -> dict:
+    index = registry.get("retrieval_backend")
+    batcher = RetrievalBatcher(window_ms=args.window_ms, max_batch=args.max_batch)
+    rng = random.Random(1)
+    latencies = []
+
+    async def search(query: str):
+        started = time.perf_counter()
+        if batched:
+            await batcher.search(query, args.top_k)
+        else:
+            await asyncio.to_thread(index.search_batch, [(query, args.top_k, None)])
+        latencies.append(time.perf_counter() - started)
+
+    async def client():
+        for _ in range(args.queries):
+            await search(" ".join(rng.choices(VOCABULARY, k=8)))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(args.clients)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "mode": "batched" if batched else "per_request",
+        "qps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "p99_ms": round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--records", type=int, default=50000)
+    parser.add_argument("--dims", type=int, default=384)
+    parser.add_argument("--clients", type=int, default=64)
+    parser.add_argument("--queries", type=int, default=20, help="Per client")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--window-ms", type=float, default=3)
+    parser.add_argument("--max-batch", type=int, default=32)
+    parser.add_argument("--embed-ms", type=float, default=30, help="Round trip")
+    parser.add_argument("--embed-per-text-ms", type=float, default=0.5)
+    args = parser.parse_args()
+
+    index = make_index(args.records, args.dims)
+    embedder = make_embedder(
+        args.dims, args.embed_ms / 1000, args.embed_per_text_ms / 1000
+    )
+    registry.register("retrieval_backend", lambda: index)
+    registry.register("query_embedder", lambda: embedder)
+    registry.reset()
+
+    results = [asyncio.run(run(args, batched)) for batched in (False, True)]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""
+Load test for query token streaming over Redis pub/sub.
+
+Simulates many concurrent queries emitting LLM tokens and compares one PUBLISH
+per token against TokenChannel frame coalescing. Every channel's received text
+(and with --stream, its stream backlog) is checked against what was published,
+so dropped or reordered tokens show up as mismatches. Runs against fakeredis by
+default, or a real server with --redis-url.
+
+    python -m benchmarks.token_stream_load --queries 200 --tokens 300 --rate 40
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import defaultdict
+from services.token_stream import TokenChannel, read_stream_backlog
+
+WORDS = ["the", " patient", " mg", " renal", "."]
+
+
+def make_redis(redis_url: str | None):
+    if redis_url:
+        import redis.asyncio
+
+        return redis.asyncio.Redis.from_url(redis_url, decode_responses=True)
+    try:
+        import fakeredis
+    except ImportError:
+        raise SystemExit("Install fakeredis or pass --redis-url")
+    return fakeredis.FakeAsyncRedis(decode_responses=True)
+
+
+class NaivePublisher:
+    """Baseline: one PUBLISH and one json.dumps per token, as query_worker used to do."""
+
+    def __init__(self, redis, channel: str):
+        self.redis = redis
+        self.channel = channel
+        self.round_trips = 0
+
+    async def token(self, text: str):
+        await self.redis.publish(
+            self.channel, json.dumps({"event": "token", "data": text})
+        )
+        self.round_trips += 1
+
+    async def aclose(self):
+        pass
+
+
+async def run_query(publisher, tokens: int, rate: float, published: list[str]):
+    interval = 1 / rate
+    for i in range(tokens):
+        # Numbered so a dropped or reordered token changes the joined text
+        text = f"{random.choice(WORDS)}#{i}"
+        published.append(text)
+        await publisher.token(text)
+        await asyncio.sleep(random.expovariate(1 / interval))
+    await publisher.aclose()
+
+
+async def subscriber(redis, received: dict, ready: asyncio.Event):
+    pubsub = redis.pubsub()
+    await pubsub.psubscribe("bench:*")
+    ready.set()
+    async for message in pubsub.listen():
+        if message["type"] != "pmessage":
+            continue
+        frame = json.loads(message["data"])
+        received["frames"] += 1
+        received["chars"] += len(frame.get("data", ""))
+        received["text"][message["channel"]].append(frame.get("data", ""))
+
+
+def count_mismatches(published: dict[str, list[str]], received: dict) -> int:
+    return sum(
+        "".join(received["text"].get(channel, [])) != "".join(tokens)
+        for channel, tokens in published.items()
+    )
+
+
+async def stream_mismatches(redis, published: dict[str, list[str]]) -> int:
+    mismatches = 0
+    for channel, tokens in published.items():
+        frames = await read_stream_backlog(redis, f"{channel}:frames")
+        text = "".join(frame.get("data", "") for frame in frames)
+        mismatches += text != "".join(tokens)
+    return mismatches
+
+
+async def run_mode(mode: str, args) -> dict:
+    redis = make_redis(args.redis_url)
+    received = {"frames": 0, "chars": 0, "text": defaultdict(list)}
+    ready = asyncio.Event()
+    listener = asyncio.create_task(subscriber(redis, received, ready))
+    await ready.wait()
+
+    publishers = []
+    for i in range(args.queries):
+        channel = f"bench:{mode}:{i}"
+        if mode == "naive":
+            publishers.append(NaivePublisher(redis, channel))
+        else:
+            publishers.append(
+                TokenChannel(
+                    redis,
+                    channel,
+                    flush_interval=args.flush_ms / 1000,
+                    max_frame_bytes=args.frame_bytes,
+                    stream_key=f"{channel}:frames" if args.stream else None,
+                )
+            )
+
+    published = {publisher.channel: [] for publisher in publishers}
+    started = time.perf_counter()
+    await asyncio.gather(
+        *(
+            run_query(p, args.tokens, args.rate, published[p.channel])
+            for p in publishers
+        )
+    )
+    elapsed = time.perf_counter() - started
+    # Let the subscriber drain, up to a couple of seconds
+    for _ in range(40):
+        if not count_mismatches(published, received):
+            break
+        await asyncio.sleep(0.05)
+    listener.cancel()
+
+    round_trips = sum(p.round_trips for p in publishers)
+    return {
+        "mode": mode,
+        "queries": args.queries,
+        "tokens": args.queries * args.tokens,
+        "round_trips": round_trips,
+        "frames_received": received["frames"],
+        "chars_received": received["chars"],
+        "mismatched_channels": count_mismatches(published, received),
+        **(
+            {"mismatched_streams": await stream_mismatches(redis, published)}
+            if args.stream and mode != "naive"
+            else {}
+        ),
+        "seconds": round(elapsed, 3),
+        "round_trips_per_second": round(round_trips / elapsed, 1),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--tokens", type=int, default=200)
+    parser.add_argument(
+        "--rate", type=float, default=40, help="Tokens per second per query"
+    )
+    parser.add_argument("--flush-ms", type=float, default=20)
+    parser.add_argument("--frame-bytes", type=int, default=256)
+    parser.add_argument(
+        "--stream", action="store_true", help="Also XADD to Redis Streams"
+    )
+    parser.add_argument("--redis-url", default=None)
+    args = parser.parse_args()
+
+    for mode in ("naive", "coalesced"):
+        print(json.dumps(await run_mode(mode, args)))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
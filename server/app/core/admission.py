@@ -0,0 +1,195 @@
+import asyncio
+import os
+import time
+from collections import deque
+from typing import AsyncIterator
+from core.metrics import metrics
+
+# Total requests doing work at once, across all classes
+ADMISSION_MAX_ACTIVE = int(os.getenv("ADMISSION_MAX_ACTIVE", "32"))
+# How often a queued request re-reports its position
+POSITION_UPDATE_SECONDS = 1.0
+
+
+class RequestClass:
+    """Limits and scheduling weight for one kind of work (e.g. query, embed)."""
+
+    def __init__(self, name: str, weight: float, max_active: int, max_per_user: int):
+        self.name = name
+        self.weight = weight
+        self.max_active = max_active
+        self.max_per_user = max_per_user
+        self.active = 0
+        self.active_by_user: dict[str, int] = {}
+        self.waiting: deque["Ticket"] = deque()
+        # Stride scheduling: the eligible class with the lowest pass goes next
+        self.pass_value = 0.0
+
+    def user_has_room(self, user_id: str | None) -> bool:
+        return (
+            user_id is None or self.active_by_user.get(user_id, 0) < self.max_per_user
+        )
+
+
+class Ticket:
+    """One request's place in the admission queue, then its active slot."""
+
+    def __init__(self, controller: "AdmissionController", cls: RequestClass, user_id):
+        self.controller = controller
+        self.cls = cls
+        self.user_id = user_id
+        self.granted = asyncio.Event()
+        self.released = False
+        self.enqueued_at = time.perf_counter()
+
+    @property
+    def position(self) -> int:
+        try:
+            return self.cls.waiting.index(self) + 1
+        except ValueError:
+            return 0
+
+    async def wait(self) -> AsyncIterator[int]:
+        """Wait for a slot, yielding the queue position whenever it changes."""
+        self.controller._enqueue(self)
+        last_position = None
+        while not self.granted.is_set():
+            position = self.position
+            if position != last_position:
+                last_position = position
+                yield position
+            try:
+                await asyncio.wait_for(self.granted.wait(), POSITION_UPDATE_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+        metrics.histogram(
+            "admission_wait_seconds",
+            {"class": self.cls.name},
+            help="Time requests spent queued for admission",
+        ).observe(time.perf_counter() - self.enqueued_at)
+
+    def release(self):
+        """Free the slot, or leave the queue if it was never granted. Idempotent."""
+        if not self.released:
+            self.released = True
+            self.controller._release(self)
+
+
+class AdmissionController:
+    """
+    Caps concurrent work overall, per request class and per user. Requests
+    over a limit wait in their class's FIFO queue; when a slot frees, classes
+    are served by weighted fair queueing (stride scheduling), so interactive
+    queries get most of the freed capacity without starving ingestion. Within
+    a class, a waiter whose user is at their limit is skipped, not blocking
+    the users behind it.
+    """
+
+    def __init__(self, classes: list[RequestClass], max_active: int):
+        self.classes = {cls.name: cls for cls in classes}
+        self.max_active = max_active
+        self.active = 0
+        metrics.register_collector(self.collect)
+
+    def ticket(self, class_name: str, user_id: str | None = None) -> Ticket:
+        return Ticket(self, self.classes[class_name], user_id)
+
+    def _enqueue(self, ticket: Ticket):
+        cls = ticket.cls
+        if not cls.waiting:
+            # A class returning from idle must not cash in the time it was away
+            others = [c.pass_value for c in self.classes.values() if c.waiting]
+            if others:
+                cls.pass_value = max(cls.pass_value, min(others))
+        cls.waiting.append(ticket)
+        self._dispatch()
+
+    def _release(self, ticket: Ticket):
+        cls = ticket.cls
+        if ticket.granted.is_set():
+            self.active -= 1
+            cls.active -= 1
+            if ticket.user_id is not None:
+                remaining = cls.active_by_user[ticket.user_id] - 1
+                if remaining:
+                    cls.active_by_user[ticket.user_id] = remaining
+                else:
+                    del cls.active_by_user[ticket.user_id]
+        else:
+            try:
+                cls.waiting.remove(ticket)
+            except ValueError:
+                pass
+        self._dispatch()
+
+    def _next_eligible(self, cls: RequestClass) -> Ticket | None:
+        if cls.active >= cls.max_active:
+            return None
+        for ticket in cls.waiting:
+            if cls.user_has_room(ticket.user_id):
+                return ticket
+        return None
+
+    def _dispatch(self):
+        while self.active < self.max_active:
+            candidates = []
+            for cls in self.classes.values():
+                ticket = self._next_eligible(cls)
+                if ticket is not None:
+                    candidates.append((cls.pass_value, cls.name, ticket))
+            if not candidates:
+                return
+            _, _, ticket = min(candidates, key=lambda c: (c[0], c[1]))
+            self._grant(ticket)
+
+    def _grant(self, ticket: Ticket):
+        cls = ticket.cls
+        cls.waiting.remove(ticket)
+        cls.pass_value += 1 / cls.weight
+        cls.active += 1
+        self.active += 1
+        if ticket.user_id is not None:
+            cls.active_by_user[ticket.user_id] = (
+                cls.active_by_user.get(ticket.user_id, 0) + 1
+            )
+        ticket.granted.set()
+
+    def collect(self):
+        for cls in self.classes.values():
+            yield "admission_active", {"class": cls.name}, cls.active
+            yield "admission_queued", {"class": cls.name}, len(cls.waiting)
+
+    def snapshot(self) -> dict:
+        return {
+            "active": self.active,
+            "max_active": self.max_active,
+            "classes": {
+                cls.name: {
+                    "active": cls.active,
+                    "queued": len(cls.waiting),
+                    "max_active": cls.max_active,
+                    "max_per_user": cls.max_per_user,
+                    "weight": cls.weight,
+                }
+                for cls in self.classes.values()
+            },
+        }
+
+
+admission = AdmissionController(
+    [
+        RequestClass(
+            "query",
+            weight=float(os.getenv("ADMISSION_QUERY_WEIGHT", "4")),
+            max_active=int(os.getenv("ADMISSION_QUERY_LIMIT", "24")),
+            max_per_user=int(os.getenv("ADMISSION_USER_QUERY_LIMIT", "4")),
+        ),
+        RequestClass(
+            "embed",
+            weight=float(os.getenv("ADMISSION_EMBED_WEIGHT", "1")),
+            max_active=int(os.getenv("ADMISSION_EMBED_LIMIT", "4")),
+            max_per_user=int(os.getenv("ADMISSION_USER_EMBED_LIMIT", "1")),
+        ),
+    ],
+    max_active=ADMISSION_MAX_ACTIVE,
+)
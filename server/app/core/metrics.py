@@ -0,0 +1,280 @@
+import functools
+import inspect
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Iterable
+
+# Seconds; covers cache hits through multi-minute LlamaParse jobs
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300,
+)  # fmt: skip
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+Labels = tuple[tuple[str, str], ...]
+
+
+def _labels(labels: dict | None) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in (labels or {}).items()))
+
+
+def _format_labels(labels: Labels, extra: tuple[str, str] | None = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (
+        k
+        + '="'
+        + v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        + '"'
+        for k, v in pairs
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+class Counter:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count", "_lock")
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+
+class MetricsRegistry:
+    """
+    Process-wide counters and histograms, rendered in the Prometheus text
+    format. Updates are a dict lookup plus a short lock, cheap enough to leave
+    on. Collectors let other modules expose their own counters at scrape time.
+    """
+
+    def __init__(self):
+        self._counters: dict[str, dict[Labels, Counter]] = {}
+        self._histograms: dict[str, dict[Labels, Histogram]] = {}
+        self._help: dict[str, str] = {}
+        self._collectors: list[Callable[[], Iterable[tuple[str, dict, float]]]] = []
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, labels: dict | None = None, help: str = "") -> Counter:
+        key = _labels(labels)
+        series = self._counters.get(name, {})
+        metric = series.get(key)
+        if metric is None:
+            with self._lock:
+                series = self._counters.setdefault(name, {})
+                metric = series.setdefault(key, Counter())
+                if help:
+                    self._help.setdefault(name, help)
+        return metric
+
+    def histogram(
+        self, name: str, labels: dict | None = None, help: str = ""
+    ) -> Histogram:
+        key = _labels(labels)
+        series = self._histograms.get(name, {})
+        metric = series.get(key)
+        if metric is None:
+            with self._lock:
+                series = self._histograms.setdefault(name, {})
+                metric = series.setdefault(key, Histogram())
+                if help:
+                    self._help.setdefault(name, help)
+        return metric
+
+    def register_collector(
+        self, collector: Callable[[], Iterable[tuple[str, dict, float]]]
+    ):
+        """`collector()` yields (name, labels, value) gauges at scrape time."""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for name, series in sorted(self._counters.items()):
+            self._header(lines, name, "counter")
+            for labels, metric in series.items():
+                lines.append(f"{name}{_format_labels(labels)} {metric.value}")
+
+        for name, series in sorted(self._histograms.items()):
+            self._header(lines, name, "histogram")
+            for labels, metric in series.items():
+                cumulative = 0
+                for bound, count in zip(metric.buckets, metric.counts):
+                    cumulative += count
+                    bucket = _format_labels(labels, ("le", str(bound)))
+                    lines.append(f"{name}_bucket{bucket} {cumulative}")
+                bucket = _format_labels(labels, ("le", "+Inf"))
+                lines.append(f"{name}_bucket{bucket} {metric.count}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {metric.sum}")
+                lines.append(f"{name}_count{_format_labels(labels)} {metric.count}")
+
+        gauges: dict[str, list[str]] = {}
+        for collector in self._collectors:
+            for name, labels, value in collector():
+                gauges.setdefault(name, []).append(
+                    f"{name}{_format_labels(_labels(labels))} {value}"
+                )
+        for name, samples in sorted(gauges.items()):
+            self._header(lines, name, "gauge")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+    def _header(self, lines: list[str], name: str, kind: str):
+        if name in self._help:
+            lines.append(f"# HELP {name} {self._help[name]}")
+        lines.append(f"# TYPE {name} {kind}")
+
+
+metrics = MetricsRegistry()
+
+
+class RequestTrace:
+    """Per-request stage timings, summarized on the final SSE event."""
+
+    __slots__ = ("started", "stages")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: dict[str, list[float]] = {}
+
+    def add(self, stage: str, seconds: float):
+        entry = self.stages.get(stage)
+        if entry is None:
+            self.stages[stage] = [seconds, 1]
+        else:
+            entry[0] += seconds
+            entry[1] += 1
+
+    def summary(self) -> dict:
+        return {
+            "total_ms": round((time.perf_counter() - self.started) * 1000, 1),
+            "stages": {
+                stage: {"ms": round(seconds * 1000, 1), "count": int(count)}
+                for stage, (seconds, count) in self.stages.items()
+            },
+        }
+
+
+_current_trace: ContextVar[RequestTrace | None] = ContextVar(
+    "request_trace", default=None
+)
+
+
+def start_trace() -> RequestTrace:
+    """Begin collecting stage timings for the current request (task)."""
+    trace = RequestTrace()
+    _current_trace.set(trace)
+    return trace
+
+
+def current_trace() -> RequestTrace | None:
+    return _current_trace.get()
+
+
+def observe_stage(stage: str, seconds: float):
+    metrics.histogram(
+        "stage_duration_seconds",
+        {"stage": stage},
+        help="Time spent per pipeline stage",
+    ).observe(seconds)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(stage, seconds)
+
+
+class timed:
+    """
+    Time a block as a pipeline stage, with `with`, `async with` or as a
+    decorator on sync and async functions. Failures are counted in
+    `stage_errors_total`.
+    """
+
+    __slots__ = ("stage", "started")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        observe_stage(self.stage, time.perf_counter() - self.started)
+        # Cancellation is not a failure of the stage
+        if exc_type is not None and issubclass(exc_type, Exception):
+            metrics.counter(
+                "stage_errors_total",
+                {"stage": self.stage, "error": exc_type.__name__},
+                help="Pipeline stage failures",
+            ).inc()
+        return False
+
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return self.__exit__(exc_type, exc, tb)
+
+    def __call__(self, func):
+        stage = self.stage
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with timed(stage):
+                    return await func(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timed(stage):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        body = metrics.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", PROMETHEUS_CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_metrics(port: int) -> ThreadingHTTPServer:
+    """Expose /metrics from processes without an HTTP app, such as workers."""
+    server = ThreadingHTTPServer(("0.0.0.0", port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,51 @@
+import threading
+import time
+from typing import Any, Callable
+from core.logger import get_logger
+
+logger = get_logger()
+
+
+class LazyRegistry:
+    """
+    Named factories for expensive clients (LLMs, Neo4j, Pinecone, LlamaParse,
+    Redis). Nothing is built until the first `get`, so importing a module that
+    registers a client costs nothing; the result is cached for the process.
+    A factory that raises is retried on the next `get`.
+    """
+
+    def __init__(self):
+        self._factories: dict[str, Callable[[], Any]] = {}
+        self._instances: dict[str, Any] = {}
+        self._lock = threading.RLock()
+        self.init_seconds: dict[str, float] = {}
+
+    def register(self, name: str, factory: Callable[[], Any]):
+        self._factories[name] = factory
+
+    def get(self, name: str) -> Any:
+        try:
+            return self._instances[name]
+        except KeyError:
+            pass
+        with self._lock:
+            if name not in self._instances:
+                started = time.perf_counter()
+                self._instances[name] = self._factories[name]()
+                self.init_seconds[name] = time.perf_counter() - started
+                logger.info(f"Initialized {name} in {self.init_seconds[name]:.2f}s")
+            return self._instances[name]
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._instances
+
+    def reset(self, name: str | None = None):
+        """Drop cached instances (all of them by default) so the next get rebuilds."""
+        with self._lock:
+            if name is None:
+                self._instances.clear()
+            else:
+                self._instances.pop(name, None)
+
+
+registry = LazyRegistry()
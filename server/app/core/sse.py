@@ -0,0 +1,209 @@
+import asyncio
+from collections import Counter
+from contextlib import suppress
+from enum import IntEnum
+from typing import Any, AsyncIterator
+import orjson
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+from core.logger import get_logger
+from core.metrics import metrics
+
+logger = get_logger()
+
+HEARTBEAT_FRAME = b": ping\n\n"
+
+# Disconnect counters, plus per-endpoint work skipped because of them
+stream_stats: Counter = Counter()
+
+# Sources left running after their client disconnected
+_detached_tasks: set[asyncio.Task] = set()
+
+metrics.register_collector(
+    lambda: (
+        ("sse_stream_events", {"kind": kind}, count)
+        for kind, count in list(stream_stats.items())
+    )
+)
+
+
+class Verbosity(IntEnum):
+    """How much progress a client wants; events above the requested level are dropped."""
+
+    MINIMAL = 0  # start, result and error events only
+    BATCH = 1  # plus per-batch / per-stage progress
+    FULL = 2  # plus per-chunk progress
+
+
+class SSEEvent:
+    __slots__ = ("data", "level")
+
+    def __init__(self, data: Any, level: Verbosity = Verbosity.MINIMAL):
+        self.data = data
+        self.level = level
+
+
+def progress(data: Any) -> SSEEvent:
+    return SSEEvent(data, Verbosity.BATCH)
+
+
+def detail(data: Any) -> SSEEvent:
+    return SSEEvent(data, Verbosity.FULL)
+
+
+def encode_event(data: Any, event_id: int | None = None) -> bytes:
+    frame = b"data: " + orjson.dumps(data) + b"\n"
+    if event_id is not None:
+        frame += b"id: %d\n" % event_id
+    return frame + b"\n"
+
+
+async def sse_stream(
+    events: AsyncIterator[Any],
+    verbosity: Verbosity = Verbosity.FULL,
+    event_ids: bool = False,
+    flush_interval: float = 0.01,
+    heartbeat_interval: float = 15.0,
+    max_buffered: int = 256,
+    request: Request | None = None,
+    detach_on_disconnect: bool = False,
+    disconnect_poll_interval: float = 0.5,
+) -> AsyncIterator[bytes]:
+    """
+    Encode an async iterator of events (plain payloads or `SSEEvent`s) as SSE.
+    The source runs as its own task; frames it produces within `flush_interval`
+    of each other are written as one chunk, and a comment heartbeat is sent when
+    it has been quiet for `heartbeat_interval`.
+
+    When the client goes away (polled through `request`, or the response being
+    cancelled) the source task is cancelled, which interrupts whatever it is
+    awaiting. With `detach_on_disconnect` it keeps running in the background
+    instead and its remaining events are dropped.
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=max_buffered)
+    done = object()
+    loop = asyncio.get_running_loop()
+    detached = False
+    disconnected = False
+
+    async def produce():
+        event_id = 0
+        try:
+            async for item in events:
+                if isinstance(item, SSEEvent):
+                    if item.level > verbosity:
+                        continue
+                    item = item.data
+                event_id += 1
+                if detached:
+                    continue
+                await queue.put(encode_event(item, event_id if event_ids else None))
+        except BaseException:
+            # The consumer re-raises by awaiting this task
+            with suppress(asyncio.QueueFull):
+                queue.put_nowait(done)
+            raise
+        if not detached:
+            await queue.put(done)
+
+    def stop_streaming():
+        # Unblock a producer waiting on a full queue and end the consumer loop
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(done)
+
+    async def watch_disconnect():
+        nonlocal disconnected
+        while not producer.done():
+            if await request.is_disconnected():
+                disconnected = True
+                stop_streaming()
+                return
+            await asyncio.sleep(disconnect_poll_interval)
+
+    producer = asyncio.create_task(produce())
+    watcher = asyncio.create_task(watch_disconnect()) if request else None
+    try:
+        finished = False
+        while not finished:
+            try:
+                frame = await asyncio.wait_for(queue.get(), heartbeat_interval)
+            except asyncio.TimeoutError:
+                if producer.done() and queue.empty():
+                    break
+                yield HEARTBEAT_FRAME
+                continue
+            if frame is done:
+                break
+
+            frames = [frame]
+            deadline = loop.time() + flush_interval
+            while True:
+                remaining = deadline - loop.time()
+                if remaining <= 0 and queue.empty():
+                    break
+                try:
+                    frame = (
+                        queue.get_nowait()
+                        if not queue.empty()
+                        else await asyncio.wait_for(queue.get(), remaining)
+                    )
+                except asyncio.TimeoutError:
+                    break
+                if frame is done:
+                    finished = True
+                    break
+                frames.append(frame)
+            yield b"".join(frames)
+
+        if not disconnected:
+            # Surface errors raised by the source itself
+            await producer
+    finally:
+        if watcher is not None:
+            watcher.cancel()
+        if not producer.done():
+            stream_stats["disconnects"] += 1
+            if detach_on_disconnect:
+                detached = True
+                stop_streaming()
+                stream_stats["detached"] += 1
+                _detached_tasks.add(producer)
+                producer.add_done_callback(_finish_detached)
+            else:
+                stream_stats["cancelled"] += 1
+                producer.cancel()
+                with suppress(asyncio.CancelledError):
+                    await producer
+
+
+def _finish_detached(task: asyncio.Task):
+    _detached_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Detached stream failed: {task.exception()}")
+
+
+def record_cancelled_work(endpoint: str, **units: int):
+    """Count work a stream skipped because its client disconnected."""
+    for name, amount in units.items():
+        stream_stats[f"{endpoint}.{name}"] += amount
+
+
+def sse_response(
+    events: AsyncIterator[Any],
+    verbosity: Verbosity = Verbosity.FULL,
+    event_ids: bool = False,
+    request: Request | None = None,
+    detach_on_disconnect: bool = False,
+) -> StreamingResponse:
+    return StreamingResponse(
+        sse_stream(
+            events,
+            verbosity=verbosity,
+            event_ids=event_ids,
+            request=request,
+            detach_on_disconnect=detach_on_disconnect,
+        ),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
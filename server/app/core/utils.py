@@ -0,0 +1,75 @@
+import asyncio
+import threading
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import AsyncIterator, Callable, Iterable, TypeVar
+
+T = TypeVar("T")
+
+# How often a blocked producer thread checks whether the consumer went away
+_STOP_POLL_SECONDS = 0.1
+
+
+class _Done:
+    __slots__ = ("error",)
+
+    def __init__(self, error: BaseException | None = None):
+        self.error = error
+
+
+async def iterate_in_thread(
+    make_iterator: Callable[[], Iterable[T]], maxsize: int = 64
+) -> AsyncIterator[T]:
+    """
+    Run a blocking iterator in a worker thread and yield its items as they are
+    produced. The bounded queue applies backpressure to the thread, and closing
+    or cancelling the consumer stops the thread at its next item and closes the
+    underlying iterator.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+    stop = threading.Event()
+
+    def put(item) -> bool:
+        try:
+            future = asyncio.run_coroutine_threadsafe(queue.put(item), loop)
+        except RuntimeError:
+            return False  # loop closed
+        while True:
+            try:
+                future.result(timeout=_STOP_POLL_SECONDS)
+                return True
+            except FutureTimeoutError:
+                if stop.is_set():
+                    future.cancel()
+                    return False
+
+    def produce():
+        error = None
+        try:
+            iterator = iter(make_iterator())
+            try:
+                for item in iterator:
+                    if stop.is_set() or not put(item):
+                        break
+            finally:
+                close = getattr(iterator, "close", None)
+                if close:
+                    close()
+        except BaseException as e:
+            error = e
+        if not stop.is_set():
+            put(_Done(error))
+
+    producer = loop.run_in_executor(None, produce)
+    try:
+        while True:
+            item = await queue.get()
+            if isinstance(item, _Done):
+                if item.error:
+                    raise item.error
+                break
+            yield item
+    finally:
+        stop.set()
+        if producer.done():
+            producer.exception()  # errors are delivered through the queue
@@ -1,33 +1,54 @@
 import asyncio
-import fitz
 import os
-from fastapi import FastAPI
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from models.db_models import init_db
+from bson import ObjectId
+from models.db_models import init_db, get_job_progress
 from models.api_models import EmbedRequest, QueryRequest
+from core.sse import (
+    Verbosity,
+    sse_response,
+    progress,
+    detail,
+    stream_stats,
+    record_cancelled_work,
+)
 from services.data_processing import (
     get_file_bytes_stream,
     get_page_batches,
+    get_text_splitter,
     convert_pdf_to_markdown_async,
 )
-from services.vector_db import insert_text_chunk, query_vector_store, init_vector_db
+from services.vector_db import insert_text_chunk, init_vector_db
 from services.graph_db import (
     insert_chunk_to_graphdb,
     init_graph_db,
     query_graphdb_with_text,
 )
-from services.llm_models import gemini_model, mistal_model
+from services.model_router import get_model_router, preferred_model_name
+from services.summary_tree import route_query, search_routed
+from services.hits import to_hits, build_hit_context
+from services.chunk_store import expand_hits
+from services.graph_communities import match_communities
+from services.graph_snapshot import snapshot_facts
+from core.metrics import start_trace, timed
+from core.admission import admission
+from api.routes import health, ingest
 from mangum import Mangum
-import json
+
+WARM_CLIENTS_ON_STARTUP = (
+    os.getenv("WARM_CLIENTS_ON_STARTUP", "false").lower() == "true"
+)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    init_vector_db()
-    init_graph_db()
+    # Clients are built on first use; long-running servers can opt into warming them here
+    if WARM_CLIENTS_ON_STARTUP:
+        await asyncio.to_thread(init_vector_db)
+        await asyncio.to_thread(init_graph_db)
     yield
 
 
@@ -38,6 +59,8 @@ app = FastAPI(
     lifespan=lifespan,
 )
 handler = Mangum(app)
+app.include_router(health.router)
+app.include_router(ingest.router)
 
 # CORS middleware for Next.js communication
 app.add_middleware(
@@ -58,15 +81,36 @@ def root():
     return {"message": "Welcome to Medical Graph RAG Server"}
 
 
+@app.get("/jobs/{job_id}/progress")
+async def job_progress(job_id: str):
+    """
+    Aggregated progress of a queued job and all of its descendants.
+    Served from the counters maintained on the job document, in one indexed read.
+    """
+    if not ObjectId.is_valid(job_id):
+        return JSONResponse(status_code=400, content={"message": "Invalid job id"})
+
+    await init_db()
+    progress = await get_job_progress(job_id)
+    if progress is None:
+        return JSONResponse(status_code=404, content={"message": "Job not found"})
+    return progress
+
+
 @app.post("/embed-pdf-stream")
-async def embed_pdf_stream(payload: EmbedRequest):
+async def embed_pdf_stream(payload: EmbedRequest, request: Request):
     """
     Embed PDF directly with streaming status updates.
     Processes PDF, converts to markdown, chunks text, and embeds into vector and graph databases.
     Streams progress updates at each checkpoint.
+    Processing stops when the client disconnects, unless `detach_on_disconnect` is set.
     """
 
     async def generate_status():
+        trace = start_trace()
+        ticket = admission.ticket("embed", payload.user_id)
+        total_batches = None
+        completed_batches = 0
         try:
             # Prepare metadata
             file_metadata = {
@@ -79,31 +123,44 @@ async def embed_pdf_stream(payload: EmbedRequest):
                 file_metadata["file_name"] = payload.file_name
 
             # Checkpoint 1: Start processing
-            yield f"data: {json.dumps({'status': 'started', 'message': 'Starting PDF processing'})}\n\n"
-            await asyncio.sleep(0)
+            yield {"status": "started", "message": "Starting PDF processing"}
+
+            # Wait for an ingestion slot; queries are admitted ahead of uploads
+            async for position in ticket.wait():
+                yield {
+                    "status": "queued",
+                    "message": f"Waiting for a free slot (position {position})",
+                    "position": position,
+                }
 
             # Checkpoint 2: Download PDF
-            yield f"data: {json.dumps({'status': 'downloading', 'message': 'Downloading PDF file'})}\n\n"
-            file_stream = get_file_bytes_stream(payload.file_url)
+            yield {"status": "downloading", "message": "Downloading PDF file"}
+            file_stream = await asyncio.to_thread(
+                get_file_bytes_stream, payload.file_url
+            )
             if not file_stream:
-                yield f"data: {json.dumps({'status': 'error', 'message': 'Failed to download PDF file'})}\n\n"
+                yield {"status": "error", "message": "Failed to download PDF file"}
                 return
 
-            yield f"data: {json.dumps({'status': 'downloaded', 'message': 'PDF downloaded successfully'})}\n\n"
-            await asyncio.sleep(0)
+            yield {"status": "downloaded", "message": "PDF downloaded successfully"}
 
             # Checkpoint 3: Get total pages
+            import fitz
+
             file_stream.seek(0)
-            with fitz.open(stream=file_stream, filetype="pdf") as doc:
+            with timed("page_count"), fitz.open(
+                stream=file_stream, filetype="pdf"
+            ) as doc:
                 total_pages = doc.page_count
 
-            yield f"data: {json.dumps({'status': 'pages_detected', 'message': f'Detected {total_pages} pages', 'total_pages': total_pages})}\n\n"
-            await asyncio.sleep(0)
+            yield {
+                "status": "pages_detected",
+                "message": f"Detected {total_pages} pages",
+                "total_pages": total_pages,
+            }
 
             # Setup text splitter
-            text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=750, chunk_overlap=100, length_function=len
-            )
+            text_splitter = get_text_splitter()
 
             batch_size = payload.batch_size or 2
             total_batches = (total_pages + batch_size - 1) // batch_size
@@ -114,22 +171,47 @@ async def embed_pdf_stream(payload: EmbedRequest):
                 batch_num += 1
 
                 # Checkpoint 4: Converting batch to markdown
-                yield f"data: {json.dumps({'status': 'converting_batch', 'message': f'Converting pages {page_range[0]}-{page_range[1]} to markdown', 'batch': batch_num, 'total_batches': total_batches, 'page_range': page_range})}\n\n"
-                await asyncio.sleep(0)
+                yield progress(
+                    {
+                        "status": "converting_batch",
+                        "message": f"Converting pages {page_range[0]}-{page_range[1]} to markdown",
+                        "batch": batch_num,
+                        "total_batches": total_batches,
+                        "page_range": page_range,
+                    }
+                )
 
                 markdown_text = await convert_pdf_to_markdown_async(
                     file_stream, page_range, file_name=payload.file_name
                 )
 
-                yield f"data: {json.dumps({'status': 'batch_converted', 'message': f'Converted {len(markdown_text)} characters', 'batch': batch_num})}\n\n"
-                await asyncio.sleep(0)
+                yield progress(
+                    {
+                        "status": "batch_converted",
+                        "message": f"Converted {len(markdown_text)} characters",
+                        "batch": batch_num,
+                    }
+                )
 
                 # Checkpoint 5: Chunking text
-                yield f"data: {json.dumps({'status': 'chunking', 'message': f'Splitting batch {batch_num} into chunks', 'batch': batch_num})}\n\n"
-                chunks = text_splitter.split_text(markdown_text)
+                yield progress(
+                    {
+                        "status": "chunking",
+                        "message": f"Splitting batch {batch_num} into chunks",
+                        "batch": batch_num,
+                    }
+                )
+                with timed("chunk_split"):
+                    chunks = text_splitter.split_text(markdown_text)
 
-                yield f"data: {json.dumps({'status': 'chunked', 'message': f'Created {len(chunks)} chunks', 'batch': batch_num, 'chunk_count': len(chunks)})}\n\n"
-                await asyncio.sleep(0)
+                yield progress(
+                    {
+                        "status": "chunked",
+                        "message": f"Created {len(chunks)} chunks",
+                        "batch": batch_num,
+                        "chunk_count": len(chunks),
+                    }
+                )
 
                 # Process each chunk
                 for idx, chunk_text in enumerate(chunks):
@@ -138,153 +220,214 @@ async def embed_pdf_stream(payload: EmbedRequest):
                     metadata["chunk_id"] = idx
 
                     # Checkpoint 6: Embedding to vector DB
-                    yield f"data: {json.dumps({'status': 'embedding_vector', 'message': f'Embedding chunk {idx+1}/{len(chunks)} to vector DB', 'batch': batch_num, 'chunk': idx+1})}\n\n"
-                    await asyncio.sleep(0)
+                    yield detail(
+                        {
+                            "status": "embedding_vector",
+                            "message": f"Embedding chunk {idx+1}/{len(chunks)} to vector DB",
+                            "batch": batch_num,
+                            "chunk": idx + 1,
+                        }
+                    )
 
-                    insert_text_chunk(chunk_text, metadata)
+                    await asyncio.to_thread(insert_text_chunk, chunk_text, metadata)
 
-                    yield f"data: {json.dumps({'status': 'embedded_vector', 'message': f'Chunk {idx+1} embedded to vector DB', 'batch': batch_num, 'chunk': idx+1})}\n\n"
-                    await asyncio.sleep(0)
+                    yield detail(
+                        {
+                            "status": "embedded_vector",
+                            "message": f"Chunk {idx+1} embedded to vector DB",
+                            "batch": batch_num,
+                            "chunk": idx + 1,
+                        }
+                    )
 
                     # Checkpoint 7: Embedding to graph DB
-                    yield f"data: {json.dumps({'status': 'embedding_graph', 'message': f'Embedding chunk {idx+1}/{len(chunks)} to graph DB', 'batch': batch_num, 'chunk': idx+1})}\n\n"
-                    await asyncio.sleep(0)
+                    yield detail(
+                        {
+                            "status": "embedding_graph",
+                            "message": f"Embedding chunk {idx+1}/{len(chunks)} to graph DB",
+                            "batch": batch_num,
+                            "chunk": idx + 1,
+                        }
+                    )
 
                     await insert_chunk_to_graphdb(chunk_text, metadata)
 
-                    yield f"data: {json.dumps({'status': 'embedded_graph', 'message': f'Chunk {idx+1} embedded to graph DB', 'batch': batch_num, 'chunk': idx+1})}\n\n"
-                    await asyncio.sleep(0)
+                    yield detail(
+                        {
+                            "status": "embedded_graph",
+                            "message": f"Chunk {idx+1} embedded to graph DB",
+                            "batch": batch_num,
+                            "chunk": idx + 1,
+                        }
+                    )
 
-                yield f"data: {json.dumps({'status': 'batch_complete', 'message': f'Batch {batch_num}/{total_batches} completed', 'batch': batch_num})}\n\n"
-                await asyncio.sleep(0)
+                completed_batches += 1
+                yield progress(
+                    {
+                        "status": "batch_complete",
+                        "message": f"Batch {batch_num}/{total_batches} completed",
+                        "batch": batch_num,
+                    }
+                )
 
             # Final checkpoint: Complete
-            yield f"data: {json.dumps({'status': 'completed', 'message': 'PDF embedding completed successfully', 'total_pages': total_pages, 'total_batches': total_batches})}\n\n"
+            yield {
+                "status": "completed",
+                "message": "PDF embedding completed successfully",
+                "total_pages": total_pages,
+                "total_batches": total_batches,
+                "timings": trace.summary(),
+            }
 
+        except asyncio.CancelledError:
+            if total_batches is not None:
+                record_cancelled_work(
+                    "embed", batches_skipped=total_batches - completed_batches
+                )
+            raise
         except Exception as e:
-            yield f"data: {json.dumps({'status': 'error', 'message': str(e)})}\n\n"
+            yield {"status": "error", "message": str(e)}
+        finally:
+            ticket.release()
 
-    return StreamingResponse(generate_status(), media_type="text/event-stream")
+    return sse_response(
+        generate_status(),
+        verbosity=Verbosity[payload.verbosity.upper()],
+        event_ids=payload.event_ids,
+        request=request,
+        detach_on_disconnect=payload.detach_on_disconnect,
+    )
 
 
 @app.post("/query-stream")
-async def query_stream(payload: QueryRequest):
+async def query_stream(payload: QueryRequest, request: Request):
     """
     Query the vector database and generate LLM response with streaming.
     Streams status updates and LLM tokens as they are generated.
+    Retrieval and generation are cancelled when the client disconnects.
     """
 
     async def generate_response():
+        trace = start_trace()
+        ticket = admission.ticket("query", payload.user_id)
+        stage = "queued"
         try:
             # Checkpoint 1: Start query
-            yield f"data: {json.dumps({'event': 'status', 'data': 'Query started'})}\n\n"
-            await asyncio.sleep(0)
-
-            # Checkpoint 2: Search vector DB
-            yield f"data: {json.dumps({'event': 'status', 'data': 'Searching vector database'})}\n\n"
-            await asyncio.sleep(0)
-
-            vector_results = query_vector_store(payload.query, top_k=payload.top_k)
+            yield progress({"event": "status", "data": "Query started"})
+
+            async for position in ticket.wait():
+                yield {"event": "queued", "data": {"position": position}}
+            stage = "vector_search"
+
+            # Checkpoint 2: Search vector DB, at the summary level the question calls for
+            route = route_query(payload.query, payload.scope, payload.top_k)
+            yield progress(
+                {
+                    "event": "status",
+                    "data": (
+                        "Searching vector database"
+                        if route.scope == "specific"
+                        else f"Searching {route.scope} summaries"
+                    ),
+                }
+            )
 
-            vector_records = vector_results.result.hits
+            vector_results, route = await search_routed(payload.query, route)
 
-            # Ensure records is a list
-            if vector_records is None:
-                vector_records = []
+            # Neighbouring chunks from the local store; adjacent hits become one passage
+            hits = await asyncio.to_thread(expand_hits, to_hits(vector_results))
 
-            yield f"data: {json.dumps({'event': 'status', 'data': f'Found {len(vector_records)} results from vector DB'})}\n\n"
-            await asyncio.sleep(0)
+            yield progress(
+                {
+                    "event": "status",
+                    "data": f"Found {len(hits)} results from vector DB",
+                }
+            )
 
             # Checkpoint 3: Search graph DB
-            yield f"data: {json.dumps({'event': 'status', 'data': 'Searching graph database'})}\n\n"
-            await asyncio.sleep(0)
+            yield progress({"event": "status", "data": "Searching graph database"})
 
+            stage = "graph_search"
             graph_context = ""
-            try:
-                graph_result = await query_graphdb_with_text(payload.query)
-                if graph_result and not graph_result.get("error"):
-                    # Extract the result from GraphDB
-                    graph_answer = graph_result.get("result", "")
-                    if graph_answer:
-                        graph_context = f"\n\nGraph Database Insights:\n{graph_answer}"
-                        yield f"data: {json.dumps({'event': 'status', 'data': 'Found relevant graph relationships'})}\n\n"
-                    else:
-                        yield f"data: {json.dumps({'event': 'status', 'data': 'No graph relationships found'})}\n\n"
-                else:
-                    yield f"data: {json.dumps({'event': 'status', 'data': 'Graph DB unavailable or no results'})}\n\n"
-            except Exception as e:
-                yield f"data: {json.dumps({'event': 'status', 'data': f'Graph DB search skipped: {str(e)}'})}\n\n"
-                graph_context = ""
-
-            await asyncio.sleep(0)
-
-            # Checkpoint 4: Process vector DB results
-            yield f"data: {json.dumps({'event': 'status', 'data': 'Processing search results'})}\n\n"
-            await asyncio.sleep(0)
-
-            references = []
-            vector_contexts = []
-
-            for rec in vector_records:
-                # Handle Pinecone inference API format where data is in 'fields'
-                if "fields" in rec:
-                    fields = rec["fields"]
-                    text = fields.get("text", "")
-                    file_id = fields.get("file_id")
-                    file_name = fields.get("file_name")
-                    file_url = fields.get("file_url")
-                    page_range = fields.get("page_range")
-                    chunk_id = fields.get("chunk_id")
-                    score = rec.get("_score")
-                else:
-                    # Fallback to direct access
-                    text = rec.get("text") or rec.get("values") or ""
-                    file_id = rec.get("file_id")
-                    file_name = rec.get("file_name")
-                    file_url = rec.get("file_url")
-                    page_range = rec.get("page_range")
-                    chunk_id = rec.get("chunk_id")
-                    score = rec.get("score")
-
-                # Normalize page range
-                page_tuple = None
-                try:
-                    if isinstance(page_range, str) and "_" in page_range:
-                        s, e = page_range.split("_", 1)
-                        page_tuple = (int(s), int(e))
-                    elif isinstance(page_range, (list, tuple)) and len(page_range) == 2:
-                        page_tuple = (int(page_range[0]), int(page_range[1]))
-                except Exception:
-                    page_tuple = None
-
-                references.append(
+            # Precomputed community summaries for the entities the question names
+            communities = await asyncio.to_thread(match_communities, payload.query)
+            community_context = ""
+            if communities:
+                community_context = "\n\nGraph Community Summaries:\n" + "\n\n".join(
+                    community.summary for community, _ in communities
+                )
+            if community_context and route.scope != "specific":
+                # Overview questions are answered better by communities than by generated Cypher
+                graph_context = community_context
+                yield progress(
+                    {
+                        "event": "status",
+                        "data": f"Found {len(communities)} related graph communities",
+                    }
+                )
+            elif route.scope == "specific" and (
+                graph_facts := await asyncio.to_thread(snapshot_facts, payload.query)
+            ):
+                # Entities found in the in-process snapshot: no Cypher generation or Neo4j round trip
+                graph_context = "\n\nGraph Relationships:\n" + "\n".join(graph_facts)
+                yield progress(
                     {
-                        "file_id": file_id,
-                        "file_name": file_name,
-                        "file_url": file_url,
-                        "page_range": page_tuple,
-                        "chunk_id": chunk_id,
-                        "score": score,
-                        "source": "vector_db",
+                        "event": "status",
+                        "data": f"Found {len(graph_facts)} graph relationships",
                     }
                 )
-                if text:
-                    vector_contexts.append(text)
+            else:
+                try:
+                    graph_result = await query_graphdb_with_text(payload.query)
+                    if graph_result and not graph_result.get("error"):
+                        # Extract the result from GraphDB
+                        graph_answer = graph_result.get("result", "")
+                        if graph_answer:
+                            graph_context = (
+                                f"\n\nGraph Database Insights:\n{graph_answer}"
+                            )
+                            yield progress(
+                                {
+                                    "event": "status",
+                                    "data": "Found relevant graph relationships",
+                                }
+                            )
+                        else:
+                            yield progress(
+                                {
+                                    "event": "status",
+                                    "data": "No graph relationships found",
+                                }
+                            )
+                    else:
+                        yield progress(
+                            {
+                                "event": "status",
+                                "data": "Graph DB unavailable or no results",
+                            }
+                        )
+                except Exception as e:
+                    yield progress(
+                        {
+                            "event": "status",
+                            "data": f"Graph DB search skipped: {str(e)}",
+                        }
+                    )
+                    graph_context = ""
+                # Communities still help when Cypher found nothing
+                graph_context = graph_context or community_context
+
+            # Checkpoint 4: Process vector DB results
+            yield progress({"event": "status", "data": "Processing search results"})
+
+            references = [hit.reference() for hit in hits]
 
             # Checkpoint 5: Send references
-            yield f"data: {json.dumps({'event': 'references', 'data': references})}\n\n"
-            await asyncio.sleep(0)
+            yield {"event": "references", "data": references}
 
-            yield f"data: {json.dumps({'event': 'status', 'data': 'Generating LLM response'})}\n\n"
-            await asyncio.sleep(0)
+            yield progress({"event": "status", "data": "Generating LLM response"})
 
             # Checkpoint 6: Generate LLM response
-            model_obj = (
-                gemini_model
-                if (payload.model or "gemini").lower().startswith("gem")
-                else mistal_model
-            )
-
             system_prompt = (
                 "You are a helpful medical assistant. Use the provided context from both vector database and graph database to answer the question. "
                 "The vector database provides relevant document chunks, while the graph database provides entity relationships and connections. "
@@ -294,23 +437,9 @@ async def query_stream(payload: QueryRequest):
             )
 
             # Combine vector contexts with reference metadata
-            vector_context_parts = []
-            for idx, (context, ref) in enumerate(
-                zip(vector_contexts[: payload.top_k], references[: payload.top_k]), 1
-            ):
-                ref_info = f"[Reference {idx}]\n"
-                if ref.get("file_name"):
-                    ref_info += f"File: {ref['file_name']}\n"
-                if ref.get("file_url"):
-                    ref_info += f"URL: {ref['file_url']}\n"
-                if ref.get("page_range"):
-                    ref_info += (
-                        f"Pages: {ref['page_range'][0]}-{ref['page_range'][1]}\n"
-                    )
-                ref_info += f"Content: {context}"
-                vector_context_parts.append(ref_info)
-
-            vector_context_blob = "\n\n---\n\n".join(vector_context_parts)
+            vector_context_blob = build_hit_context(
+                [hit for hit in hits[: payload.top_k] if hit.text]
+            )
 
             # Build complete context
             complete_context = f"Vector Database Context:\n{vector_context_blob}"
@@ -343,51 +472,68 @@ async def query_stream(payload: QueryRequest):
             messages.append({"role": "user", "content": user_prompt})
 
             # Stream LLM tokens
+            stage = "generation"
             try:
-                if hasattr(model_obj, "astream"):
-                    async for chunk in model_obj.astream(messages):
-                        content = getattr(chunk, "content", None) or str(chunk)
-                        yield f"data: {json.dumps({'event': 'token', 'data': content})}\n\n"
-                        await asyncio.sleep(0)
-                elif hasattr(model_obj, "stream"):
-
-                    def _run_stream():
-                        result_content = ""
-                        for chunk in model_obj.stream(messages):
-                            content = getattr(chunk, "content", None) or str(chunk)
-                            result_content += content
-                        return result_content
-
-                    content = await asyncio.to_thread(_run_stream)
-                    # Chunk the response
-                    if content:
-                        for i in range(0, len(content), 32):
-                            yield f"data: {json.dumps({'event': 'token', 'data': content[i:i+32]})}\n\n"
-                            await asyncio.sleep(0)
-                else:
-                    # Non-streaming fallback
-                    def _invoke():
-                        resp = model_obj.invoke(messages)
-                        return getattr(resp, "content", None) or str(resp)
-
-                    content = await asyncio.to_thread(_invoke)
-                    # Chunk the response
-                    if content:
-                        for i in range(0, len(content), 32):
-                            yield f"data: {json.dumps({'event': 'token', 'data': content[i:i+32]})}\n\n"
-                            await asyncio.sleep(0)
+                answer = get_model_router().stream(
+                    messages, preferred=preferred_model_name(payload.model)
+                )
+                async for content in answer:
+                    yield {"event": "token", "data": content}
 
             except Exception as e:
-                yield f"data: {json.dumps({'event': 'error', 'data': str(e)})}\n\n"
+                yield {"event": "error", "data": str(e)}
                 return
 
             # Checkpoint 7: Complete
-            yield f"data: {json.dumps({'event': 'done', 'data': {'vector_results': len(vector_records), 'graph_searched': bool(graph_context)}})}\n\n"
+            yield {
+                "event": "done",
+                "data": {
+                    "vector_results": len(hits),
+                    "scope": route.scope,
+                    "graph_searched": bool(graph_context),
+                    "graph_communities": [community.id for community, _ in communities],
+                    "model": answer.model,
+                    "timings": trace.summary(),
+                },
+            }
 
+        except asyncio.CancelledError:
+            record_cancelled_work(
+                "query",
+                **{f"cancelled_during_{stage}": 1},
+                graph_searches_skipped=int(stage in ("queued", "vector_search")),
+                llm_calls_skipped=int(stage != "generation"),
+            )
+            raise
         except Exception as e:
-            yield f"data: {json.dumps({'event': 'error', 'data': str(e)})}\n\n"
+            yield {"event": "error", "data": str(e)}
+        finally:
+            ticket.release()
+
+    return sse_response(
+        generate_response(),
+        verbosity=Verbosity[payload.verbosity.upper()],
+        event_ids=payload.event_ids,
+        request=request,
+    )
+
+
+@app.get("/stream-stats")
+def get_stream_stats():
+    """Client disconnects seen by streaming endpoints and the work they skipped."""
+    return dict(stream_stats)
+
+
+@app.get("/admission")
+def get_admission():
+    """Active and queued requests per class, with their limits."""
+    return admission.snapshot()
+
 
-    return StreamingResponse(generate_response(), media_type="text/event-stream")
+@app.get("/model-stats")
+def get_model_stats():
+    """Routing policy, hedging counters and recent TTFT / error rate per model."""
+    return get_model_router().snapshot()
 
 
 # @app.get("/health")
@@ -1,14 +1,63 @@
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Literal
 from pydantic import BaseModel
 
 
-class EmbedRequest(BaseModel):
+class StreamOptions(BaseModel):
+    """SSE options shared by streaming endpoints.
+
+    - verbosity: "minimal" (results only), "batch" (plus stage/batch progress)
+      or "full" (plus per-chunk progress)
+    - event_ids: add an `id:` line after every frame's data, for
+      EventSource-style clients
+    """
+
+    verbosity: Literal["minimal", "batch", "full"] = "full"
+    event_ids: bool = False
+
+
+class EmbedRequest(StreamOptions):
+    """Request body for the embed endpoint.
+
+    - detach_on_disconnect: keep ingesting in the background if the client
+      disconnects, instead of cancelling
+    - verbosity / event_ids: see StreamOptions
+    """
+
     user_id: str
     file_id: str
     file_url: str
     file_name: Optional[str] = None
     metadata: Optional[Dict[str, Any]] = None
     batch_size: int = 2
+    detach_on_disconnect: bool = False
+
+
+class CorpusFileEntry(BaseModel):
+    """One PDF in a bulk ingestion request."""
+
+    file_url: str
+    file_id: Optional[str] = None
+    file_name: Optional[str] = None
+    metadata: Optional[Dict[str, Any]] = None
+
+
+class CorpusIngestRequest(StreamOptions):
+    """Request body for bulk corpus ingestion.
+
+    - files: the PDFs to ingest, scheduled across one shared batch pool
+    - concurrency: page batches processed at once across all files, at most
+      the server's INGEST_CONCURRENCY
+    - metadata: added to every chunk, under each file's own metadata
+    - detach_on_disconnect / verbosity / event_ids: see EmbedRequest
+    """
+
+    user_id: str
+    files: list[CorpusFileEntry]
+    batch_size: int = 2
+    concurrency: Optional[int] = None
+    metadata: Optional[Dict[str, Any]] = None
+    verbosity: Literal["minimal", "batch", "full"] = "batch"
+    detach_on_disconnect: bool = False
 
 
 class Message(BaseModel):
@@ -18,7 +67,7 @@ class Message(BaseModel):
     content: str
 
 
-class QueryRequest(BaseModel):
+class QueryRequest(StreamOptions):
     """Request body for query endpoint.
 
     - query: user question to answer
@@ -26,6 +75,9 @@ class QueryRequest(BaseModel):
     - model: which LLM to use ("gemini" or "mistral")
     - user_id: optional for tracking
     - previous_messages: optional list of previous conversation messages
+    - scope: "specific" searches chunks, "broad" section summaries and
+      "document" whole-file summaries; "auto" picks from the question
+    - verbosity / event_ids: see StreamOptions
     """
 
     query: str
@@ -33,3 +85,4 @@ class QueryRequest(BaseModel):
     model: Optional[str] = "gemini"
     user_id: Optional[str] = None
     previous_messages: Optional[list[Message]] = None
+    scope: Literal["auto", "specific", "broad", "document"] = "auto"
@@ -2,6 +2,7 @@ import asyncio
 import os
 from beanie import Document, init_beanie, PydanticObjectId
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
 from datetime import datetime
 from pydantic import Field
 from enum import Enum
@@ -45,7 +46,10 @@ class QueueJob(Document):
     status: JobStatus
     action: str  # Eg: "pdf_markdown"/"vectorDB"/"graphDB"
     parent_job_id: str | None = None
+    root_job_id: str | None = None  # Top-level job of the file, when not the parent
     child_job_ids: list[str] = Field(default_factory=list)
+    # Descendant counters per action, eg: progress["vectorDB"]["finished"]
+    progress: dict[str, dict[str, int]] = Field(default_factory=dict)
     enqueued_at: datetime = Field(default_factory=datetime.now)
     started_at: datetime | None = None
     completed_at: datetime | None = None
@@ -56,6 +60,130 @@ class QueueJob(Document):
     file_metadata: dict[str, Any]
     page_range: tuple[int, int] | None = None
     chunk_id: int | None = None
+    # Chunk-batch jobs: one entry per chunk, eg: {"chunk_id": 3, "status": "failed", "error": "..."}
+    chunk_results: list[dict[str, Any]] = Field(default_factory=list)
+
+    class Settings:
+        indexes = ["parent_job_id", "user_id", "status", "file_id"]
+
+
+def job_ancestor_ids(parent_job_id: str | None, root_job_id: str | None) -> list[str]:
+    """Jobs whose progress counters a job contributes to."""
+    ancestors = [parent_job_id] if parent_job_id else []
+    if root_job_id and root_job_id != parent_job_id:
+        ancestors.append(root_job_id)
+    return ancestors
+
+
+def progress_increments(
+    action: str, previous_status: JobStatus | str | None, status: JobStatus | str
+) -> dict[str, int]:
+    """`$inc` document moving one child of `action` between status counters."""
+    previous_status = JobStatus(previous_status) if previous_status else None
+    status = JobStatus(status)
+    if previous_status == status:
+        return {}
+    increments = {f"progress.{action}.{status.value}": 1}
+    if previous_status:
+        increments[f"progress.{action}.{previous_status.value}"] = -1
+    return increments
+
+
+async def increment_job_progress(job_ids: list[str], increments: dict[str, int]):
+    if not job_ids or not increments:
+        return
+    await QueueJob.get_motor_collection().update_many(
+        {"_id": {"$in": [PydanticObjectId(job_id) for job_id in job_ids]}},
+        {"$inc": increments},
+    )
+
+
+async def register_child_jobs(
+    parent_job_id: str,
+    child_job_ids: list[str],
+    action: str,
+    root_job_id: str | None = None,
+):
+    """Attach queued children to their parent and count them on every ancestor."""
+    count = len(child_job_ids)
+    await QueueJob.get_motor_collection().update_one(
+        {"_id": PydanticObjectId(parent_job_id)},
+        {"$push": {"child_job_ids": {"$each": child_job_ids}}},
+    )
+    await increment_job_progress(
+        job_ancestor_ids(parent_job_id, root_job_id),
+        {
+            f"progress.{action}.total": count,
+            f"progress.{action}.{JobStatus.QUEUED.value}": count,
+        },
+    )
+
+
+async def get_job_progress(job_id: str) -> dict[str, Any] | None:
+    """Aggregated progress of a job in a single indexed read."""
+    return await QueueJob.get_motor_collection().find_one(
+        {"_id": PydanticObjectId(job_id)},
+        {"_id": 0, "status": 1, "action": 1, "file_id": 1, "progress": 1},
+    )
+
+
+def job_status_fields(
+    status: JobStatus,
+    started_time: datetime | None = None,
+    completed_time: datetime | None = None,
+    error_message: str | None = None,
+    chunk_results: list[dict[str, Any]] | None = None,
+) -> dict[str, Any]:
+    """Build the partial `$set` document for a job status transition."""
+    fields: dict[str, Any] = {"status": status.value}
+    if started_time:
+        fields["started_at"] = started_time
+    if completed_time:
+        fields["completed_at"] = completed_time
+    if error_message:
+        fields["error_message"] = error_message
+    if chunk_results is not None:
+        fields["chunk_results"] = chunk_results
+    return fields
+
+
+def build_chunk_results(
+    chunk_ids: list[int], errors: list[str | None]
+) -> list[dict[str, Any]]:
+    return [
+        {
+            "chunk_id": chunk_id,
+            "status": (JobStatus.FAILED if error else JobStatus.FINISHED).value,
+            "error": error,
+        }
+        for chunk_id, error in zip(chunk_ids, errors)
+    ]
+
+
+async def swap_job_status(
+    job_id: str,
+    status: JobStatus,
+    started_time: datetime | None = None,
+    completed_time: datetime | None = None,
+    error_message: str | None = None,
+) -> dict[str, Any] | None:
+    """
+    Set a job's status now and return its status, action and lineage from
+    before the update, or None if the job doesn't exist. Progress counters
+    are left to the caller.
+    """
+    # Atomic partial update, no read and no full-document rewrite.
+    # The pre-update projection tells us which progress counters to move.
+    return await QueueJob.get_motor_collection().find_one_and_update(
+        {"_id": PydanticObjectId(job_id)},
+        {
+            "$set": job_status_fields(
+                status, started_time, completed_time, error_message
+            )
+        },
+        projection={"status": 1, "action": 1, "parent_job_id": 1, "root_job_id": 1},
+        return_document=ReturnDocument.BEFORE,
+    )
 
 
 async def update_job_status(
@@ -65,17 +193,14 @@ async def update_job_status(
     completed_time: datetime | None = None,
     error_message: str | None = None,
 ):
-    job = await QueueJob.get(PydanticObjectId(job_id))
-    if not job:
+    previous = await swap_job_status(
+        job_id, status, started_time, completed_time, error_message
+    )
+    if previous is None:
         raise Exception(f"Job with id{job_id} not found")
 
-    job.status = status
-    if started_time:
-        job.started_at = started_time
-    if completed_time:
-        job.completed_at = completed_time
-    if error_message:
-        job.error_message = error_message
-
-    await job.save()
-    return job
+    await increment_job_progress(
+        job_ancestor_ids(previous.get("parent_job_id"), previous.get("root_job_id")),
+        progress_increments(previous["action"], previous.get("status"), status),
+    )
+    return previous
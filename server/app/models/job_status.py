@@ -0,0 +1,188 @@
+import asyncio
+import os
+from contextlib import suppress
+from datetime import datetime
+from beanie import PydanticObjectId
+from pymongo import UpdateOne
+from models.db_models import (
+    QueueJob,
+    JobStatus,
+    job_status_fields,
+    swap_job_status,
+    job_ancestor_ids,
+    progress_increments,
+)
+from core.logger import get_logger
+
+logger = get_logger()
+
+FLUSH_INTERVAL_SECONDS = float(os.getenv("JOB_STATUS_FLUSH_INTERVAL", "1.0"))
+MAX_PENDING_JOBS = int(os.getenv("JOB_STATUS_MAX_PENDING", "500"))
+
+
+class JobStatusBuffer:
+    """
+    Buffered job status writer.
+    Transitions recorded for the same job are merged into one `$set`, progress
+    deltas for the same parent are summed into one `$inc`, and everything is
+    written together with a single unordered `bulk_write`.
+    """
+
+    def __init__(
+        self,
+        flush_interval: float = FLUSH_INTERVAL_SECONDS,
+        max_pending: int = MAX_PENDING_JOBS,
+    ):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending: dict[str, dict] = {}
+        self._increments: dict[str, dict[str, int]] = {}
+        self._flusher: asyncio.Task | None = None
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    async def record(
+        self,
+        job_id: str,
+        status: JobStatus,
+        started_time: datetime | None = None,
+        completed_time: datetime | None = None,
+        error_message: str | None = None,
+        chunk_results: list[dict] | None = None,
+        action: str | None = None,
+        previous_status: JobStatus | None = None,
+        parent_job_id: str | None = None,
+        root_job_id: str | None = None,
+    ):
+        fields = job_status_fields(
+            status, started_time, completed_time, error_message, chunk_results
+        )
+        # Later transitions overwrite earlier ones for the same job
+        self._pending.setdefault(job_id, {}).update(fields)
+
+        # Without a read we rely on the caller for the previous status
+        self._count(action, previous_status, status, parent_job_id, root_job_id)
+
+        if len(self._pending) >= self.max_pending:
+            await self.flush()
+
+    def _count(
+        self,
+        action: str | None,
+        previous_status: JobStatus | None,
+        status: JobStatus,
+        parent_job_id: str | None,
+        root_job_id: str | None,
+    ):
+        if not action:
+            return
+        increments = progress_increments(action, previous_status, status)
+        for ancestor_id in job_ancestor_ids(parent_job_id, root_job_id):
+            totals = self._increments.setdefault(ancestor_id, {})
+            for path, delta in increments.items():
+                totals[path] = totals.get(path, 0) + delta
+
+    async def record_started(
+        self,
+        job_id: str,
+        started_time: datetime,
+        action: str | None = None,
+        parent_job_id: str | None = None,
+        root_job_id: str | None = None,
+    ):
+        """
+        Mark a job STARTED right away and buffer only the move of its progress
+        counters, from the status it really had: an RQ retry starts from
+        FAILED, not QUEUED. If the write fails, STARTED is buffered instead and
+        the job is assumed to come from the queue, so the counters still balance.
+        """
+        # A transition still waiting in the buffer is newer than the stored one,
+        # and would overwrite STARTED if it stayed there
+        pending = self._pending.pop(job_id, {})
+        try:
+            previous = await swap_job_status(job_id, JobStatus.STARTED, started_time)
+        except Exception as e:
+            logger.error(f"Failed to mark job {job_id} started: {e}")
+            # Never raises, so callers can count the job as STARTED from here on
+            self._pending[job_id] = {
+                **pending,
+                **job_status_fields(JobStatus.STARTED, started_time),
+            }
+            previous_status = pending.get("status", JobStatus.QUEUED)
+        else:
+            previous_status = previous.get("status") if previous else None
+            previous_status = pending.get("status", previous_status)
+        self._count(
+            action, previous_status, JobStatus.STARTED, parent_job_id, root_job_id
+        )
+
+    async def flush(self) -> int:
+        if not self._pending and not self._increments:
+            return 0
+
+        # Swap before awaiting so records made during the write go to the next flush
+        pending, self._pending = self._pending, {}
+        increments, self._increments = self._increments, {}
+        operations = [
+            UpdateOne({"_id": PydanticObjectId(job_id)}, {"$set": fields})
+            for job_id, fields in pending.items()
+        ]
+        for ancestor_id, totals in increments.items():
+            totals = {path: delta for path, delta in totals.items() if delta}
+            if totals:
+                operations.append(
+                    UpdateOne({"_id": PydanticObjectId(ancestor_id)}, {"$inc": totals})
+                )
+        if not operations:
+            return 0
+
+        try:
+            await QueueJob.get_motor_collection().bulk_write(operations, ordered=False)
+        except Exception as e:
+            logger.error(f"Failed to flush {len(operations)} job status updates: {e}")
+            # Requeue, keeping any newer transition recorded meanwhile.
+            # Unordered bulk writes may partially apply, so counters can drift
+            # by the failed batch; statuses are idempotent.
+            for job_id, fields in pending.items():
+                self._pending[job_id] = {**fields, **self._pending.get(job_id, {})}
+            for ancestor_id, totals in increments.items():
+                merged = self._increments.setdefault(ancestor_id, {})
+                for path, delta in totals.items():
+                    merged[path] = merged.get(path, 0) + delta
+            raise
+        return len(operations)
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            with suppress(Exception):
+                await self.flush()
+
+    def start(self):
+        """Start the periodic flusher on the running event loop."""
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.get_running_loop().create_task(
+                self._flush_periodically()
+            )
+
+    async def stop(self):
+        if self._flusher is not None:
+            self._flusher.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._flusher
+            self._flusher = None
+        await self.flush()
+
+
+# Shared buffer for high-volume chunk jobs
+job_status_buffer = JobStatusBuffer()
+
+
+async def run_and_flush(coro):
+    """Run a job coroutine, then flush buffered status updates before its loop closes."""
+    try:
+        return await coro
+    finally:
+        await job_status_buffer.flush()
@@ -1,4 +1,3 @@
-import asyncio
 import logging
 from models.db_models import init_db
 from services.graph_db import init_graph_db
@@ -22,7 +21,9 @@ class WorkerDB:
     @classmethod
     def ensure_connection_sync(cls):
         if not cls._db_initialized:
-            asyncio.run(cls.ensure_connection())
+            from workers.runtime import runtime
+
+            runtime.run(cls.ensure_connection())
 
     @classmethod
     def ensure_vector_db_connection(cls):
@@ -46,4 +47,6 @@ class WorkerDB:
 
     @classmethod
     def ensure_all_connections_sync(cls):
-        asyncio.run(cls.ensure_all_connections())
+        from workers.runtime import runtime
+
+        runtime.run(cls.ensure_all_connections())
@@ -0,0 +1,167 @@
+import asyncio
+import hashlib
+import mmap
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+from contextlib import asynccontextmanager, contextmanager
+from pathlib import Path
+
+# "file" needs BLOB_STORE_DIR on storage shared by every worker host,
+# "gridfs" stores blobs in MongoDB through the existing Motor client
+BLOB_STORE = os.getenv("BLOB_STORE", "file")
+BLOB_STORE_DIR = os.getenv(
+    "BLOB_STORE_DIR", os.path.join(tempfile.gettempdir(), "medical-rag-blobs")
+)
+BLOB_TTL_SECONDS = int(os.getenv("BLOB_TTL_SECONDS", str(24 * 60 * 60)))
+GRIDFS_BUCKET = "page_batches"
+
+
+def blob_key(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+@contextmanager
+def _mapped(path: Path):
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            yield mapped
+
+
+class FileBlobStore:
+    """Content-addressed blobs in a local or shared directory, read back via mmap."""
+
+    scheme = "file"
+
+    def __init__(self, root: str = BLOB_STORE_DIR):
+        self.root = Path(root)
+
+    def path(self, key: str) -> Path:
+        return self.root / key[:2] / key
+
+    def _write(self, key: str, data: bytes):
+        path = self.path(key)
+        if path.exists():
+            # Re-staged content stays alive for another TTL
+            os.utime(path)
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write then rename so readers never map a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent)
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    async def put(self, data: bytes) -> str:
+        key = blob_key(data)
+        await asyncio.to_thread(self._write, key, data)
+        return f"{self.scheme}:{key}"
+
+    @asynccontextmanager
+    async def open(self, key: str):
+        with _mapped(self.path(key)) as mapped:
+            yield mapped
+
+    def _prune(self, max_age: float) -> int:
+        if not self.root.exists():
+            return 0
+        cutoff = time.time() - max_age
+        removed = 0
+        for path in self.root.glob("*/*"):
+            try:
+                if path.is_file() and path.stat().st_mtime < cutoff:
+                    path.unlink()
+                    removed += 1
+            except FileNotFoundError:
+                pass
+        return removed
+
+    async def prune(self, max_age: float = BLOB_TTL_SECONDS) -> int:
+        return await asyncio.to_thread(self._prune, max_age)
+
+
+class GridFSBlobStore:
+    """
+    Content-addressed blobs in GridFS, for workers without a shared filesystem.
+    Reads are cached in a local FileBlobStore so they can be memory-mapped.
+    """
+
+    scheme = "gridfs"
+
+    def __init__(self, cache: FileBlobStore | None = None):
+        self.cache = cache or FileBlobStore(
+            os.path.join(BLOB_STORE_DIR, "gridfs-cache")
+        )
+        self._bucket = None
+        self._files = None
+
+    async def bucket(self):
+        if self._bucket is None:
+            from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+            from models.db_models import init_db
+
+            client = await init_db()
+            self._bucket = AsyncIOMotorGridFSBucket(
+                client["rag_db"], bucket_name=GRIDFS_BUCKET
+            )
+            self._files = client["rag_db"][f"{GRIDFS_BUCKET}.files"]
+        return self._bucket
+
+    async def put(self, data: bytes) -> str:
+        key = blob_key(data)
+        bucket = await self.bucket()
+        # Re-staged content stays alive for another TTL, as in FileBlobStore
+        refreshed = await self._files.update_many(
+            {"filename": key}, {"$set": {"uploadDate": datetime.utcnow()}}
+        )
+        if not refreshed.matched_count:
+            await bucket.upload_from_stream(key, data)
+        return f"{self.scheme}:{key}"
+
+    @asynccontextmanager
+    async def open(self, key: str):
+        if not self.cache.path(key).exists():
+            bucket = await self.bucket()
+            stream = await bucket.open_download_stream_by_name(key)
+            await asyncio.to_thread(self.cache._write, key, await stream.read())
+        async with self.cache.open(key) as mapped:
+            yield mapped
+
+    async def prune(self, max_age: float = BLOB_TTL_SECONDS) -> int:
+        bucket = await self.bucket()
+        cutoff = datetime.utcnow() - timedelta(seconds=max_age)
+        removed = 0
+        async for grid_out in bucket.find({"uploadDate": {"$lt": cutoff}}):
+            await bucket.delete(grid_out._id)
+            removed += 1
+        return removed + await self.cache.prune(max_age)
+
+
+_stores = {}
+
+
+def get_blob_store(scheme: str = BLOB_STORE):
+    if scheme not in _stores:
+        if scheme == FileBlobStore.scheme:
+            _stores[scheme] = FileBlobStore()
+        elif scheme == GridFSBlobStore.scheme:
+            _stores[scheme] = GridFSBlobStore()
+        else:
+            raise ValueError(f"Unknown blob store: {scheme}")
+    return _stores[scheme]
+
+
+async def stage_blob(data: bytes) -> str:
+    """Store bytes once and return a small reference such as `file:<sha256>`."""
+    return await get_blob_store().put(data)
+
+
+@asynccontextmanager
+async def open_blob(ref: str):
+    """Memory-mapped, read-only view of a staged blob."""
+    scheme, key = ref.split(":", 1)
+    if len(key) != 64 or any(c not in "0123456789abcdef" for c in key):
+        raise ValueError(f"Invalid blob reference: {ref}")
+    async with get_blob_store(scheme).open(key) as mapped:
+        yield mapped
@@ -0,0 +1,246 @@
+import argparse
+import os
+import sqlite3
+import threading
+from core.logger import get_logger
+from core.metrics import timed
+from core.registry import registry
+from services.hits import Hit, parse_page_range
+
+logger = get_logger()
+
+CHUNK_STORE_PATH = os.getenv("CHUNK_STORE_PATH", "data/chunk_store.db")
+CHUNK_STORE_ENABLED = os.getenv("CHUNK_STORE_ENABLED", "true").lower() == "true"
+# Neighbouring chunks added on each side of a hit; 0 turns expansion off
+CHUNK_EXPAND_WINDOW = int(os.getenv("CHUNK_EXPAND_WINDOW", "1"))
+# The text splitter's chunk_overlap; merged neighbours drop the repeated text
+CHUNK_OVERLAP = 100
+
+# A clustered (WITHOUT ROWID) primary key keeps each file's chunks in page
+# order on disk, so a neighbourhood is one short range scan
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS chunks (
+    file_id TEXT NOT NULL,
+    page_start INTEGER NOT NULL,
+    page_end INTEGER NOT NULL,
+    chunk_id INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    PRIMARY KEY (file_id, page_start, chunk_id)
+) WITHOUT ROWID
+"""
+_BEFORE = """
+SELECT page_start, page_end, chunk_id, text FROM chunks
+WHERE file_id = ? AND (page_start, chunk_id) < (?, ?)
+ORDER BY page_start DESC, chunk_id DESC LIMIT ?
+"""
+_FROM = """
+SELECT page_start, page_end, chunk_id, text FROM chunks
+WHERE file_id = ? AND (page_start, chunk_id) >= (?, ?)
+ORDER BY page_start, chunk_id LIMIT ?
+"""
+
+
+class ChunkStore:
+    """
+    Chunk text keyed by (file_id, page_range, chunk_id), in document order.
+    SQLite in WAL mode, so the API and worker processes on a host share one
+    file; each thread gets its own connection.
+    """
+
+    def __init__(self, path: str = CHUNK_STORE_PATH):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._local = threading.local()
+        with self._connection() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(_SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=10)
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def add(self, rows: list[tuple[str, int, int, int, str]]):
+        """Insert or replace (file_id, page_start, page_end, chunk_id, text) rows."""
+        with self._connection() as connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO chunks VALUES (?, ?, ?, ?, ?)", rows
+            )
+
+    def window(
+        self, file_id: str, page_start: int, chunk_id: int, size: int
+    ) -> list[tuple[int, int, int, str]]:
+        """The chunk and up to `size` chunks either side, in order; [] if it isn't stored."""
+        connection = self._connection()
+        after = connection.execute(
+            _FROM, (file_id, page_start, chunk_id, size + 1)
+        ).fetchall()
+        if not after or (after[0][0], after[0][2]) != (page_start, chunk_id):
+            return []
+        before = connection.execute(
+            _BEFORE, (file_id, page_start, chunk_id, size)
+        ).fetchall()
+        return before[::-1] + after
+
+    def count(self, file_id: str | None = None) -> int:
+        if file_id is None:
+            query, params = "SELECT COUNT(*) FROM chunks", ()
+        else:
+            query, params = "SELECT COUNT(*) FROM chunks WHERE file_id = ?", (file_id,)
+        return self._connection().execute(query, params).fetchone()[0]
+
+
+registry.register("chunk_store", ChunkStore)
+
+
+def get_chunk_store() -> ChunkStore | None:
+    if not CHUNK_STORE_ENABLED:
+        return None
+    try:
+        return registry.get("chunk_store")
+    except Exception as e:
+        logger.info(f"Chunk store unavailable: {e}")
+        return None
+
+
+def store_chunks(texts: list[str], metadatas: list[dict]):
+    """Record embedded chunks locally; a store failure never fails ingestion."""
+    store = get_chunk_store()
+    if store is None:
+        return
+    rows = []
+    for text, metadata in zip(texts, metadatas):
+        page_range = parse_page_range(metadata.get("page_range"))
+        if page_range is None or metadata.get("chunk_id") is None:
+            continue
+        rows.append(
+            (
+                metadata["file_id"],
+                page_range[0],
+                page_range[1],
+                int(metadata["chunk_id"]),
+                text,
+            )
+        )
+    try:
+        store.add(rows)
+    except Exception as e:
+        logger.info(f"Failed to store chunks locally: {e}")
+
+
+def merge_texts(first: str, second: str) -> str:
+    """Join consecutive chunks, dropping the splitter's overlap between them."""
+    for size in range(min(len(first), len(second), CHUNK_OVERLAP), 19, -1):
+        if first.endswith(second[:size]):
+            return first + second[size:]
+    return f"{first}\n{second}"
+
+
+class _Passage:
+    __slots__ = ("hit", "file_id", "keys", "rows")
+
+    def __init__(self, hit: Hit, rows: list[tuple[int, int, int, str]]):
+        self.hit = hit
+        self.file_id = hit.file_id
+        self.rows = rows
+        self.keys = {(row[0], row[2]) for row in rows}
+
+    def absorb(self, other: "_Passage"):
+        merged = {(row[0], row[2]): row for row in self.rows + other.rows}
+        self.rows = [merged[key] for key in sorted(merged)]
+        self.keys = set(merged)
+        if (other.hit.score or 0) > (self.hit.score or 0):
+            self.hit.score = other.hit.score
+
+    def to_hit(self) -> Hit:
+        hit = self.hit
+        text = self.rows[0][3]
+        for row in self.rows[1:]:
+            text = merge_texts(text, row[3])
+        hit.text = text
+        hit.page_range = (self.rows[0][0], max(row[1] for row in self.rows))
+        return hit
+
+
+def expand_hits(hits: list[Hit], window: int = CHUNK_EXPAND_WINDOW) -> list[Hit]:
+    """
+    Widen chunk hits with their stored neighbours and merge hits whose
+    neighbourhoods touch into one passage, kept at the rank of its best hit.
+    Summaries, and chunks the local store doesn't have, pass through as they are.
+    """
+    store = get_chunk_store() if window > 0 else None
+    if store is None:
+        return hits
+    passages: list[_Passage | Hit] = []
+    with timed("chunk_expand"):
+        for hit in hits:
+            rows = []
+            if hit.level == 0 and hit.page_range and isinstance(hit.chunk_id, int):
+                try:
+                    rows = store.window(
+                        hit.file_id, hit.page_range[0], hit.chunk_id, window
+                    )
+                except Exception as e:
+                    logger.info(f"Chunk expansion failed: {e}")
+            if not rows:
+                passages.append(hit)
+                continue
+            passage = _Passage(hit, rows)
+            touching = [
+                earlier
+                for earlier in passages
+                if isinstance(earlier, _Passage)
+                and earlier.file_id == passage.file_id
+                and earlier.keys & passage.keys
+            ]
+            if not touching:
+                passages.append(passage)
+                continue
+            # A hit between two earlier passages joins all three
+            first = touching[0]
+            for other in [passage, *touching[1:]]:
+                first.absorb(other)
+            passages = [p for p in passages if p is first or p not in touching]
+        return [p.to_hit() if isinstance(p, _Passage) else p for p in passages]
+
+
+def backfill_file(file_id: str) -> int:
+    """Copy a file's chunks from the vector index into the local store."""
+    from services.vector_db import list_record_ids, fetch_records
+
+    ids = [_id for _id in list_record_ids(f"{file_id}_") if "_summary_" not in _id]
+    texts, metadatas = [], []
+    for _, metadata in fetch_records(ids).values():
+        # The id prefix can also match longer file ids
+        text = metadata.get("content") or metadata.get("text")
+        if metadata.get("file_id") == file_id and text:
+            texts.append(text)
+            metadatas.append(metadata)
+    store_chunks(texts, metadatas)
+    return len(texts)
+
+
+# Usage: python -m services.chunk_store backfill Cardiology Nephrology
+def main():
+    parser = argparse.ArgumentParser(description="Local page-ordered chunk store")
+    parser.add_argument("command", choices=["backfill", "stats"])
+    parser.add_argument("file_ids", nargs="*")
+    args = parser.parse_args()
+
+    store = get_chunk_store()
+    if store is None:
+        raise SystemExit("Chunk store is disabled")
+    if args.command == "backfill":
+        for file_id in args.file_ids:
+            print(f"{file_id}: {backfill_file(file_id)} chunks")
+    else:
+        for file_id in args.file_ids or [None]:
+            print(f"{file_id or 'all'}: {store.count(file_id)} chunks")
+
+
+if __name__ == "__main__":
+    main()
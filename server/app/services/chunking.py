@@ -0,0 +1,197 @@
+import re
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+# Tables longer than this are split by rows, each part repeating the header
+TABLE_MAX_CHARS = 6000
+# Length of the embedded summary that stands in for a table in the index
+TABLE_SUMMARY_CHARS = 700
+# LlamaParse emits whole paragraphs as single lines, so a longer line that
+# starts with "Figure 2" is prose about the figure, not its caption
+CAPTION_MAX_CHARS = 300
+
+_TABLE_ROW = re.compile(r"^\s*\|.*\|\s*$")
+_TABLE_SEPARATOR = re.compile(r"^\s*\|?\s*:?-{3,}:?\s*(\|\s*:?-{3,}:?\s*)*\|?\s*$")
+_TABLE_CAPTION = re.compile(r"^\W*(table|tab\.)\s*\d+", re.IGNORECASE)
+_FIGURE_CAPTION = re.compile(r"^\W*(figure|fig\.)\s*\d+", re.IGNORECASE)
+_FIGURE_CHUNK = re.compile(r"^\W*(figure|fig\.)[\s:]", re.IGNORECASE)
+_IMAGE = re.compile(r"^\s*!\[(?P<alt>[^\]]*)\]\([^)]*\)\s*$")
+_HEADING = re.compile(r"^\s*#{1,6}\s+\S")
+
+
+def _cells(row: str) -> list[str]:
+    return [cell.strip() for cell in row.strip().strip("|").split("|")]
+
+
+def _compact_row(cells: list[str]) -> str:
+    return "| " + " | ".join(cells) + " |"
+
+
+def _figure_caption(line: str) -> bool:
+    return len(line.strip()) < CAPTION_MAX_CHARS and bool(_FIGURE_CAPTION.match(line))
+
+
+def _caption_line(line: str) -> bool:
+    # A table title, a heading, or a short bold line right above the table
+    stripped = line.strip()
+    return bool(
+        _TABLE_CAPTION.match(stripped)
+        or _HEADING.match(stripped)
+        or (
+            stripped.startswith("**")
+            and stripped.endswith("**")
+            and len(stripped) < 200
+        )
+    )
+
+
+def _table_chunks(caption: str | None, rows: list[str]) -> list[str]:
+    """The table in compact markdown, split by rows if it is too long."""
+    header = _compact_row(_cells(rows[0]))
+    separator = "|" + "---|" * len(_cells(rows[0]))
+    body = [_compact_row(_cells(row)) for row in rows[2:]]
+    chunks, part = [], []
+    size = len(header) + len(separator) + len(caption or "")
+    for row in body:
+        if part and size + len(row) > TABLE_MAX_CHARS:
+            chunks.append(part)
+            part, size = [], len(header) + len(separator) + len(caption or "")
+        part.append(row)
+        size += len(row) + 1
+    chunks.append(part)
+    texts = []
+    for i, part in enumerate(chunks):
+        title = caption if i == 0 or not caption else f"{caption} (continued)"
+        lines = ([title] if title else []) + [header, separator, *part]
+        texts.append("\n".join(lines))
+    return texts
+
+
+def split_elements(markdown_text: str) -> list[tuple[str, str]]:
+    """
+    Markdown as ordered (kind, text) blocks: "table" for each pipe table
+    with its caption, "figure" for each figure caption or captioned image,
+    and "text" for everything between them.
+    """
+    lines = markdown_text.split("\n")
+    blocks: list[tuple[str, str]] = []
+    text: list[str] = []
+
+    def flush_text():
+        if "".join(text).strip():
+            blocks.append(("text", "\n".join(text)))
+        text.clear()
+
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        if (
+            _TABLE_ROW.match(line)
+            and i + 1 < len(lines)
+            and _TABLE_SEPARATOR.match(lines[i + 1])
+        ):
+            end = i + 2
+            while end < len(lines) and _TABLE_ROW.match(lines[end]):
+                end += 1
+            # The caption is the closest non-blank line above, if it looks like one
+            caption = None
+            above = len(text) - 1
+            while above >= 0 and not text[above].strip():
+                above -= 1
+            if above >= 0 and _caption_line(text[above]):
+                caption = text[above].strip()
+                del text[above:]
+            flush_text()
+            for chunk in _table_chunks(caption, lines[i:end]):
+                blocks.append(("table", chunk))
+            i = end
+            continue
+        image = _IMAGE.match(line)
+        if image or _figure_caption(line):
+            caption = line.strip()
+            if image:
+                # Images are only worth indexing when they carry a caption
+                alt = image.group("alt").strip()
+                caption = f"Figure: {alt}" if alt else ""
+                if i + 1 < len(lines) and _figure_caption(lines[i + 1]):
+                    caption = lines[i + 1].strip() + (f" ({alt})" if alt else "")
+                    i += 1
+            if caption:
+                flush_text()
+                blocks.append(("figure", caption))
+            i += 1
+            continue
+        text.append(line)
+        i += 1
+    flush_text()
+    return blocks
+
+
+class ElementAwareSplitter:
+    """
+    Splits LlamaParse markdown into chunks without cutting tables apart:
+    each table becomes one chunk (or a few, by rows, each with the header),
+    each figure caption its own chunk, and the prose in between goes through
+    the character splitter as before. Chunks stay in document order.
+    """
+
+    def __init__(self, text_splitter: "RecursiveCharacterTextSplitter"):
+        self.text_splitter = text_splitter
+
+    def split_text(self, markdown_text: str) -> list[str]:
+        chunks = []
+        for kind, text in split_elements(markdown_text):
+            if kind == "text":
+                chunks.extend(self.text_splitter.split_text(text))
+            else:
+                chunks.append(text)
+        return chunks
+
+
+def chunk_type(text: str) -> str:
+    """'table', 'figure' or 'text', recognized from a chunk this splitter produced."""
+    lines = [line for line in text.strip().split("\n") if line.strip()]
+    if not lines:
+        return "text"
+    start = 1 if not _TABLE_ROW.match(lines[0]) else 0
+    rows = lines[start:]
+    if (
+        len(rows) >= 2
+        and _TABLE_SEPARATOR.match(rows[1])
+        and all(_TABLE_ROW.match(row) for row in rows)
+    ):
+        return "table"
+    if (
+        len(lines) == 1
+        and len(lines[0].strip()) < CAPTION_MAX_CHARS
+        and _FIGURE_CHUNK.match(lines[0])
+    ):
+        return "figure"
+    return "text"
+
+
+def table_summary(text: str) -> str:
+    """Caption, columns and row labels: the short text embedded for a table."""
+    lines = [line for line in text.strip().split("\n") if line.strip()]
+    caption = None if _TABLE_ROW.match(lines[0]) else lines[0].strip("*# ")
+    rows = lines[1:] if caption else lines
+    columns = [cell for cell in _cells(rows[0]) if cell]
+    labels = [_cells(row)[0] for row in rows[2:]]
+    summary = (
+        f"{caption or 'Table'}. Columns: {', '.join(columns)}. "
+        f"Rows: {', '.join(label for label in labels if label)}"
+    )
+    return summary[:TABLE_SUMMARY_CHARS]
+
+
+def chunk_fields(text: str) -> dict:
+    """
+    Record fields for a chunk: its type, and for tables the embedded summary
+    as `text` with the whole table kept in `content` for the prompt.
+    """
+    kind = chunk_type(text)
+    if kind == "table":
+        return {"chunk_type": kind, "text": table_summary(text), "content": text}
+    return {"chunk_type": kind, "text": text}
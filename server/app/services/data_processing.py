@@ -1,15 +1,19 @@
 import requests
-import fitz
 import os
 from io import BytesIO
-from typing import Generator, Tuple
-from llama_cloud_services import LlamaParse
-from llama_index.core import Document
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+from typing import TYPE_CHECKING, Generator, Tuple
+from core.registry import registry
+from core.metrics import timed
+from services.rate_limit import rate_limiter
 from services.vector_db import insert_text_chunk
 
+# fitz, LlamaParse and LangChain are imported where they are used to keep startup fast
+if TYPE_CHECKING:
+    from services.chunking import ElementAwareSplitter
+
 
 # Get File bytes stream
+@timed("download")
 def get_file_bytes_stream(file_url: str, chunk_size: int = 8192) -> BytesIO | None:
     try:
         print(f"Downloading from: {file_url}")
@@ -59,6 +63,18 @@ def get_file_bytes_stream(file_url: str, chunk_size: int = 8192) -> BytesIO | No
         return None
 
 
+# Text splitter shared by every ingestion path; tables and figures become their own chunks
+def get_text_splitter() -> "ElementAwareSplitter":
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    from services.chunking import ElementAwareSplitter
+
+    return ElementAwareSplitter(
+        RecursiveCharacterTextSplitter(
+            chunk_size=750, chunk_overlap=100, length_function=len
+        )
+    )
+
+
 # Generate PDF Processing Page Batches
 def get_page_batches(
     total_pages: int, batch_size: int
@@ -69,7 +85,10 @@ def get_page_batches(
 
 
 # Get PDF Page Range Batch Bytes Stream
+@timed("pdf_page_split")
 def get_batch_stream(doc, page_range):
+    import fitz
+
     new_pdf = fitz.open()
     for i in range(page_range[0] - 1, page_range[1]):
         new_pdf.insert_pdf(doc, from_page=i, to_page=i)
@@ -79,29 +98,52 @@ def get_batch_stream(doc, page_range):
     return output_stream
 
 
-# Convert PDF to Markdown using LlamaIndex
-async def convert_pdf_to_markdown_async(
-    file_stream: BytesIO, page_range: Tuple[int, int], file_name: str
-) -> str:
-    file_stream.seek(0)
-    if file_stream.getvalue() == b"":
-        raise ValueError("Empty input stream")
+def _build_llama_parser():
+    from llama_cloud_services import LlamaParse
 
-    parser = LlamaParse(
+    return LlamaParse(
         api_key=os.getenv("LLAMA_CLOUD_API_KEY"),
         result_type="markdown",
         verbose=False,
         # optionally partition_pages, etc.
     )
 
+
+registry.register("llama_parser", _build_llama_parser)
+
+
+# Convert PDF to Markdown using LlamaIndex
+async def convert_pdf_to_markdown_async(
+    file_stream: BytesIO | bytes | memoryview,
+    page_range: Tuple[int, int],
+    file_name: str,
+) -> str:
+    # Staged batches arrive as memory-mapped buffers instead of streams.
+    # LlamaParse takes bytes, so copy the input at most once
+    if isinstance(file_stream, BytesIO):
+        file_bytes = file_stream.getvalue()
+    elif isinstance(file_stream, bytes):
+        file_bytes = file_stream
+    else:
+        file_bytes = bytes(file_stream)
+    if not file_bytes:
+        raise ValueError("Empty input stream")
+
+    parser = registry.get("llama_parser")
+
     # LlamaParse requires a file_name in extra_info when passing bytes
-    file_bytes = file_stream.getvalue()
     safe_file_name = file_name or "document.pdf"
 
-    docs = await parser.aload_data(
-        file_bytes,
-        extra_info={"file_name": safe_file_name},
-    )
+    await rate_limiter.acquire("llamaparse")
+    try:
+        async with timed("llamaparse"):
+            docs = await parser.aload_data(
+                file_bytes,
+                extra_info={"file_name": safe_file_name},
+            )
+    except Exception as e:
+        rate_limiter.report("llamaparse", e)
+        raise
 
     if not docs:
         raise Exception("No parsed documents returned")
@@ -118,15 +160,15 @@ def process_pdf_embed(file_url: str, file_metadata: dict, batch_size: int = 2):
     print("Got file stream")
 
     # Get total pages
+    import fitz
+
     file_stream.seek(0)
     with fitz.open(stream=file_stream, filetype="pdf") as doc:
         total_pages = doc.page_count
     print(f"Total pages detected: {total_pages}")
 
     # Setup LangChain text splitter
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=750, chunk_overlap=100, length_function=len
-    )
+    text_splitter = get_text_splitter()
 
     # Process PDF in batches
     for page_range in get_page_batches(total_pages, batch_size):
@@ -0,0 +1,320 @@
+import argparse
+import asyncio
+import os
+import threading
+import time
+from typing import TYPE_CHECKING
+from core.logger import get_logger
+from core.metrics import timed
+from services.graph_db import get_graph_db
+from services.graph_export import (
+    GraphExport,
+    export_entity_graph,
+    normalize_entity,
+    query_ngrams,
+)
+from services.llm_models import stream_chat, get_mistral_model, MISTRAL_MODEL
+from services.rate_limit import rate_limiter, estimate_tokens
+
+if TYPE_CHECKING:
+    import numpy as np
+
+logger = get_logger()
+
+COMMUNITY_LABEL = "__Community__"
+# Communities smaller than this are too thin to summarize
+COMMUNITY_MIN_SIZE = int(os.getenv("COMMUNITY_MIN_SIZE", "3"))
+# Largest communities first; the long tail of tiny ones isn't worth the model calls
+COMMUNITY_MAX_COUNT = int(os.getenv("COMMUNITY_MAX_COUNT", "500"))
+COMMUNITY_SUMMARY_CONCURRENCY = 4
+# Relationships shown to the model per community
+COMMUNITY_MAX_FACTS = 60
+# How long query processes keep the community index before reloading it
+COMMUNITY_INDEX_TTL_SECONDS = float(os.getenv("COMMUNITY_INDEX_TTL_SECONDS", "600"))
+
+
+def label_propagation(
+    indptr: "np.ndarray",
+    indices: "np.ndarray",
+    max_iterations: int = 30,
+    seed: int = 0,
+) -> "np.ndarray":
+    """
+    Community label per node: each node repeatedly takes the most common
+    label among its neighbours. Vectorized as one sort of (node, neighbour
+    label) pairs per iteration. Updating a random half of the nodes each
+    round, with random tie-breaks, stops neighbours from swapping labels
+    back and forth as fully synchronous updates would. A node's own label
+    counts as half a vote, so it keeps it on ties.
+    """
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    node_count = len(indptr) - 1
+    labels = np.arange(node_count, dtype=np.int64)
+    if node_count == 0:
+        return labels
+    voters = np.concatenate(
+        [np.repeat(np.arange(node_count), np.diff(indptr)), np.arange(node_count)]
+    )
+    weights = np.concatenate([np.ones(len(indices)), np.full(node_count, 0.5)])
+    for _ in range(max_iterations):
+        keys = voters * node_count + np.concatenate([labels[indices], labels])
+        unique, inverse = np.unique(keys, return_inverse=True)
+        totals = np.bincount(inverse, weights=weights)
+        nodes, candidates = unique // node_count, unique % node_count
+        # Highest total per node, ties broken by a random priority per label
+        priority = rng.random(node_count)
+        order = np.lexsort((priority[candidates], -totals, nodes))
+        best = np.ones(len(order), dtype=bool)
+        best[1:] = nodes[order][1:] != nodes[order][:-1]
+        proposed = labels.copy()
+        proposed[nodes[order][best]] = candidates[order][best]
+        if np.count_nonzero(proposed != labels) <= node_count // 1000:
+            return proposed
+        update = rng.random(node_count) < 0.5
+        labels = np.where(update, proposed, labels)
+    return labels
+
+
+class Community:
+    __slots__ = ("id", "entities", "summary", "size")
+
+    def __init__(self, id: str, entities: list[str], summary: str = "", size=None):
+        self.id = id
+        self.entities = entities
+        self.summary = summary
+        self.size = size or len(entities)
+
+
+def detect_communities(export: GraphExport) -> tuple[list[Community], "np.ndarray"]:
+    """Communities of at least COMMUNITY_MIN_SIZE entities, largest first."""
+    import numpy as np
+
+    indptr, indices = export.undirected_csr()
+    labels = label_propagation(indptr, indices)
+    counts = np.bincount(labels, minlength=export.node_count)
+    communities = []
+    for label in np.argsort(-counts, kind="stable")[:COMMUNITY_MAX_COUNT]:
+        if counts[label] < COMMUNITY_MIN_SIZE:
+            break
+        members = np.flatnonzero(labels == label)
+        communities.append(
+            Community(
+                f"community_{len(communities)}",
+                [export.names[i] for i in members],
+            )
+        )
+    return communities, labels
+
+
+def community_facts(export: GraphExport, labels: "np.ndarray", label: int) -> list[str]:
+    """Relationships inside one community, as 'A -[TYPE]-> B' lines."""
+    import numpy as np
+
+    inside = np.flatnonzero(
+        (labels[export.src] == label) & (labels[export.dst] == label)
+    )
+    return [
+        f"{export.names[export.src[j]]} -[{export.rel_types[export.rel[j]]}]-> "
+        f"{export.names[export.dst[j]]}"
+        for j in inside[:COMMUNITY_MAX_FACTS]
+    ]
+
+
+async def summarize_community(entities: list[str], facts: list[str]) -> str:
+    listing = ", ".join(entities[:100])
+    relationships = "\n".join(facts)
+    messages = [
+        {
+            "role": "system",
+            "content": (
+                "You summarize clusters of a medical knowledge graph. Describe what the "
+                "entities have in common and the most important relationships between "
+                "them, in at most 120 words. Use only the information given."
+            ),
+        },
+        {
+            "role": "user",
+            "content": f"Entities: {listing}\n\nRelationships:\n{relationships}",
+        },
+    ]
+    await rate_limiter.acquire(
+        "mistral",
+        model=MISTRAL_MODEL,
+        tokens=estimate_tokens(listing) + estimate_tokens(relationships),
+    )
+    try:
+        async with timed("community_summary"):
+            parts = [part async for part in stream_chat(get_mistral_model(), messages)]
+    except Exception as e:
+        rate_limiter.report("mistral", e, model=MISTRAL_MODEL)
+        raise
+    return "".join(parts).strip()
+
+
+def _write_communities(graph, communities: list[Community]):
+    rows = [
+        {
+            "id": c.id,
+            "summary": c.summary,
+            "size": c.size,
+            "entities": c.entities,
+        }
+        for c in communities
+    ]
+    graph.query(
+        f"""
+        UNWIND $rows AS row
+        MERGE (c:{COMMUNITY_LABEL} {{id: row.id}})
+        SET c.summary = row.summary, c.size = row.size,
+            c.entities = row.entities, c.updated = timestamp()
+        """,
+        {"rows": rows},
+    )
+    graph.query(
+        f"MATCH (c:{COMMUNITY_LABEL}) WHERE NOT c.id IN $ids DETACH DELETE c",
+        {"ids": [c.id for c in communities]},
+    )
+
+
+async def build_graph_communities() -> dict:
+    """
+    Export the entity graph, detect communities with label propagation,
+    summarize each one and store them on __Community__ nodes in Neo4j.
+    """
+    started = time.perf_counter()
+    graph = get_graph_db()
+    if graph is None:
+        raise Exception("Neo4j not connected")
+    export = await asyncio.to_thread(export_entity_graph, graph)
+    with timed("community_detection"):
+        communities, labels = detect_communities(export)
+    logger.info(
+        f"{len(communities)} communities over {export.node_count} entities "
+        f"and {export.edge_count} relationships"
+    )
+
+    ids = {name: i for i, name in enumerate(export.names)}
+    limit = asyncio.Semaphore(COMMUNITY_SUMMARY_CONCURRENCY)
+
+    async def summarize(community: Community):
+        facts = community_facts(export, labels, labels[ids[community.entities[0]]])
+        async with limit:
+            community.summary = await summarize_community(community.entities, facts)
+
+    await asyncio.gather(*(summarize(c) for c in communities))
+    await asyncio.to_thread(_write_communities, graph, communities)
+    community_index.invalidate()
+    return {
+        "entities": export.node_count,
+        "relationships": export.edge_count,
+        "communities": len(communities),
+        "duration_seconds": round(time.perf_counter() - started, 2),
+    }
+
+
+class CommunityIndex:
+    """
+    Community summaries held in memory with an entity-name lookup, so the
+    query path finds relevant communities without a database round trip.
+    Reloaded from Neo4j when older than COMMUNITY_INDEX_TTL_SECONDS.
+    """
+
+    def __init__(self, ttl: float = COMMUNITY_INDEX_TTL_SECONDS):
+        self.ttl = ttl
+        self.communities: dict[str, Community] = {}
+        self.by_entity: dict[str, str] = {}
+        self.loaded_at: float | None = None
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        self.loaded_at = None
+
+    def load(self, rows: list[dict]):
+        communities = {}
+        by_entity = {}
+        for row in rows:
+            community = Community(
+                row["id"],
+                row.get("entities") or [],
+                row.get("summary") or "",
+                row.get("size"),
+            )
+            communities[community.id] = community
+            for entity in community.entities:
+                by_entity[normalize_entity(entity)] = community.id
+        self.communities, self.by_entity = communities, by_entity
+        self.loaded_at = time.monotonic()
+
+    def _ensure_loaded(self):
+        if self.loaded_at is not None and time.monotonic() - self.loaded_at < self.ttl:
+            return
+        with self._lock:
+            if (
+                self.loaded_at is not None
+                and time.monotonic() - self.loaded_at < self.ttl
+            ):
+                return
+            graph = get_graph_db()
+            if graph is None:
+                return
+            self.load(
+                graph.query(
+                    f"MATCH (c:{COMMUNITY_LABEL}) "
+                    "RETURN c.id AS id, c.summary AS summary, c.size AS size, "
+                    "c.entities AS entities"
+                )
+            )
+
+    def match(self, query: str, top_k: int = 3) -> list[tuple[Community, float]]:
+        """Communities whose entities are named in the query, best overlap first."""
+        self._ensure_loaded()
+        scores: dict[str, float] = {}
+        for name, words in query_ngrams(query):
+            community_id = self.by_entity.get(name)
+            if community_id is not None:
+                # Multi-word names are stronger evidence than single words
+                scores[community_id] = scores.get(community_id, 0.0) + words
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        return [
+            (self.communities[community_id], score)
+            for community_id, score in ranked[:top_k]
+            if self.communities[community_id].summary
+        ]
+
+
+community_index = CommunityIndex()
+
+
+def match_communities(query: str, top_k: int = 3) -> list[tuple[Community, float]]:
+    try:
+        with timed("community_match"):
+            return community_index.match(query, top_k)
+    except Exception as e:
+        logger.info(f"Community lookup failed: {e}")
+        return []
+
+
+# Usage: python -m services.graph_communities [--enqueue]
+def main():
+    parser = argparse.ArgumentParser(
+        description="Detect and summarize entity graph communities"
+    )
+    parser.add_argument(
+        "--enqueue", action="store_true", help="Run as a graphdb-jobs worker job"
+    )
+    args = parser.parse_args()
+
+    if args.enqueue:
+        from workers.queue import get_queue, GRAPHDB_QUEUE
+        from workers.graphdb_worker import rebuild_graph_communities
+
+        job = get_queue(GRAPHDB_QUEUE).enqueue(rebuild_graph_communities)
+        print(f"Enqueued {job.id}")
+        return
+    print(asyncio.run(build_graph_communities()))
+
+
+if __name__ == "__main__":
+    main()
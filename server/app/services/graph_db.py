@@ -1,76 +1,210 @@
 import os
 import asyncio
-from langchain_neo4j import Neo4jGraph
-from langchain_experimental.graph_transformers import LLMGraphTransformer
-from langchain_core.documents import Document
-from langchain_neo4j import GraphCypherQAChain
-from services.llm_models import mistal_model
-from lib.graph import allowed_relationships
+from core.registry import registry
+from core.metrics import timed
+from services.llm_models import get_mistral_model, MISTRAL_MODEL
+from services.rate_limit import rate_limiter, estimate_tokens
+from services.graph_schema import (
+    domain_for,
+    profile_names,
+    schema_profile,
+    transformer_kwargs,
+)
 from core.logger import get_logger
 
 neo4j_connection_url = os.getenv("NEO4J_CONNECTION_URL")
 neo4j_username = os.getenv("NEO4J_USERNAME")
 neo4j_password = os.getenv("NEO4J_PASSWORD")
 
-graph_db = None
-llm_transformer = None
-
 logger = get_logger()
 
 
-def init_graph_db():
-    global graph_db, llm_transformer
-    if graph_db and llm_transformer:
-        return
+def _connect_graph_db():
     if not neo4j_connection_url or not neo4j_username or not neo4j_password:
         logger.info("Neo4j Credentials Missing")
-        return
+        return None
+    from langchain_neo4j import Neo4jGraph
+
+    graph = Neo4jGraph(
+        url=neo4j_connection_url,
+        username=neo4j_username,
+        password=neo4j_password,
+        enhanced_schema=False,
+    )
+    logger.info("Neo4j connection established")
+    return graph
+
+
+def _build_llm_transformer(profile: str):
+    from langchain_experimental.graph_transformers import LLMGraphTransformer
+
+    return LLMGraphTransformer(
+        llm=get_mistral_model(),
+        **transformer_kwargs(profile),
+    )
+
+
+def _build_graph_qa_chain():
+    from langchain_neo4j import GraphCypherQAChain
+
+    return GraphCypherQAChain.from_llm(
+        graph=get_graph_db(),
+        llm=get_mistral_model(),
+        verbose=True,
+        allow_dangerous_requests=True,
+    )
+
+
+registry.register("neo4j_graph", _connect_graph_db)
+# One transformer per schema profile, so each prompt carries only its domain's triples
+for _profile in profile_names():
+    registry.register(
+        f"llm_graph_transformer:{_profile}",
+        lambda profile=_profile: _build_llm_transformer(profile),
+    )
+registry.register("graph_qa_chain", _build_graph_qa_chain)
+
+
+def get_graph_db():
+    """The Neo4j graph, connected on first use; None when unavailable."""
     try:
-        graph_db = Neo4jGraph(
-            url=neo4j_connection_url,
-            username=neo4j_username,
-            password=neo4j_password,
-            enhanced_schema=False,
-        )
-        logger.info("Neo4j connection established")
+        return registry.get("neo4j_graph")
     except Exception as e:
         logger.info(f"Failed to connect to Neo4j: {e}")
-        graph_db = None
-        return
+        return None
 
-    llm_transformer = LLMGraphTransformer(
-        llm=mistal_model,
-        allowed_relationships=allowed_relationships,
-    )
+
+def get_llm_transformer(domain: str | None = None):
+    return registry.get(f"llm_graph_transformer:{schema_profile(domain)}")
+
+
+def init_graph_db():
+    """Connect to Neo4j and build the graph transformer ahead of first use."""
+    if get_graph_db():
+        get_llm_transformer()
 
 
 async def query_graphdb_with_text(text: str):
-    if not graph_db:
+    if not get_graph_db():
         return {"error": "Neo4j not connected"}
 
-    chain = GraphCypherQAChain.from_llm(
-        graph=graph_db, llm=mistal_model, verbose=True, allow_dangerous_requests=True
+    chain = registry.get("graph_qa_chain")
+    # Cypher generation and the answer are two model calls
+    await rate_limiter.acquire(
+        "mistral", model=MISTRAL_MODEL, requests=2, tokens=estimate_tokens(text)
     )
-    return chain.invoke({"query": text})
+    try:
+        async with timed("cypher_qa"):
+            return await chain.ainvoke({"query": text})
+    except Exception as e:
+        rate_limiter.report("mistral", e, model=MISTRAL_MODEL)
+        raise
+
+
+async def _extract_graph_documents(llm_transformer, documents: list) -> list:
+    """One extraction call, paced by the shared Mistral budget."""
+    tokens = sum(estimate_tokens(doc.page_content) for doc in documents)
+    async with timed("graph_rate_limit_wait"):
+        await rate_limiter.acquire("mistral", model=MISTRAL_MODEL, tokens=tokens)
+    try:
+        async with timed("graph_extract"):
+            return await llm_transformer.aconvert_to_graph_documents(
+                documents=documents
+            )
+    except Exception as e:
+        rate_limiter.report("mistral", e, model=MISTRAL_MODEL)
+        raise
 
 
-GEMINI_RATE_LIMIT_PER_MINUTE = 15
-SECONDS_PER_REQUEST = 60 / GEMINI_RATE_LIMIT_PER_MINUTE
+def _apply_to_snapshot(graph_documents: list):
+    # Imported here: the snapshot module builds on this one
+    from services.graph_snapshot import apply_to_snapshot
+
+    try:
+        apply_to_snapshot(graph_documents)
+    except Exception as e:
+        logger.info(f"Graph snapshot update failed: {e}")
 
 
 async def insert_chunk_to_graphdb(chunk: str, metadata: dict):
-    if not graph_db or not llm_transformer:
+    graph_db = get_graph_db()
+    if not graph_db:
         print("Neo4j not available, skipping graph insertion")
         return
 
     try:
+        from langchain_core.documents import Document
+
+        llm_transformer = get_llm_transformer(domain_for(metadata))
         documents = [Document(page_content=chunk, metadata=metadata)]
-        await asyncio.sleep(SECONDS_PER_REQUEST)
-        graph_document_props = await llm_transformer.aconvert_to_graph_documents(
-            documents=documents,
+        graph_document_props = await _extract_graph_documents(
+            llm_transformer, documents
         )
         logger.info(graph_document_props)
-        graph_db.add_graph_documents(graph_document_props, baseEntityLabel=True)
+        async with timed("graph_write"):
+            await asyncio.to_thread(
+                graph_db.add_graph_documents, graph_document_props, baseEntityLabel=True
+            )
+        _apply_to_snapshot(graph_document_props)
         print("Successfully added to graph database")
     except Exception as e:
         print(f"Error adding to graph database: {e}")
+
+
+async def insert_chunks_to_graphdb_batch(
+    chunks: list[str], metadatas: list[dict], counts: dict | None = None
+) -> list[str | None]:
+    """
+    Extract graph documents chunk by chunk (paced by the rate limiter),
+    then write all of them to Neo4j in a single batched call.
+    Returns one error message per chunk, None where the chunk was added.
+    If `counts` is given, the written "entities" and "relationships" are added to it.
+    """
+    graph_db = get_graph_db()
+    if not graph_db:
+        print("Neo4j not available, skipping graph insertion")
+        return ["Neo4j not connected"] * len(chunks)
+    try:
+        # A batch comes from one file, so it shares one domain schema
+        llm_transformer = get_llm_transformer(
+            domain_for(metadatas[0]) if metadatas else None
+        )
+    except Exception as e:
+        return [str(e)] * len(chunks)
+    from langchain_core.documents import Document
+
+    errors: list[str | None] = [None] * len(chunks)
+    graph_documents = []
+    extracted = []
+    for idx, (chunk, metadata) in enumerate(zip(chunks, metadatas)):
+        try:
+            graph_documents.extend(
+                await _extract_graph_documents(
+                    llm_transformer,
+                    [Document(page_content=chunk, metadata=metadata)],
+                )
+            )
+            extracted.append(idx)
+        except Exception as e:
+            errors[idx] = str(e)
+
+    if graph_documents:
+        try:
+            async with timed("graph_write"):
+                await asyncio.to_thread(
+                    graph_db.add_graph_documents, graph_documents, baseEntityLabel=True
+                )
+            logger.info(
+                f"Added {len(graph_documents)} graph documents to graph database"
+            )
+            _apply_to_snapshot(graph_documents)
+            if counts is not None:
+                for doc in graph_documents:
+                    counts["entities"] = counts.get("entities", 0) + len(doc.nodes)
+                    counts["relationships"] = counts.get("relationships", 0) + len(
+                        doc.relationships
+                    )
+        except Exception as e:
+            for idx in extracted:
+                errors[idx] = str(e)
+    return errors
@@ -0,0 +1,146 @@
+import re
+from typing import TYPE_CHECKING
+from core.metrics import timed
+from services.graph_db import get_graph_db
+from services.graph_schema import canonical_relationship
+
+# numpy is imported where arrays are built, keeping it off the API import path
+if TYPE_CHECKING:
+    import numpy as np
+
+# Nodes written with baseEntityLabel=True carry this label next to their type
+ENTITY_LABEL = "__Entity__"
+
+_NODES_QUERY = f"""
+MATCH (n:{ENTITY_LABEL})
+RETURN n.id AS id, [l IN labels(n) WHERE l <> '{ENTITY_LABEL}'][0] AS label
+"""
+_EDGES_QUERY = f"""
+MATCH (a:{ENTITY_LABEL})-[r]->(b:{ENTITY_LABEL})
+RETURN a.id AS source, type(r) AS type, b.id AS target
+"""
+
+
+_WORD = re.compile(r"[a-z0-9]+")
+# Longest entity name matched against a query, in words
+MAX_ENTITY_WORDS = 5
+
+
+def normalize_entity(text: str) -> str:
+    return " ".join(_WORD.findall(text.lower()))
+
+
+def query_ngrams(query: str) -> list[tuple[str, int]]:
+    """Every normalized n-gram of the query that could name an entity, with its length."""
+    words = normalize_entity(query).split()
+    return [
+        (" ".join(words[start : start + n]), n)
+        for n in range(1, MAX_ENTITY_WORDS + 1)
+        for start in range(len(words) - n + 1)
+    ]
+
+
+class GraphExport:
+    """
+    The entity graph as integer arrays: node i is `names[i]`, edge j runs from
+    `src[j]` to `dst[j]` with relationship type `rel_types[rel[j]]`.
+    """
+
+    def __init__(
+        self,
+        names: list[str],
+        labels: list[str | None],
+        src: "np.ndarray",
+        dst: "np.ndarray",
+        rel: "np.ndarray",
+        rel_types: list[str],
+    ):
+        self.names = names
+        self.labels = labels
+        self.src = src
+        self.dst = dst
+        self.rel = rel
+        self.rel_types = rel_types
+
+    @property
+    def node_count(self) -> int:
+        return len(self.names)
+
+    @property
+    def edge_count(self) -> int:
+        return len(self.src)
+
+    def undirected_csr(self) -> tuple["np.ndarray", "np.ndarray"]:
+        """(indptr, indices) with every edge in both directions, self-loops dropped."""
+        import numpy as np
+
+        keep = self.src != self.dst
+        src = np.concatenate([self.src[keep], self.dst[keep]])
+        dst = np.concatenate([self.dst[keep], self.src[keep]])
+        return build_csr(self.node_count, src, dst)
+
+
+def build_csr(
+    node_count: int, src: "np.ndarray", dst: "np.ndarray"
+) -> tuple["np.ndarray", "np.ndarray"]:
+    """Compressed sparse rows: the neighbours of i are indices[indptr[i]:indptr[i + 1]]."""
+    import numpy as np
+
+    order = np.argsort(src, kind="stable")
+    indptr = np.zeros(node_count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=node_count), out=indptr[1:])
+    return indptr, dst[order].astype(np.int32)
+
+
+def graph_export_from_rows(nodes: list[dict], edges: list[dict]) -> GraphExport:
+    import numpy as np
+
+    ids: dict[str, int] = {}
+    names: list[str] = []
+    labels: list[str | None] = []
+
+    def intern(name: str, label: str | None = None) -> int:
+        index = ids.get(name)
+        if index is None:
+            index = ids[name] = len(names)
+            names.append(name)
+            labels.append(label)
+        return index
+
+    for node in nodes:
+        if node.get("id") is not None:
+            intern(str(node["id"]), node.get("label"))
+
+    rel_ids: dict[str, int] = {}
+    src, dst, rel = [], [], []
+    for edge in edges:
+        source, target = edge.get("source"), edge.get("target")
+        if source is None or target is None:
+            continue
+        # Edges written before the typed schema are read as their canonical type
+        rel_type, swapped = canonical_relationship(edge["type"])
+        if swapped:
+            source, target = target, source
+        src.append(intern(str(source)))
+        dst.append(intern(str(target)))
+        rel.append(rel_ids.setdefault(rel_type, len(rel_ids)))
+
+    return GraphExport(
+        names,
+        labels,
+        np.asarray(src, dtype=np.int32),
+        np.asarray(dst, dtype=np.int32),
+        np.asarray(rel, dtype=np.int16),
+        list(rel_ids),
+    )
+
+
+def export_entity_graph(graph=None) -> GraphExport:
+    """Read every entity and relationship from Neo4j into a GraphExport."""
+    graph = graph or get_graph_db()
+    if graph is None:
+        raise Exception("Neo4j not connected")
+    with timed("graph_export"):
+        return graph_export_from_rows(
+            graph.query(_NODES_QUERY), graph.query(_EDGES_QUERY)
+        )
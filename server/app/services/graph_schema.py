@@ -0,0 +1,390 @@
+import argparse
+import os
+import re
+from typing import NamedTuple
+
+# How extraction prompts are built: "domain" narrows the schema to the
+# document's specialty, "full" allows every typed triple, "legacy" sends the
+# flat relationship list from lib/graph.py untyped, as before.
+GRAPH_SCHEMA_MODE = os.getenv("GRAPH_SCHEMA_MODE", "domain")
+
+
+class Triple(NamedTuple):
+    """An allowed (source label, relationship, target label) for extraction."""
+
+    source: str
+    type: str
+    target: str
+
+
+NODE_LABELS = (
+    "Disease",
+    "Symptom",
+    "Drug",
+    "Procedure",
+    "Test",
+    "Anatomy",
+    "Gene",
+    "Protein",
+    "Pathogen",
+    "RiskFactor",
+    "Population",
+    "Study",
+)
+
+# Canonical triples by topic. Each relationship has one direction; inverses
+# and near-synonyms from the flat list are folded in through ALIASES.
+RELATIONSHIP_GROUPS: dict[str, list[Triple]] = {
+    "disease": [
+        Triple("Disease", "CAUSES", "Disease"),
+        Triple("Disease", "CAUSES", "Symptom"),
+        Triple("Pathogen", "CAUSES", "Disease"),
+        Triple("Disease", "COMPLICATES", "Disease"),
+        Triple("Disease", "PRESENTS_WITH", "Symptom"),
+        Triple("Disease", "ASSOCIATED_WITH", "Disease"),
+        Triple("RiskFactor", "RISK_FACTOR_FOR", "Disease"),
+        Triple("Disease", "PRECEDES", "Disease"),
+        Triple("Disease", "STAGE_OF", "Disease"),
+        Triple("Disease", "SUBTYPE_OF", "Disease"),
+        Triple("Disease", "AFFECTS", "Anatomy"),
+    ],
+    "treatment": [
+        Triple("Drug", "TREATS", "Disease"),
+        Triple("Drug", "TREATS", "Symptom"),
+        Triple("Procedure", "TREATS", "Disease"),
+        Triple("Drug", "CONTRAINDICATED_FOR", "Disease"),
+        Triple("Drug", "INTERACTS_WITH", "Drug"),
+        Triple("Drug", "POTENTIATES", "Drug"),
+        Triple("Symptom", "SIDE_EFFECT_OF", "Drug"),
+        Triple("Drug", "METABOLIZED_BY", "Protein"),
+        Triple("Drug", "MEMBER_OF", "Drug"),
+        Triple("Drug", "INHIBITS", "Protein"),
+    ],
+    "diagnostic": [
+        Triple("Test", "TESTS_FOR", "Disease"),
+        Triple("Test", "SCREENS_FOR", "Disease"),
+        Triple("Test", "RULES_OUT", "Disease"),
+        Triple("Test", "DETECTS", "Pathogen"),
+        Triple("Test", "MEASURES", "Protein"),
+        Triple("Test", "MONITORS", "Disease"),
+        Triple("Symptom", "INDICATES", "Disease"),
+    ],
+    "anatomy": [
+        Triple("Anatomy", "PART_OF", "Anatomy"),
+        Triple("Anatomy", "CONNECTS_TO", "Anatomy"),
+        Triple("Anatomy", "SUPPLIES", "Anatomy"),
+        Triple("Anatomy", "INNERVATES", "Anatomy"),
+        Triple("Anatomy", "DRAINS", "Anatomy"),
+        Triple("Disease", "LOCATED_IN", "Anatomy"),
+        Triple("Protein", "FUNCTIONS_IN", "Anatomy"),
+    ],
+    "molecular": [
+        Triple("Gene", "ENCODES", "Protein"),
+        Triple("Gene", "REGULATES", "Gene"),
+        Triple("Protein", "REGULATES", "Gene"),
+        Triple("Gene", "EXPRESSED_IN", "Anatomy"),
+        Triple("Gene", "MUTATED_IN", "Disease"),
+        Triple("Protein", "BINDS_TO", "Protein"),
+        Triple("Protein", "INTERACTS_WITH", "Protein"),
+        Triple("Protein", "ACTIVATES", "Protein"),
+        Triple("Protein", "INHIBITS", "Protein"),
+        Triple("Protein", "CATALYZES", "Protein"),
+        Triple("Protein", "MEDIATES", "Disease"),
+    ],
+    "prevention": [
+        Triple("Drug", "PREVENTS", "Disease"),
+        Triple("Procedure", "PREVENTS", "Disease"),
+        Triple("RiskFactor", "INCREASES", "Disease"),
+        Triple("Drug", "DECREASES", "RiskFactor"),
+    ],
+    "epidemiology": [
+        Triple("Disease", "PREVALENT_IN", "Population"),
+        Triple("Pathogen", "PREVALENT_IN", "Population"),
+        Triple("RiskFactor", "CORRELATES_WITH", "Disease"),
+    ],
+    "prognosis": [
+        Triple("Test", "PREDICTS", "Disease"),
+        Triple("Disease", "PREDICTS", "Disease"),
+        Triple("Disease", "RECURRENCE_OF", "Disease"),
+    ],
+    "evidence": [
+        Triple("Study", "EVIDENCE_FOR", "Drug"),
+        Triple("Study", "EVIDENCE_FOR", "Procedure"),
+        Triple("Study", "CONTRADICTED_BY", "Study"),
+    ],
+}
+
+# Legacy relationship types folded into a canonical one; True when the
+# legacy type points the other way (A TREATED_BY B is B TREATS A).
+# Edges extracted before the typed schema still carry these types: graph
+# exports (snapshot, communities) fold them on read, and `migrate` rewrites
+# them in Neo4j for the Cypher QA chain.
+ALIASES: dict[str, tuple[str, bool]] = {
+    "CAUSED_BY": ("CAUSES", True),
+    "PREDISPOSES_TO": ("RISK_FACTOR_FOR", False),
+    "COMPLICATED_BY": ("COMPLICATES", True),
+    "MANIFESTS_AS": ("PRESENTS_WITH", False),
+    "DIAGNOSED_BY": ("TESTS_FOR", True),
+    "DIAGNOSED_WITH": ("ASSOCIATED_WITH", False),
+    "SUGGESTS": ("INDICATES", False),
+    "SUPPORTS_DIAGNOSIS": ("INDICATES", False),
+    "FOLLOWS": ("PRECEDES", True),
+    "OCCURS_BEFORE": ("PRECEDES", False),
+    "OCCURS_AFTER": ("PRECEDES", True),
+    "OCCURS_DURING": ("ASSOCIATED_WITH", False),
+    "CONCURRENT_WITH": ("ASSOCIATED_WITH", False),
+    "TEMPORAL_SEQUENCE": ("PRECEDES", False),
+    "TREATED_BY": ("TREATS", True),
+    "INDICATED_FOR": ("TREATS", False),
+    "PRESCRIBED_FOR": ("TREATS", False),
+    "ADMINISTERED_VIA": ("ASSOCIATED_WITH", False),
+    "ENHANCES": ("POTENTIATES", False),
+    "ADVERSE_REACTION_TO": ("SIDE_EFFECT_OF", False),
+    "ALLERGIC_TO": ("SIDE_EFFECT_OF", False),
+    "CONTAINS": ("PART_OF", True),
+    "ADJACENT_TO": ("CONNECTS_TO", False),
+    "AFFECTED_BY": ("AFFECTS", True),
+    "DISRUPTS": ("AFFECTS", False),
+    "ENCODED_BY": ("ENCODES", True),
+    "REGULATED_BY": ("REGULATES", True),
+    "MODULATES": ("REGULATES", False),
+    "VARIANT_OF": ("SUBTYPE_OF", False),
+    "HOMOLOGOUS_TO": ("ASSOCIATED_WITH", False),
+    "SUBSTRATE_OF": ("CATALYZES", True),
+    "EVALUATES": ("MEASURES", False),
+    "CONFIRMS": ("TESTS_FOR", False),
+    "DIFFERENTIATES": ("RULES_OUT", False),
+    "EXCLUDES": ("RULES_OUT", False),
+    "SCREENING_FOR": ("SCREENS_FOR", False),
+    "CHRONIC_FORM_OF": ("SUBTYPE_OF", False),
+    "ACUTE_FORM_OF": ("SUBTYPE_OF", False),
+    "PHASE_OF": ("STAGE_OF", False),
+    "PROGRESSION_OF": ("STAGE_OF", False),
+    "IS_A": ("SUBTYPE_OF", False),
+    "PARENT_OF": ("SUBTYPE_OF", True),
+    "CHILD_OF": ("SUBTYPE_OF", False),
+    "SPECIALIZATION_OF": ("SUBTYPE_OF", False),
+    "GENERALIZATION_OF": ("SUBTYPE_OF", True),
+    "BELONGS_TO": ("MEMBER_OF", False),
+    "CLASSIFIED_AS": ("MEMBER_OF", False),
+    "CATEGORIZED_AS": ("MEMBER_OF", False),
+    "STUDIED_IN": ("EVIDENCE_FOR", True),
+    "SUPPORTED_BY": ("EVIDENCE_FOR", True),
+    "REPORTED_IN": ("EVIDENCE_FOR", True),
+    "PUBLISHED_IN": ("EVIDENCE_FOR", True),
+    "REFERENCED_BY": ("EVIDENCE_FOR", True),
+    "CITES": ("EVIDENCE_FOR", False),
+    "PROPORTIONAL_TO": ("CORRELATES_WITH", False),
+    "DOSE_DEPENDENT": ("CORRELATES_WITH", False),
+    "TIME_DEPENDENT": ("CORRELATES_WITH", False),
+    "AGE_DEPENDENT": ("CORRELATES_WITH", False),
+    "SEVERITY_RELATED": ("CORRELATES_WITH", False),
+    "FREQUENCY_RELATED": ("CORRELATES_WITH", False),
+    "INCIDENCE_IN": ("PREVALENT_IN", False),
+    "ENDEMIC_TO": ("PREVALENT_IN", False),
+    "EPIDEMIC_IN": ("PREVALENT_IN", False),
+    "DEMOGRAPHIC_FACTOR": ("PREVALENT_IN", True),
+    "GEOGRAPHIC_DISTRIBUTION": ("PREVALENT_IN", False),
+    "SEASONAL_PATTERN": ("PREVALENT_IN", False),
+    "PROGNOSTIC_FOR": ("PREDICTS", False),
+    "SURVIVAL_FACTOR": ("PREDICTS", False),
+    "OUTCOME_OF": ("CAUSES", True),
+    "RECOVERY_FROM": ("ASSOCIATED_WITH", False),
+    "REMISSION_OF": ("ASSOCIATED_WITH", False),
+    "RELAPSE_OF": ("RECURRENCE_OF", False),
+    "PREVENTED_BY": ("PREVENTS", True),
+    "PROTECTIVE_AGAINST": ("PREVENTS", False),
+    "PROPHYLAXIS_FOR": ("PREVENTS", False),
+    "VACCINATION_AGAINST": ("PREVENTS", False),
+    "RISK_REDUCTION": ("PREVENTS", False),
+    "MECHANISM_OF": ("MEDIATES", False),
+    "PATHWAY_OF": ("MEDIATES", False),
+    "UPSTREAM_OF": ("ACTIVATES", False),
+    "DOWNSTREAM_OF": ("ACTIVATES", True),
+    "DEACTIVATES": ("INHIBITS", False),
+}
+
+# Topics extracted for each document domain; keys follow lib/files.py
+DOMAIN_GROUPS: dict[str, tuple[str, ...]] = {
+    "Anatomy&Physiology": ("anatomy", "molecular", "disease"),
+    "Cardiology": ("disease", "treatment", "diagnostic", "anatomy", "prognosis"),
+    "Dentistry": ("disease", "treatment", "anatomy", "prevention"),
+    "EmergencyMedicine": ("disease", "treatment", "diagnostic"),
+    "Gastrology": ("disease", "treatment", "diagnostic", "anatomy"),
+    "General": ("disease", "treatment", "diagnostic", "prevention"),
+    "InfectiousDisease": (
+        "disease",
+        "treatment",
+        "diagnostic",
+        "prevention",
+        "epidemiology",
+    ),
+    "InternalMedicine": ("disease", "treatment", "diagnostic", "prognosis"),
+    "Nephrology": ("disease", "treatment", "diagnostic", "anatomy"),
+}
+DEFAULT_GROUPS = ("disease", "treatment", "diagnostic", "anatomy", "prevention")
+
+
+class GraphSchema:
+    """Node labels and typed triples handed to LLMGraphTransformer."""
+
+    def __init__(self, name: str, triples: list[Triple]):
+        self.name = name
+        # Deduplicated, in definition order
+        self.triples = list(dict.fromkeys(triples))
+
+    @property
+    def node_labels(self) -> list[str]:
+        used = {label for t in self.triples for label in (t.source, t.target)}
+        return [label for label in NODE_LABELS if label in used]
+
+    @property
+    def relationship_types(self) -> list[str]:
+        return list(dict.fromkeys(t.type for t in self.triples))
+
+    def transformer_kwargs(self) -> dict:
+        return {
+            "allowed_nodes": self.node_labels,
+            "allowed_relationships": list(self.triples),
+        }
+
+
+def _key(name: str) -> str:
+    return re.sub(r"[^a-z0-9]", "", name.lower())
+
+
+_DOMAINS = {_key(domain): domain for domain in DOMAIN_GROUPS}
+
+
+def schema_for_groups(name: str, groups: tuple[str, ...]) -> GraphSchema:
+    return GraphSchema(
+        name, [triple for group in groups for triple in RELATIONSHIP_GROUPS[group]]
+    )
+
+
+def full_schema() -> GraphSchema:
+    return schema_for_groups("full", tuple(RELATIONSHIP_GROUPS))
+
+
+def domain_for(metadata: dict) -> str | None:
+    """The lib/files.py domain of a chunk, from an explicit `domain` or its file id/name."""
+    for value in (
+        metadata.get("domain"),
+        metadata.get("file_id"),
+        os.path.splitext(metadata.get("file_name") or "")[0],
+    ):
+        if value and _key(str(value)) in _DOMAINS:
+            return _DOMAINS[_key(str(value))]
+    return None
+
+
+def schema_profile(domain: str | None) -> str:
+    """Name of the schema used for a domain; chunks sharing a profile share a transformer."""
+    if GRAPH_SCHEMA_MODE == "legacy":
+        return "legacy"
+    if GRAPH_SCHEMA_MODE == "full":
+        return "full"
+    return domain if domain in DOMAIN_GROUPS else "default"
+
+
+def profile_names() -> list[str]:
+    return ["legacy", "full", "default", *DOMAIN_GROUPS]
+
+
+def transformer_kwargs(profile: str) -> dict:
+    """allowed_nodes / allowed_relationships for an LLMGraphTransformer."""
+    if profile == "legacy":
+        from lib.graph import allowed_relationships
+
+        return {"allowed_relationships": list(dict.fromkeys(allowed_relationships))}
+    if profile == "full":
+        return full_schema().transformer_kwargs()
+    groups = DOMAIN_GROUPS.get(profile, DEFAULT_GROUPS)
+    return schema_for_groups(profile, groups).transformer_kwargs()
+
+
+def canonical_relationship(rel_type: str) -> tuple[str, bool]:
+    """The canonical type for a relationship type, and whether the edge flips."""
+    return ALIASES.get(rel_type, (rel_type, False))
+
+
+# Rewrites one batch of a legacy type; MERGE keeps an edge that already
+# exists under the canonical type from being duplicated. Several aliases are
+# coarser than their legacy type (HOMOLOGOUS_TO is only ASSOCIATED_WITH), so
+# the canonical edge lists the types it replaced in `legacy_types`
+_MIGRATE_QUERY = """
+MATCH (a)-[r:`{legacy}`]->(b)
+WITH a, r, b LIMIT $batch_size
+MERGE ({source})-[n:`{canonical}`]->({target})
+SET n += properties(r)
+SET n.legacy_types = CASE
+    WHEN type(r) IN coalesce(n.legacy_types, []) THEN n.legacy_types
+    ELSE coalesce(n.legacy_types, []) + type(r)
+END
+DELETE r
+RETURN count(*) AS moved
+"""
+
+
+def migrate_legacy_relationships(
+    graph=None, batch_size: int = 10000, dry_run: bool = False
+) -> dict[str, int]:
+    """
+    Rewrite every legacy-typed edge in Neo4j as its canonical type, keeping
+    the original type in the edge's `legacy_types`; counts per legacy type.
+    """
+    from services.graph_db import get_graph_db
+
+    graph = graph or get_graph_db()
+    if graph is None:
+        raise Exception("Neo4j not connected")
+    counts = {}
+    for legacy, (canonical, swapped) in ALIASES.items():
+        if dry_run:
+            rows = graph.query(f"MATCH ()-[r:`{legacy}`]->() RETURN count(r) AS n")
+            moved = rows[0]["n"] if rows else 0
+        else:
+            query = _MIGRATE_QUERY.format(
+                legacy=legacy,
+                canonical=canonical,
+                source="b" if swapped else "a",
+                target="a" if swapped else "b",
+            )
+            moved = 0
+            while True:
+                rows = graph.query(query, {"batch_size": batch_size})
+                batch = rows[0]["moved"] if rows else 0
+                moved += batch
+                if batch < batch_size:
+                    break
+        if moved:
+            counts[legacy] = moved
+    if not dry_run and hasattr(graph, "refresh_schema"):
+        # The Cypher QA chain prompts with the live schema
+        graph.refresh_schema()
+    return counts
+
+
+# Usage: python -m services.graph_schema migrate [--dry-run]
+def main():
+    parser = argparse.ArgumentParser(description="Graph extraction schema tools")
+    parser.add_argument("command", choices=["migrate"])
+    parser.add_argument("--batch-size", type=int, default=10000)
+    parser.add_argument(
+        "--dry-run", action="store_true", help="Count legacy edges without rewriting"
+    )
+    args = parser.parse_args()
+
+    counts = migrate_legacy_relationships(
+        batch_size=args.batch_size, dry_run=args.dry_run
+    )
+    print({"edges": sum(counts.values()), "by_type": counts})
+    if counts and not args.dry_run:
+        print(
+            "Rebuild derived data: python -m services.graph_snapshot build, "
+            "python -m services.graph_communities"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,558 @@
+import argparse
+import json
+import os
+import threading
+import time
+from typing import TYPE_CHECKING, Iterable
+from core.logger import get_logger
+from core.metrics import timed
+from core.registry import registry
+from services.graph_export import (
+    GraphExport,
+    build_csr,
+    export_entity_graph,
+    normalize_entity,
+    query_ngrams,
+)
+from services.graph_schema import canonical_relationship
+
+if TYPE_CHECKING:
+    import numpy as np
+
+logger = get_logger()
+
+# Where snapshots are written; versions live in subdirectories, CURRENT names the live one
+GRAPH_SNAPSHOT_DIR = os.getenv("GRAPH_SNAPSHOT_DIR", "data/graph_snapshot")
+# How often query processes check CURRENT for a newer snapshot
+SNAPSHOT_CHECK_SECONDS = 30
+# Facts handed to the model from a neighbourhood expansion
+SNAPSHOT_MAX_FACTS = 40
+
+_ARRAYS = (
+    "name_offsets",
+    "node_label",
+    "out_indptr",
+    "out_indices",
+    "out_rel",
+    "in_indptr",
+    "in_indices",
+    "in_rel",
+)
+
+
+def _gather(indptr, indices, rel, nodes: "np.ndarray"):
+    """Concatenated CSR rows of `nodes`: (owner, neighbour, relationship) per edge."""
+    import numpy as np
+
+    starts = indptr[nodes]
+    lengths = indptr[nodes + 1] - starts
+    total = int(lengths.sum())
+    if total == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, empty
+    # Position of every edge of every row, without a Python loop over rows
+    offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+    positions = offsets + np.arange(total)
+    return np.repeat(nodes, lengths), indices[positions], rel[positions]
+
+
+class GraphSnapshot:
+    """
+    Read-only copy of the entity graph for in-process traversal. Node names
+    are interned to integers and kept in a string table; edges are CSR
+    arrays in both directions with a relationship-type id per edge, so a
+    traversal can be restricted to any subset of the ~130 types with a mask
+    instead of one adjacency structure per type. Arrays are memory-mapped
+    from disk, so every worker process on a host shares the same pages.
+
+    New GraphDocuments are applied as an in-memory delta on top of the
+    mapped arrays and folded in by `compact()`. Neo4j stays the source of
+    truth; `build` re-exports it.
+    """
+
+    def __init__(self, arrays: dict, names_blob, meta: dict, path: str | None = None):
+        self.path = path
+        self.version = meta.get("version")
+        self.labels: list[str] = meta["labels"]
+        self.rel_types: list[str] = meta["rel_types"]
+        self._rel_ids = {name: i for i, name in enumerate(self.rel_types)}
+        self._arrays = arrays
+        self._names_blob = names_blob
+        self.base_nodes = len(arrays["node_label"])
+        self._name_ids: dict[str, int] | None = None
+        self._by_normalized: dict[str, int] | None = None
+        # Delta from GraphDocuments applied since the snapshot was written
+        self._extra_names: list[str] = []
+        self._extra_labels: list[int] = []
+        self._delta_out: dict[int, list[tuple[int, int]]] = {}
+        self._delta_in: dict[int, list[tuple[int, int]]] = {}
+        self._delta_edges = 0
+        self._lock = threading.Lock()
+
+    # Construction and persistence
+
+    @classmethod
+    def from_export(cls, export: GraphExport) -> "GraphSnapshot":
+        import numpy as np
+
+        encoded = [name.encode() for name in export.names]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        labels = sorted({label for label in export.labels if label})
+        label_ids = {label: i for i, label in enumerate(labels)}
+        arrays = {
+            "name_offsets": offsets,
+            "node_label": np.asarray(
+                [label_ids.get(label, -1) for label in export.labels], dtype=np.int16
+            ),
+        }
+        for direction, src, dst in (
+            ("out", export.src, export.dst),
+            ("in", export.dst, export.src),
+        ):
+            order = np.argsort(src, kind="stable")
+            indptr, indices = build_csr(export.node_count, src, dst)
+            arrays[f"{direction}_indptr"] = indptr
+            arrays[f"{direction}_indices"] = indices
+            arrays[f"{direction}_rel"] = export.rel[order].astype(np.int16)
+        meta = {"labels": labels, "rel_types": export.rel_types}
+        return cls(arrays, np.frombuffer(b"".join(encoded), dtype=np.uint8), meta)
+
+    def write(self, root: str = GRAPH_SNAPSHOT_DIR) -> str:
+        """Write a new version under `root` and point CURRENT at it."""
+        import numpy as np
+
+        snapshot = self.compacted() if self._delta_edges or self._extra_names else self
+        version = time.strftime("%Y%m%d-%H%M%S") + f"-{os.getpid()}"
+        path = os.path.join(root, version)
+        os.makedirs(path, exist_ok=True)
+        for name in _ARRAYS:
+            np.save(os.path.join(path, f"{name}.npy"), snapshot._arrays[name])
+        np.save(os.path.join(path, "names.npy"), np.asarray(snapshot._names_blob))
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump(
+                {
+                    "version": version,
+                    "labels": snapshot.labels,
+                    "rel_types": snapshot.rel_types,
+                    "nodes": snapshot.node_count,
+                    "edges": snapshot.edge_count,
+                },
+                f,
+            )
+        # Readers see either the old or the new version, never a partial one
+        pointer = os.path.join(root, "CURRENT")
+        with open(pointer + ".tmp", "w") as f:
+            f.write(version)
+        os.replace(pointer + ".tmp", pointer)
+        return path
+
+    @classmethod
+    def load(cls, root: str = GRAPH_SNAPSHOT_DIR) -> "GraphSnapshot | None":
+        import numpy as np
+
+        try:
+            with open(os.path.join(root, "CURRENT")) as f:
+                version = f.read().strip()
+        except FileNotFoundError:
+            return None
+        path = os.path.join(root, version)
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        arrays = {
+            name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+            for name in _ARRAYS
+        }
+        names_blob = np.load(os.path.join(path, "names.npy"), mmap_mode="r")
+        return cls(arrays, names_blob, meta, path=path)
+
+    # Names
+
+    @property
+    def node_count(self) -> int:
+        return self.base_nodes + len(self._extra_names)
+
+    @property
+    def edge_count(self) -> int:
+        return len(self._arrays["out_indices"]) + self._delta_edges
+
+    def name(self, node: int) -> str:
+        if node >= self.base_nodes:
+            return self._extra_names[node - self.base_nodes]
+        offsets = self._arrays["name_offsets"]
+        return bytes(self._names_blob[offsets[node] : offsets[node + 1]]).decode()
+
+    def _ensure_names(self):
+        # Decoding the string table once is cheaper than a sorted on-disk index at this size
+        if self._name_ids is None:
+            with self._lock:
+                if self._name_ids is None:
+                    ids = {self.name(i): i for i in range(self.node_count)}
+                    self._by_normalized = {
+                        normalize_entity(n): i for n, i in ids.items()
+                    }
+                    self._name_ids = ids
+
+    def node_id(self, name: str) -> int | None:
+        self._ensure_names()
+        node = self._name_ids.get(name)
+        if node is None:
+            node = self._by_normalized.get(normalize_entity(name))
+        return node
+
+    def match_entities(self, query: str) -> list[int]:
+        """Nodes named in the query, longest names first."""
+        self._ensure_names()
+        found = []
+        for ngram, _ in sorted(query_ngrams(query), key=lambda item: -item[1]):
+            node = self._by_normalized.get(ngram)
+            if node is not None and node not in found:
+                found.append(node)
+        return found
+
+    # Incremental refresh
+
+    def _intern(self, name: str, label: str | None) -> int:
+        node = self.node_id(name)
+        if node is None:
+            node = self.node_count
+            self._extra_names.append(name)
+            if label and label not in self.labels:
+                self.labels.append(label)
+            self._extra_labels.append(self.labels.index(label) if label else -1)
+            self._name_ids[name] = node
+            self._by_normalized[normalize_entity(name)] = node
+        return node
+
+    def apply_graph_documents(self, graph_documents: Iterable) -> int:
+        """Add new entities and relationships from GraphDocuments; returns edges added."""
+        self._ensure_names()
+        added = 0
+        with self._lock:
+            for document in graph_documents:
+                for node in document.nodes:
+                    self._intern(
+                        str(getattr(node, "id", node)), getattr(node, "type", None)
+                    )
+                for relationship in document.relationships:
+                    if isinstance(relationship, tuple):
+                        source, target, rel_type = *relationship, "RELATED"
+                    else:
+                        source = relationship.source
+                        target = relationship.target
+                        rel_type = relationship.type
+                    rel_type, swapped = canonical_relationship(rel_type)
+                    if swapped:
+                        source, target = target, source
+                    src = self._intern(
+                        str(getattr(source, "id", source)),
+                        getattr(source, "type", None),
+                    )
+                    dst = self._intern(
+                        str(getattr(target, "id", target)),
+                        getattr(target, "type", None),
+                    )
+                    rel = self._rel_ids.get(rel_type)
+                    if rel is None:
+                        rel = self._rel_ids[rel_type] = len(self.rel_types)
+                        self.rel_types.append(rel_type)
+                    if self._has_edge(src, dst, rel):
+                        continue
+                    self._delta_out.setdefault(src, []).append((dst, rel))
+                    self._delta_in.setdefault(dst, []).append((src, rel))
+                    self._delta_edges += 1
+                    added += 1
+        return added
+
+    def _has_edge(self, src: int, dst: int, rel: int) -> bool:
+        if (dst, rel) in self._delta_out.get(src, ()):
+            return True
+        if src >= self.base_nodes or dst >= self.base_nodes:
+            return False
+        indptr = self._arrays["out_indptr"]
+        row = slice(indptr[src], indptr[src + 1])
+        neighbours = self._arrays["out_indices"][row]
+        rels = self._arrays["out_rel"][row]
+        return bool(((neighbours == dst) & (rels == rel)).any())
+
+    def compacted(self) -> "GraphSnapshot":
+        """A new snapshot with the delta folded into the arrays."""
+        import numpy as np
+
+        src, dst, rel = self.edges()
+        export = GraphExport(
+            [self.name(i) for i in range(self.node_count)],
+            [self._label(i) for i in range(self.node_count)],
+            src.astype(np.int32),
+            dst.astype(np.int32),
+            rel.astype(np.int16),
+            list(self.rel_types),
+        )
+        return GraphSnapshot.from_export(export)
+
+    def _label(self, node: int) -> str | None:
+        if node >= self.base_nodes:
+            label = self._extra_labels[node - self.base_nodes]
+        else:
+            label = int(self._arrays["node_label"][node])
+        return self.labels[label] if label >= 0 else None
+
+    def edges(self):
+        """All edges as (src, dst, rel) arrays, delta included."""
+        import numpy as np
+
+        indptr = np.asarray(self._arrays["out_indptr"])
+        src = np.repeat(np.arange(self.base_nodes), np.diff(indptr))
+        dst = np.asarray(self._arrays["out_indices"], dtype=np.int64)
+        rel = np.asarray(self._arrays["out_rel"], dtype=np.int64)
+        delta = [(s, d, r) for s, pairs in self._delta_out.items() for d, r in pairs]
+        if delta:
+            extra = np.asarray(delta, dtype=np.int64)
+            src = np.concatenate([src, extra[:, 0]])
+            dst = np.concatenate([dst, extra[:, 1]])
+            rel = np.concatenate([rel, extra[:, 2]])
+        return src, dst, rel
+
+    # Traversal
+
+    def _rel_mask(self, rel_types: Iterable[str] | None):
+        import numpy as np
+
+        if rel_types is None:
+            return None
+        mask = np.zeros(len(self.rel_types), dtype=bool)
+        for name in rel_types:
+            if name in self._rel_ids:
+                mask[self._rel_ids[name]] = True
+        return mask
+
+    def _step(self, frontier: "np.ndarray", direction: str, mask):
+        """Edges leaving the frontier: (from, to, rel) arrays, delta included."""
+        import numpy as np
+
+        owners, neighbours, rels = [], [], []
+        base = frontier[frontier < self.base_nodes]
+        for side in ("out", "in") if direction == "both" else (direction,):
+            a = self._arrays
+            o, n, r = _gather(
+                a[f"{side}_indptr"], a[f"{side}_indices"], a[f"{side}_rel"], base
+            )
+            owners.append(o)
+            neighbours.append(n)
+            rels.append(r)
+            delta = self._delta_out if side == "out" else self._delta_in
+            if delta:
+                extra = [
+                    (int(node), d, rel)
+                    for node in frontier
+                    for d, rel in delta.get(int(node), ())
+                ]
+                if extra:
+                    extra = np.asarray(extra, dtype=np.int64)
+                    owners.append(extra[:, 0])
+                    neighbours.append(extra[:, 1])
+                    rels.append(extra[:, 2])
+        owners = np.concatenate(owners).astype(np.int64)
+        neighbours = np.concatenate(neighbours).astype(np.int64)
+        rels = np.concatenate(rels).astype(np.int64)
+        if mask is not None and len(rels):
+            keep = mask[rels]
+            owners, neighbours, rels = owners[keep], neighbours[keep], rels[keep]
+        return owners, neighbours, rels
+
+    def k_hop(
+        self,
+        seeds: list[int],
+        k: int = 2,
+        rel_types: Iterable[str] | None = None,
+        direction: str = "both",
+        limit: int = 1000,
+    ) -> dict[int, int]:
+        """Nodes within k hops of the seeds, mapped to their distance."""
+        import numpy as np
+
+        mask = self._rel_mask(rel_types)
+        distance = {int(node): 0 for node in seeds}
+        frontier = np.asarray(list(distance), dtype=np.int64)
+        for hop in range(1, k + 1):
+            if not len(frontier) or len(distance) >= limit:
+                break
+            _, neighbours, _ = self._step(frontier, direction, mask)
+            fresh = [
+                int(node) for node in np.unique(neighbours) if int(node) not in distance
+            ]
+            for node in fresh[: limit - len(distance)]:
+                distance[node] = hop
+            frontier = np.asarray(fresh, dtype=np.int64)
+        return distance
+
+    def shortest_path(
+        self,
+        source: int,
+        target: int,
+        max_hops: int = 4,
+        rel_types: Iterable[str] | None = None,
+    ) -> list[tuple[str, str, str]] | None:
+        """Triples (source, relationship, target) along a shortest path, ignoring direction."""
+        import numpy as np
+
+        mask = self._rel_mask(rel_types)
+        parent: dict[int, tuple[int, int, bool]] = {source: (-1, -1, True)}
+        frontier = np.asarray([source], dtype=np.int64)
+        for _ in range(max_hops):
+            if target in parent or not len(frontier):
+                break
+            fresh = []
+            for side in ("out", "in"):
+                owners, neighbours, rels = self._step(frontier, side, mask)
+                for owner, node, rel in zip(
+                    owners.tolist(), neighbours.tolist(), rels.tolist()
+                ):
+                    if node not in parent:
+                        parent[node] = (owner, rel, side == "out")
+                        fresh.append(node)
+            frontier = np.asarray(fresh, dtype=np.int64)
+        if target not in parent:
+            return None
+        path = []
+        node = target
+        while node != source:
+            previous, rel, forward = parent[node]
+            a, b = (previous, node) if forward else (node, previous)
+            path.append((self.name(a), self.rel_types[rel], self.name(b)))
+            node = previous
+        return path[::-1]
+
+    def neighbourhood_facts(
+        self, query: str, k: int = 1, max_facts: int = SNAPSHOT_MAX_FACTS
+    ) -> list[str]:
+        """'A -[TYPE]-> B' lines around the entities named in the query."""
+        import numpy as np
+
+        seeds = self.match_entities(query)
+        if not seeds:
+            return []
+        nodes = self.k_hop(seeds, k=k)
+        frontier = np.asarray(list(nodes), dtype=np.int64)
+        owners, neighbours, rels = self._step(frontier, "out", None)
+        # Edges touching a seed first, then the rest of the neighbourhood
+        seed_set = set(seeds)
+        facts, seen = [], set()
+        for owner, node, rel in sorted(
+            zip(owners.tolist(), neighbours.tolist(), rels.tolist()),
+            key=lambda edge: not (edge[0] in seed_set or edge[1] in seed_set),
+        ):
+            if node not in nodes or (owner, node, rel) in seen:
+                continue
+            seen.add((owner, node, rel))
+            facts.append(
+                f"{self.name(owner)} -[{self.rel_types[rel]}]-> {self.name(node)}"
+            )
+            if len(facts) >= max_facts:
+                break
+        return facts
+
+
+class _SnapshotHandle:
+    """The live snapshot for this process, swapped when CURRENT changes on disk."""
+
+    def __init__(self, root: str = GRAPH_SNAPSHOT_DIR):
+        self.root = root
+        self.snapshot: GraphSnapshot | None = None
+        self.version: str | None = None
+        self.checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self) -> GraphSnapshot | None:
+        if time.monotonic() - self.checked_at < SNAPSHOT_CHECK_SECONDS:
+            return self.snapshot
+        with self._lock:
+            self.checked_at = time.monotonic()
+            try:
+                with open(os.path.join(self.root, "CURRENT")) as f:
+                    version = f.read().strip()
+            except FileNotFoundError:
+                return self.snapshot
+            if version != self.version:
+                with timed("graph_snapshot_load"):
+                    self.snapshot = GraphSnapshot.load(self.root)
+                self.version = version
+                logger.info(f"Loaded graph snapshot {version}")
+            return self.snapshot
+
+
+registry.register("graph_snapshot", _SnapshotHandle)
+
+
+def get_graph_snapshot() -> GraphSnapshot | None:
+    """The current snapshot, or None when none has been built."""
+    try:
+        return registry.get("graph_snapshot").get()
+    except Exception as e:
+        logger.info(f"Graph snapshot unavailable: {e}")
+        return None
+
+
+def snapshot_facts(query: str, hops: int = 1) -> list[str]:
+    """Relationships around the entities the query names, read from the snapshot."""
+    snapshot = get_graph_snapshot()
+    if snapshot is None:
+        return []
+    try:
+        with timed("graph_snapshot_expand"):
+            return snapshot.neighbourhood_facts(query, k=hops)
+    except Exception as e:
+        logger.info(f"Graph snapshot lookup failed: {e}")
+        return []
+
+
+def apply_to_snapshot(graph_documents: list):
+    """Keep this process's snapshot (if one is loaded) in step with new writes."""
+    if registry.is_loaded("graph_snapshot"):
+        snapshot = registry.get("graph_snapshot").snapshot
+        if snapshot is not None:
+            snapshot.apply_graph_documents(graph_documents)
+
+
+def build_graph_snapshot(root: str = GRAPH_SNAPSHOT_DIR) -> dict:
+    """Export Neo4j and write it as the new current snapshot."""
+    snapshot = GraphSnapshot.from_export(export_entity_graph())
+    path = snapshot.write(root)
+    return {"path": path, "nodes": snapshot.node_count, "edges": snapshot.edge_count}
+
+
+# Usage: python -m services.graph_snapshot build | khop "Chronic Kidney Disease" | path A B
+def main():
+    parser = argparse.ArgumentParser(description="Build and query the graph snapshot")
+    parser.add_argument("command", choices=["build", "compact", "khop", "path"])
+    parser.add_argument("entities", nargs="*")
+    parser.add_argument("--hops", type=int, default=2)
+    parser.add_argument("--root", default=GRAPH_SNAPSHOT_DIR)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        print(build_graph_snapshot(args.root))
+        return
+    snapshot = GraphSnapshot.load(args.root)
+    if snapshot is None:
+        raise SystemExit(f"No snapshot in {args.root}")
+    if args.command == "compact":
+        print(snapshot.write(args.root))
+    elif args.command == "khop":
+        seeds = [snapshot.node_id(name) for name in args.entities]
+        started = time.perf_counter()
+        nodes = snapshot.k_hop([s for s in seeds if s is not None], k=args.hops)
+        elapsed = (time.perf_counter() - started) * 1000
+        print(f"{len(nodes)} nodes within {args.hops} hops ({elapsed:.2f} ms)")
+        for node, hops in sorted(nodes.items(), key=lambda item: item[1])[:50]:
+            print(f"  {hops} {snapshot.name(node)}")
+    elif args.command == "path":
+        source, target = (snapshot.node_id(name) for name in args.entities[:2])
+        if source is None or target is None:
+            raise SystemExit("Unknown entity")
+        for triple in snapshot.shortest_path(source, target, max_hops=args.hops) or []:
+            print("  {} -[{}]-> {}".format(*triple))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+from dataclasses import dataclass
+
+
+@dataclass(slots=True)
+class Hit:
+    """One vector search result, normalized once from whichever backend returned it."""
+
+    id: str | None
+    text: str
+    score: float | None
+    file_id: str | None = None
+    file_name: str | None = None
+    file_url: str | None = None
+    page_range: tuple[int, int] | None = None
+    chunk_id: int | str | None = None
+    level: int = 0
+    chunk_type: str = "text"
+
+    def reference(self) -> dict:
+        return {
+            "file_id": self.file_id,
+            "file_name": self.file_name,
+            "file_url": self.file_url,
+            "page_range": self.page_range,
+            "chunk_id": self.chunk_id,
+            "level": self.level,
+            "chunk_type": self.chunk_type,
+            "score": self.score,
+            "source": "vector_db",
+        }
+
+
+def parse_page_range(value) -> tuple[int, int] | None:
+    """(start, end) from the stored "3_4" form or a pair; None when malformed."""
+    try:
+        if isinstance(value, str):
+            start, end = value.split("_")
+        elif isinstance(value, (list, tuple)):
+            start, end = value
+        else:
+            return None
+        return int(start), int(end)
+    except (TypeError, ValueError):
+        return None
+
+
+def _hit(id, score, fields) -> Hit:
+    get = fields.get
+    chunk_id = get("chunk_id")
+    # Metadata is stored as strings; ids are ints where they can be
+    if chunk_id.__class__ is str and chunk_id.isdigit():
+        chunk_id = int(chunk_id)
+    level = get("level")
+    # Tables are embedded by a summary; the prompt gets the whole table
+    return Hit(
+        id,
+        get("content") or get("text") or "",
+        score,
+        get("file_id"),
+        get("file_name"),
+        get("file_url"),
+        parse_page_range(get("page_range")),
+        chunk_id,
+        int(level) if level else 0,
+        get("chunk_type") or "text",
+    )
+
+
+def hits_from_search(response) -> list[Hit]:
+    """Pinecone integrated-index search: response.result.hits with `fields`."""
+    return [
+        _hit(rec.get("_id"), rec.get("_score"), rec["fields"])
+        for rec in response.result.hits or []
+    ]
+
+
+def hits_from_records(records) -> list[Hit]:
+    """Flat records or classic query matches ({id, score, metadata})."""
+    hits = []
+    for rec in records or []:
+        fields = rec.get("metadata") or rec
+        hit = _hit(rec.get("_id") or rec.get("id"), rec.get("score"), fields)
+        if not hit.text and isinstance(rec.get("values"), str):
+            hit.text = rec["values"]
+        hits.append(hit)
+    return hits
+
+
+def to_hits(results) -> list[Hit]:
+    if results is None:
+        return []
+    if hasattr(results, "result"):
+        return hits_from_search(results)
+    if isinstance(results, list):
+        return hits_from_records(results)
+    if isinstance(results, dict):
+        return hits_from_records(results.get("records") or results.get("matches"))
+    return hits_from_records(
+        getattr(results, "records", None) or getattr(results, "matches", None)
+    )
+
+
+def _reference_block(number: int, hit: Hit) -> str:
+    # The header is short; the chunk text is copied once, in the final join
+    header = f"[Reference {number}]\n"
+    if hit.file_name:
+        header += f"File: {hit.file_name}\n"
+    if hit.file_url:
+        header += f"URL: {hit.file_url}\n"
+    if hit.page_range:
+        header += f"Pages: {hit.page_range[0]}-{hit.page_range[1]}\n"
+    return header + "Content: "
+
+
+def build_hit_context(hits: list[Hit]) -> str:
+    """Numbered reference blocks with file, URL and pages, for the model to cite."""
+    parts = []
+    for number, hit in enumerate(hits, 1):
+        if number > 1:
+            parts.append("\n\n---\n\n")
+        parts.append(_reference_block(number, hit))
+        parts.append(hit.text)
+    return "".join(parts)
@@ -0,0 +1,387 @@
+import argparse
+import asyncio
+import json
+import os
+import re
+import threading
+import time
+from io import BytesIO
+from typing import AsyncIterator
+from core.logger import get_logger
+from core.metrics import timed
+from core.sse import progress
+from services.data_processing import (
+    get_file_bytes_stream,
+    get_page_batches,
+    get_batch_stream,
+    get_text_splitter,
+    convert_pdf_to_markdown_async,
+)
+from services.vector_db import insert_text_chunks
+from services.graph_db import insert_chunks_to_graphdb_batch
+
+logger = get_logger()
+
+# Page batches in flight across the whole corpus; provider quotas are enforced by the rate limiter
+INGEST_CONCURRENCY = int(os.getenv("INGEST_CONCURRENCY", "8"))
+# Files downloaded and opened at once, ahead of the batch workers
+INGEST_LOAD_CONCURRENCY = 2
+
+# PyMuPDF is not thread-safe, so page splitting is serialized
+_fitz_lock = threading.Lock()
+
+
+class CorpusFile:
+    """One manifest entry and its running totals."""
+
+    def __init__(
+        self,
+        source: str,
+        file_id: str | None = None,
+        file_name: str | None = None,
+        metadata: dict | None = None,
+    ):
+        self.source = source
+        self.file_name = file_name or os.path.basename(source.split("?")[0])
+        self.file_id = file_id or _slug(self.file_name)
+        self.metadata = metadata or {}
+        self.status = "pending"
+        self.error: str | None = None
+        self.pages = 0
+        self.total_batches = 0
+        self.completed_batches = 0
+        self.failed_batches = 0
+        self.chunks = 0
+        self.vectors = 0
+        self.entities = 0
+        self.relationships = 0
+        self.started: float | None = None
+        self.finished: float | None = None
+        self.doc = None
+        self.stream: BytesIO | None = None
+
+    @property
+    def is_url(self) -> bool:
+        return self.source.startswith(("http://", "https://"))
+
+    def summary(self) -> dict:
+        return {
+            "file_id": self.file_id,
+            "file_name": self.file_name,
+            "status": self.status,
+            "error": self.error,
+            "pages": self.pages,
+            "batches": self.total_batches,
+            "failed_batches": self.failed_batches,
+            "chunks": self.chunks,
+            "vectors": self.vectors,
+            "entities": self.entities,
+            "relationships": self.relationships,
+            "duration_seconds": (
+                round(self.finished - self.started, 2)
+                if self.started and self.finished
+                else None
+            ),
+        }
+
+
+def _slug(name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_-]+", "-", os.path.splitext(name)[0]).strip("-")
+
+
+def load_manifest(path: str) -> list[CorpusFile]:
+    """
+    Read a JSON manifest: either a list of sources / objects with `source`
+    (plus optional file_id, file_name, metadata), or a {file_id: source}
+    mapping like lib/files.py.
+    """
+    with open(path) as f:
+        entries = json.load(f)
+    if isinstance(entries, dict):
+        return [CorpusFile(source, file_id=key) for key, source in entries.items()]
+    return [
+        CorpusFile(entry) if isinstance(entry, str) else CorpusFile(**entry)
+        for entry in entries
+    ]
+
+
+def _load_file(file: CorpusFile) -> int:
+    """Download or read the PDF and open it; returns the page count."""
+    import fitz
+
+    if file.is_url:
+        stream = get_file_bytes_stream(file.source)
+        if not stream:
+            raise Exception("Failed to download PDF file")
+    else:
+        with open(file.source, "rb") as f:
+            stream = BytesIO(f.read())
+    with timed("page_count"), _fitz_lock:
+        file.doc = fitz.open(stream=stream, filetype="pdf")
+        file.stream = stream
+        return file.doc.page_count
+
+
+def _split_batch(file: CorpusFile, page_range: tuple[int, int]) -> BytesIO:
+    with _fitz_lock:
+        return get_batch_stream(file.doc, page_range)
+
+
+def _close(file: CorpusFile):
+    if file.doc is not None:
+        with _fitz_lock:
+            file.doc.close()
+        file.doc = None
+    file.stream = None
+
+
+class CorpusIngestion:
+    """
+    Ingest many PDFs through one shared pool of page-batch workers. Files are
+    loaded a couple at a time and their page batches queued as soon as the
+    page count is known, so `concurrency` batches from any mix of files are
+    always in flight and LlamaParse, Pinecone and the graph model stay busy up
+    to their shared rate limits. `run()` yields progress events and finishes
+    with a per-file summary.
+    """
+
+    def __init__(
+        self,
+        files: list[CorpusFile],
+        user_id: str,
+        batch_size: int = 2,
+        concurrency: int = INGEST_CONCURRENCY,
+        metadata: dict | None = None,
+    ):
+        self.files = files
+        self.user_id = user_id
+        self.batch_size = batch_size
+        self.concurrency = max(1, concurrency)
+        self.metadata = metadata or {}
+        self._batches: asyncio.Queue = asyncio.Queue()
+        self._events: asyncio.Queue = asyncio.Queue()
+        self._text_splitter = None
+
+    async def run(self) -> AsyncIterator:
+        started = time.perf_counter()
+        self._text_splitter = get_text_splitter()
+        yield {
+            "status": "started",
+            "message": f"Ingesting {len(self.files)} files",
+            "total_files": len(self.files),
+        }
+
+        loaders = asyncio.create_task(self._load_all())
+        workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+        done = asyncio.create_task(self._drain(loaders))
+        try:
+            while True:
+                get_event = asyncio.ensure_future(self._events.get())
+                await asyncio.wait(
+                    [get_event, done], return_when=asyncio.FIRST_COMPLETED
+                )
+                if get_event.done():
+                    yield get_event.result()
+                    continue
+                get_event.cancel()
+                break
+            # Loaders and batches are done; flush what the workers reported last
+            while not self._events.empty():
+                yield self._events.get_nowait()
+        finally:
+            for task in [loaders, *workers]:
+                task.cancel()
+            await asyncio.gather(loaders, *workers, return_exceptions=True)
+            done.cancel()
+            for file in self.files:
+                _close(file)
+
+        summaries = [file.summary() for file in self.files]
+        totals = {
+            key: sum(summary[key] for summary in summaries)
+            for key in ("pages", "chunks", "vectors", "entities", "relationships")
+        }
+        totals["failed_files"] = sum(file.status != "completed" for file in self.files)
+        totals["duration_seconds"] = round(time.perf_counter() - started, 2)
+        yield {
+            "status": "completed",
+            "message": f"Ingested {len(self.files) - totals['failed_files']}/{len(self.files)} files",
+            "files": summaries,
+            "totals": totals,
+        }
+
+    async def _drain(self, loaders: asyncio.Task):
+        await loaders
+        await self._batches.join()
+
+    async def _load_all(self):
+        limit = asyncio.Semaphore(INGEST_LOAD_CONCURRENCY)
+
+        async def load(file: CorpusFile):
+            async with limit:
+                # Don't read further ahead than the workers can use
+                while self._batches.qsize() > self.concurrency * 2:
+                    await asyncio.sleep(0.1)
+                file.started = time.perf_counter()
+                file.status = "loading"
+                try:
+                    file.pages = await asyncio.to_thread(_load_file, file)
+                except Exception as e:
+                    self._finish(file, error=str(e))
+                    return
+            page_ranges = list(get_page_batches(file.pages, self.batch_size))
+            file.total_batches = len(page_ranges)
+            file.status = "processing"
+            await self._events.put(
+                progress(
+                    {
+                        "status": "file_loaded",
+                        "message": f"{file.file_name}: {file.pages} pages",
+                        "file_id": file.file_id,
+                        "total_pages": file.pages,
+                        "total_batches": file.total_batches,
+                    }
+                )
+            )
+            if not page_ranges:
+                self._finish(file)
+            for page_range in page_ranges:
+                self._batches.put_nowait((file, page_range))
+
+        await asyncio.gather(*(load(file) for file in self.files))
+
+    async def _worker(self):
+        while True:
+            file, page_range = await self._batches.get()
+            try:
+                await self._process_batch(file, page_range)
+            except Exception as e:
+                file.failed_batches += 1
+                file.error = str(e)
+                logger.info(f"{file.file_name} pages {page_range} failed: {e}")
+            finally:
+                file.completed_batches += 1
+                if file.completed_batches == file.total_batches:
+                    self._finish(file)
+                self._batches.task_done()
+
+    async def _process_batch(self, file: CorpusFile, page_range: tuple[int, int]):
+        batch_stream = await asyncio.to_thread(_split_batch, file, page_range)
+        markdown_text = await convert_pdf_to_markdown_async(
+            batch_stream, page_range, file_name=file.file_name
+        )
+        with timed("chunk_split"):
+            chunks = self._text_splitter.split_text(markdown_text)
+
+        base_metadata = {
+            **self.metadata,
+            **file.metadata,
+            "user_id": self.user_id,
+            "file_id": file.file_id,
+            "file_url": file.source if file.is_url else None,
+            "file_name": file.file_name,
+            "page_range": page_range,
+        }
+        metadatas = [{**base_metadata, "chunk_id": idx} for idx in range(len(chunks))]
+        vector_errors = await asyncio.to_thread(insert_text_chunks, chunks, metadatas)
+        counts: dict = {}
+        await insert_chunks_to_graphdb_batch(chunks, metadatas, counts=counts)
+
+        file.chunks += len(chunks)
+        file.vectors += vector_errors.count(None)
+        file.entities += counts.get("entities", 0)
+        file.relationships += counts.get("relationships", 0)
+        await self._events.put(
+            progress(
+                {
+                    "status": "batch_complete",
+                    "message": f"{file.file_name}: pages {page_range[0]}-{page_range[1]} done",
+                    "file_id": file.file_id,
+                    "page_range": page_range,
+                    "chunk_count": len(chunks),
+                    "batch": file.completed_batches + 1,
+                    "total_batches": file.total_batches,
+                }
+            )
+        )
+
+    def _finish(self, file: CorpusFile, error: str | None = None):
+        file.finished = time.perf_counter()
+        if error is not None:
+            file.error = error
+            file.status = "error"
+        elif file.failed_batches:
+            file.status = "partial"
+        else:
+            file.status = "completed"
+        _close(file)
+        self._events.put_nowait(
+            {
+                "status": "file_complete",
+                "message": f"{file.file_name}: {file.status}"
+                + (f" ({file.error})" if file.error else ""),
+                "file": file.summary(),
+            }
+        )
+
+
+# Usage: python -m services.ingestion corpus.json --user-id admin --concurrency 8 --summaries
+def main():
+    parser = argparse.ArgumentParser(description="Ingest a corpus of PDFs")
+    parser.add_argument(
+        "manifest",
+        help="JSON list of PDF URLs/paths, or a {file_id: source} mapping",
+    )
+    parser.add_argument("--user-id", default="admin")
+    parser.add_argument("--batch-size", type=int, default=2)
+    parser.add_argument("--concurrency", type=int, default=INGEST_CONCURRENCY)
+    parser.add_argument("--output", default=None, help="Write the summary here")
+    parser.add_argument(
+        "--summaries",
+        action="store_true",
+        help="Build each ingested file's summary tree afterwards",
+    )
+    args = parser.parse_args()
+
+    ingestion = CorpusIngestion(
+        load_manifest(args.manifest),
+        user_id=args.user_id,
+        batch_size=args.batch_size,
+        concurrency=args.concurrency,
+    )
+
+    async def run():
+        async for event in ingestion.run():
+            data = getattr(event, "data", event)
+            if data["status"] == "completed":
+                break
+            print(data["message"])
+        if args.summaries:
+            from services.summary_tree import build_summary_tree
+
+            data["summary_trees"] = []
+            for summary in data["files"]:
+                if summary["vectors"]:
+                    tree = await build_summary_tree(
+                        summary["file_id"], expected_chunks=summary["vectors"]
+                    )
+                    print(f"{summary['file_id']}: summary levels {tree['levels']}")
+                    data["summary_trees"].append(tree)
+        return data
+
+    result = asyncio.run(run())
+    for summary in result["files"]:
+        print(
+            f"{summary['file_id']:<24} {summary['status']:<9} "
+            f"pages={summary['pages']} chunks={summary['chunks']} "
+            f"vectors={summary['vectors']} entities={summary['entities']} "
+            f"{summary['duration_seconds']}s"
+        )
+    print(json.dumps(result["totals"]))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,79 @@
 import os
+import sys
 import getpass
-from langchain.chat_models import init_chat_model
 from dotenv import load_dotenv
+from core.registry import registry
+from core.utils import iterate_in_thread
 
 load_dotenv()
 
+GEMINI_MODEL = "gemini-2.5-flash"
+MISTRAL_MODEL = "ministral-3b-latest"
+# Provider model ids behind the router's names, for per-model rate limits
+MODEL_IDS = {"gemini": GEMINI_MODEL, "mistral": MISTRAL_MODEL}
+
+
+def _require_key(env_var: str, provider: str):
+    if os.environ.get(env_var):
+        return
+    # Only prompt when someone is at a terminal; servers should fail clearly
+    if not sys.stdin or not sys.stdin.isatty():
+        raise RuntimeError(f"{env_var} is not set")
+    os.environ[env_var] = getpass.getpass(f"Enter API key for {provider}: ")
+
+
 # Gemini LLM
-if not os.environ.get("GOOGLE_API_KEY"):
-    os.environ["GOOGLE_API_KEY"] = getpass.getpass("Enter API key for Google Gemini: ")
-gemini_model = init_chat_model("gemini-2.5-flash", model_provider="google_genai")
+def _build_gemini_model():
+    from langchain.chat_models import init_chat_model
+
+    _require_key("GOOGLE_API_KEY", "Google Gemini")
+    return init_chat_model(GEMINI_MODEL, model_provider="google_genai")
+
 
 # Mistral LLM
-if not os.environ.get("MISTRAL_API_KEY"):
-    os.environ["MISTRAL_API_KEY"] = getpass.getpass("Enter API key for Mistral AI: ")
-mistal_model = init_chat_model("ministral-3b-latest", model_provider="mistralai")
+def _build_mistral_model():
+    from langchain.chat_models import init_chat_model
+
+    _require_key("MISTRAL_API_KEY", "Mistral AI")
+    return init_chat_model(MISTRAL_MODEL, model_provider="mistralai")
+
+
+registry.register("gemini_model", _build_gemini_model)
+registry.register("mistral_model", _build_mistral_model)
+
+
+def get_gemini_model():
+    return registry.get("gemini_model")
+
+
+def get_mistral_model():
+    return registry.get("mistral_model")
+
+
+def __getattr__(name: str):
+    # Keeps `from services.llm_models import gemini_model` working, built on first access
+    if name == "gemini_model":
+        return get_gemini_model()
+    if name == "mistal_model":
+        return get_mistral_model()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+async def stream_chat(model_obj, messages: list[dict]):
+    """
+    Yield response text from a chat model as it is generated. Models without
+    `astream` run in a worker thread and their chunks are forwarded one by one,
+    so time to first token matches native async streaming.
+    """
+    if hasattr(model_obj, "astream"):
+        chunks = model_obj.astream(messages)
+    elif hasattr(model_obj, "stream"):
+        chunks = iterate_in_thread(lambda: model_obj.stream(messages))
+    else:
+        # Non-streaming backends produce a single chunk once the call returns
+        chunks = iterate_in_thread(lambda: [model_obj.invoke(messages)])
+
+    async for chunk in chunks:
+        content = getattr(chunk, "content", None) or str(chunk)
+        if content:
+            yield content
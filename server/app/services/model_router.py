@@ -0,0 +1,307 @@
+import asyncio
+import os
+import time
+from collections import deque
+from contextlib import suppress
+from functools import lru_cache
+from typing import AsyncIterator
+from core.logger import get_logger
+from core.metrics import metrics, observe_stage
+from services.llm_models import (
+    stream_chat,
+    get_gemini_model,
+    get_mistral_model,
+    MODEL_IDS,
+)
+from services.rate_limit import rate_limiter, estimate_tokens
+
+logger = get_logger()
+
+# "preferred": the requested model first; "fastest": lowest recent p50 TTFT first
+MODEL_ROUTING_POLICY = os.getenv("MODEL_ROUTING_POLICY", "preferred")
+# Start the next model if the first token hasn't arrived by then (0, the
+# default, disables hedging). Used as a floor under the model's p95 TTFT
+MODEL_HEDGE_AFTER_SECONDS = float(os.getenv("MODEL_HEDGE_AFTER_SECONDS", "0"))
+# Models failing more often than this are tried last
+MODEL_MAX_ERROR_RATE = float(os.getenv("MODEL_MAX_ERROR_RATE", "0.5"))
+
+STATS_WINDOW = 200
+MIN_SAMPLES = 5
+
+
+class ModelStats:
+    """Moving window of time-to-first-token samples and outcomes for one model."""
+
+    def __init__(self, window: int = STATS_WINDOW):
+        self.ttft: deque[float] = deque(maxlen=window)
+        self.outcomes: deque[bool] = deque(maxlen=window)
+
+    def record_success(self, ttft: float):
+        self.ttft.append(ttft)
+        self.outcomes.append(True)
+
+    def record_error(self):
+        self.outcomes.append(False)
+
+    def percentile(self, q: float) -> float | None:
+        if not self.ttft:
+            return None
+        samples = sorted(self.ttft)
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    @property
+    def p50(self) -> float | None:
+        return self.percentile(0.5)
+
+    @property
+    def p95(self) -> float | None:
+        return self.percentile(0.95)
+
+    @property
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    def snapshot(self) -> dict:
+        return {
+            "p50_ttft": self.p50,
+            "p95_ttft": self.p95,
+            "error_rate": round(self.error_rate, 3),
+            "samples": len(self.outcomes),
+        }
+
+
+class _Attempt:
+    """One model's stream, with its first chunk being fetched in a task."""
+
+    def __init__(self, name: str, models, messages: list[dict], hedge: bool):
+        self.name = name
+        self.hedge = hedge
+        self.started = time.perf_counter()
+        self.chunks: AsyncIterator[str] | None = None
+        self.first = asyncio.create_task(self._first_chunk(models, messages))
+
+    async def _first_chunk(self, models, messages: list[dict]) -> str | None:
+        model_id = MODEL_IDS.get(self.name)
+        # Waiting for quota counts towards TTFT, so a throttled model gets hedged
+        await rate_limiter.acquire(
+            self.name,
+            model=model_id,
+            tokens=sum(estimate_tokens(str(m.get("content", ""))) for m in messages),
+        )
+        try:
+            # Resolving the model here lets a client that fails to build count as a failed attempt
+            self.chunks = stream_chat(models[self.name], messages)
+            # None means the model finished without producing any text
+            async for content in self.chunks:
+                return content
+            return None
+        except Exception as e:
+            rate_limiter.report(self.name, e, model=model_id)
+            raise
+
+    async def aclose(self):
+        if self.chunks is not None:
+            await self.chunks.aclose()
+
+    async def cancel(self):
+        self.first.cancel()
+        with suppress(BaseException):
+            await self.first
+        await self.aclose()
+
+
+class RoutedStream:
+    """Async iterator over the winning model's output; `model` names the winner."""
+
+    def __init__(self, router: "ModelRouter", messages: list[dict], preferred: str):
+        self.router = router
+        self.messages = messages
+        self.preferred = preferred
+        self.model: str | None = None
+        self.hedged = False
+
+    def __aiter__(self) -> AsyncIterator[str]:
+        return self._stream()
+
+    async def _stream(self) -> AsyncIterator[str]:
+        attempt, first = await self.router._first_token(self)
+        self.model = attempt.name
+        stats = self.router.stats[attempt.name]
+        started = time.perf_counter()
+        try:
+            if first is not None:
+                yield first
+            async for content in attempt.chunks:
+                yield content
+        except Exception:
+            # Already streaming to the client, so there is no switching models now
+            stats.record_error()
+            _count_error(attempt.name)
+            raise
+        finally:
+            observe_stage("llm_generation", time.perf_counter() - started)
+            await attempt.aclose()
+
+
+class ModelRouter:
+    """
+    Routes chat requests across interchangeable models. Candidates are ordered
+    by policy, with models over `max_error_rate` moved to the back. A model that
+    fails before its first token falls through to the next candidate, and if
+    the first token takes longer than `hedge_after` the next candidate is
+    started alongside it; whichever produces a token first wins and the other
+    is cancelled. Once a model has enough samples, it gets until its p95 TTFT
+    when that is longer than `hedge_after`. Hedging is off unless configured.
+    """
+
+    def __init__(
+        self,
+        models: dict,
+        policy: str = MODEL_ROUTING_POLICY,
+        hedge_after: float | None = MODEL_HEDGE_AFTER_SECONDS,
+        max_error_rate: float = MODEL_MAX_ERROR_RATE,
+    ):
+        self.models = models
+        self.policy = policy
+        self.hedge_after = hedge_after or None
+        self.max_error_rate = max_error_rate
+        self.stats = {name: ModelStats() for name in models}
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def candidates(self, preferred: str | None = None) -> list[str]:
+        names = list(self.models)
+        if self.policy == "fastest":
+            # Models without samples sort first so they get measured
+            names.sort(key=lambda name: self.stats[name].p50 or 0.0)
+        elif preferred in self.models:
+            names.remove(preferred)
+            names.insert(0, preferred)
+
+        def unhealthy(name: str) -> bool:
+            stats = self.stats[name]
+            return (
+                len(stats.outcomes) >= MIN_SAMPLES
+                and stats.error_rate > self.max_error_rate
+            )
+
+        # Stable sort keeps the policy order within each group
+        return sorted(names, key=unhealthy)
+
+    def stream(
+        self, messages: list[dict], preferred: str | None = None
+    ) -> RoutedStream:
+        return RoutedStream(self, messages, preferred)
+
+    def hedge_delay(self, name: str) -> float | None:
+        """How long `name` gets to produce a first token before the next model starts."""
+        if self.hedge_after is None:
+            return None
+        stats = self.stats[name]
+        if len(stats.ttft) < MIN_SAMPLES:
+            return self.hedge_after
+        return max(self.hedge_after, stats.p95)
+
+    def _start(self, name: str, messages: list[dict], hedge: bool = False) -> _Attempt:
+        return _Attempt(name, self.models, messages, hedge)
+
+    async def _first_token(self, routed: RoutedStream) -> tuple[_Attempt, str | None]:
+        """Race candidates until one yields a first chunk; cancel the rest."""
+        pending = list(self.candidates(routed.preferred))
+        running: list[_Attempt] = []
+        last_error: BaseException | None = None
+        try:
+            while pending or running:
+                if not running:
+                    running.append(self._start(pending.pop(0), routed.messages))
+
+                # Measured from the latest start, which is the one being waited on
+                delay = self.hedge_delay(running[-1].name) if pending else None
+                if delay is not None:
+                    delay = max(0.0, running[-1].started + delay - time.perf_counter())
+                done, _ = await asyncio.wait(
+                    [attempt.first for attempt in running],
+                    timeout=delay,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                if not done:
+                    name = pending.pop(0)
+                    logger.info(
+                        f"No first token from {running[-1].name} in time, hedging with {name}"
+                    )
+                    self.hedges += 1
+                    routed.hedged = True
+                    running.append(self._start(name, routed.messages, hedge=True))
+                    continue
+
+                for attempt in [a for a in running if a.first in done]:
+                    running.remove(attempt)
+                    stats = self.stats[attempt.name]
+                    error = attempt.first.exception()
+                    if error is not None:
+                        logger.info(
+                            f"Model {attempt.name} failed before first token: {error}"
+                        )
+                        stats.record_error()
+                        _count_error(attempt.name)
+                        last_error = error
+                        await attempt.aclose()
+                        continue
+
+                    ttft = time.perf_counter() - attempt.started
+                    stats.record_success(ttft)
+                    observe_stage("llm_ttft", ttft)
+                    metrics.histogram(
+                        "llm_ttft_seconds",
+                        {"model": attempt.name},
+                        help="Time to first token per model",
+                    ).observe(ttft)
+                    self.hedge_wins += attempt.hedge
+                    return attempt, attempt.first.result()
+            raise last_error or RuntimeError("No chat models configured")
+        finally:
+            for attempt in running:
+                await attempt.cancel()
+
+    def collect(self):
+        yield "model_router_hedges", {}, self.hedges
+        yield "model_router_hedge_wins", {}, self.hedge_wins
+        for name, stats in self.stats.items():
+            yield "model_error_rate", {"model": name}, stats.error_rate
+
+    def snapshot(self) -> dict:
+        return {
+            "policy": self.policy,
+            "hedge_after": self.hedge_after,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "models": {name: stats.snapshot() for name, stats in self.stats.items()},
+        }
+
+
+def _count_error(model: str):
+    metrics.counter(
+        "llm_errors_total", {"model": model}, help="Chat model failures"
+    ).inc()
+
+
+def preferred_model_name(model: str | None) -> str:
+    return "gemini" if (model or "gemini").lower().startswith("gem") else "mistral"
+
+
+class _LazyModels(dict):
+    """Model mapping that builds each client the first time the router starts it."""
+
+    def __getitem__(self, name: str):
+        return super().__getitem__(name)()
+
+
+@lru_cache(maxsize=1)
+def get_model_router() -> ModelRouter:
+    router = ModelRouter(
+        _LazyModels({"gemini": get_gemini_model, "mistral": get_mistral_model})
+    )
+    metrics.register_collector(router.collect)
+    return router
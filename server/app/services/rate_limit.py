@@ -0,0 +1,412 @@
+import asyncio
+import json
+import math
+import os
+import threading
+import time
+from core.logger import get_logger
+from core.metrics import metrics
+
+logger = get_logger()
+
+# "redis" shares budgets across every API and worker process; "local" keeps them per process
+RATE_LIMIT_BACKEND = os.getenv(
+    "RATE_LIMIT_BACKEND", "redis" if os.getenv("REDIS_HOST") else "local"
+)
+# Bucket capacity, in seconds of refill; small values keep requests evenly spaced
+RATE_LIMIT_BURST_SECONDS = float(os.getenv("RATE_LIMIT_BURST_SECONDS", "4"))
+# After a 429 the refill rate is scaled down by this factor...
+THROTTLE_DECREASE = 0.7
+THROTTLE_MIN_SCALE = 0.1
+# ...and recovers towards the full budget by this much per second
+THROTTLE_RECOVERY = 0.01
+
+KEY_PREFIX = "ratelimit:"
+KEY_TTL_SECONDS = 3600
+
+
+class Budget:
+    """Requests and (optionally) tokens allowed per minute for a provider or model."""
+
+    def __init__(
+        self,
+        requests_per_minute: float,
+        tokens_per_minute: float | None = None,
+        burst_seconds: float = RATE_LIMIT_BURST_SECONDS,
+    ):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.burst_seconds = burst_seconds
+
+    def buckets(self, key: str, requests: int, tokens: int) -> list[tuple]:
+        """(bucket key, refill per second, capacity, cost) for each limited unit."""
+        specs = [self._spec(f"{key}:requests", self.requests_per_minute, requests)]
+        if self.tokens_per_minute and tokens:
+            specs.append(self._spec(f"{key}:tokens", self.tokens_per_minute, tokens))
+        return specs
+
+    def _spec(self, key: str, per_minute: float, cost: int) -> tuple:
+        rate = per_minute / 60
+        capacity = max(1.0, math.ceil(rate * self.burst_seconds))
+        return KEY_PREFIX + key, rate, capacity, cost
+
+
+# Free-tier quotas; override with RATE_LIMIT_BUDGETS, e.g.
+# {"gemini": {"requests_per_minute": 1000, "tokens_per_minute": 1000000}}
+DEFAULT_BUDGETS = {
+    "gemini": Budget(15, 1_000_000),
+    "gemini:gemini-2.5-flash": Budget(10, 250_000),
+    "mistral": Budget(60, 500_000),
+    "llamaparse": Budget(60),
+    "pinecone": Budget(600, 250_000),
+}
+
+
+def _load_budgets() -> dict[str, Budget]:
+    budgets = dict(DEFAULT_BUDGETS)
+    overrides = os.getenv("RATE_LIMIT_BUDGETS")
+    if overrides:
+        for key, value in json.loads(overrides).items():
+            budgets[key] = Budget(**value) if value else None
+    return {key: budget for key, budget in budgets.items() if budget is not None}
+
+
+def estimate_tokens(text: str) -> int:
+    # Roughly four characters per token for English text
+    return len(text) // 4 + 1
+
+
+def is_rate_limit_error(error: BaseException) -> bool:
+    """Whether a provider error is a 429 / quota exhaustion, across SDKs."""
+    response = getattr(error, "response", None)
+    for status in (
+        getattr(error, "status_code", None),
+        getattr(error, "status", None),
+        getattr(error, "code", None),
+        getattr(response, "status_code", None),
+    ):
+        if status == 429 or status == "429":
+            return True
+    message = str(error).lower()
+    return (
+        "429" in message
+        or "rate limit" in message
+        or "resource_exhausted" in message
+        or "too many requests" in message
+    )
+
+
+def retry_after_seconds(error: BaseException) -> float | None:
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+# Atomically refill every bucket, then reserve `cost` from each. Buckets may go
+# negative: the caller sleeps until its reservation is covered, so concurrent
+# callers queue up in order instead of polling. Returns the wait in seconds.
+_RESERVE_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local recovery = tonumber(ARGV[1])
+local ttl = tonumber(ARGV[2])
+local wait = 0
+local state = {}
+for i, key in ipairs(KEYS) do
+  local rate = tonumber(ARGV[3 * i])
+  local capacity = tonumber(ARGV[3 * i + 1])
+  local cost = tonumber(ARGV[3 * i + 2])
+  local b = redis.call('HMGET', key, 'tokens', 'ts', 'scale')
+  local tokens = tonumber(b[1]) or capacity
+  local elapsed = math.max(0, now - (tonumber(b[2]) or now))
+  local scale = math.min(1, (tonumber(b[3]) or 1) + recovery * elapsed)
+  tokens = math.min(capacity, tokens + elapsed * rate * scale)
+  if tokens < cost then
+    wait = math.max(wait, (cost - tokens) / (rate * scale))
+  end
+  state[i] = {tokens - cost, scale}
+end
+for i, key in ipairs(KEYS) do
+  redis.call('HSET', key, 'tokens', state[i][1], 'ts', now, 'scale', state[i][2])
+  redis.call('EXPIRE', key, ttl)
+end
+return tostring(wait)
+"""
+
+# Give back a reservation that was never used (the caller was cancelled)
+_REFUND_SCRIPT = """
+for i, key in ipairs(KEYS) do
+  if redis.call('EXISTS', key) == 1 then
+    redis.call('HINCRBYFLOAT', key, 'tokens', ARGV[i])
+  end
+end
+return 0
+"""
+
+# A 429: empty the buckets, hold them for retry_after and slow the refill
+_THROTTLE_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local decrease = tonumber(ARGV[1])
+local min_scale = tonumber(ARGV[2])
+local ttl = tonumber(ARGV[3])
+for i, key in ipairs(KEYS) do
+  local rate = tonumber(ARGV[3 + 2 * i - 1])
+  local retry_after = tonumber(ARGV[3 + 2 * i])
+  local b = redis.call('HMGET', key, 'tokens', 'ts', 'scale')
+  local scale = tonumber(b[3]) or 1
+  local elapsed = math.max(0, now - (tonumber(b[2]) or now))
+  local tokens = math.min(0, (tonumber(b[1]) or 0) + elapsed * rate * scale)
+  scale = math.max(min_scale, scale * decrease)
+  tokens = tokens - retry_after * rate * scale
+  redis.call('HSET', key, 'tokens', tokens, 'ts', now, 'scale', scale)
+  redis.call('EXPIRE', key, ttl)
+end
+return 0
+"""
+
+
+class _LocalBuckets:
+    """The Redis scripts' algorithm for a single process."""
+
+    def __init__(self):
+        self._state: dict[str, list[float]] = {}
+        self._lock = threading.Lock()
+
+    def reserve(self, specs: list[tuple]) -> float:
+        now = time.monotonic()
+        wait = 0.0
+        with self._lock:
+            for key, rate, capacity, cost in specs:
+                state = self._state.setdefault(key, [capacity, now, 1.0])
+                elapsed = max(0.0, now - state[1])
+                state[2] = min(1.0, state[2] + THROTTLE_RECOVERY * elapsed)
+                state[0] = min(capacity, state[0] + elapsed * rate * state[2])
+                state[1] = now
+                if state[0] < cost:
+                    wait = max(wait, (cost - state[0]) / (rate * state[2]))
+            for key, _, _, cost in specs:
+                self._state[key][0] -= cost
+        return wait
+
+    def refund(self, specs: list[tuple]):
+        with self._lock:
+            for key, _, _, cost in specs:
+                if key in self._state:
+                    self._state[key][0] += cost
+
+    def throttle(self, specs: list[tuple], retry_after: float | None):
+        now = time.monotonic()
+        with self._lock:
+            for key, rate, capacity, _ in specs:
+                state = self._state.setdefault(key, [capacity, now, 1.0])
+                elapsed = max(0.0, now - state[1])
+                state[0] = min(0.0, state[0] + elapsed * rate * state[2])
+                state[1] = now
+                state[2] = max(THROTTLE_MIN_SCALE, state[2] * THROTTLE_DECREASE)
+                hold = retry_after if retry_after is not None else 1 / rate
+                state[0] -= hold * rate * state[2]
+
+
+class RateLimiter:
+    """
+    Token buckets per provider and per model, for requests and tokens. With
+    the Redis backend the buckets live in Redis and are updated by Lua scripts,
+    so every API and worker process draws from the same quota; if Redis is
+    unreachable the limiter falls back to per-process buckets. Callers await
+    `acquire` before calling a provider and report 429s with `throttled`,
+    which empties the buckets and slows their refill until it recovers.
+    """
+
+    def __init__(self, budgets: dict[str, Budget], backend: str = RATE_LIMIT_BACKEND):
+        self.budgets = budgets
+        self.backend = backend
+        self._local = _LocalBuckets()
+        self._redis_failed_at: float | None = None
+        # Fire-and-forget script calls made from coroutines
+        self._tasks: set[asyncio.Task] = set()
+
+    def _specs(self, provider: str, model: str | None, requests: int, tokens: int):
+        specs = []
+        for key in (provider, f"{provider}:{model}" if model else None):
+            budget = self.budgets.get(key) if key else None
+            if budget is not None:
+                specs.extend(budget.buckets(key, requests, tokens))
+        return specs
+
+    def _use_redis(self) -> bool:
+        if self.backend != "redis":
+            return False
+        # Retry Redis a while after a failure instead of on every call
+        return self._redis_failed_at is None or (
+            time.monotonic() - self._redis_failed_at > 30
+        )
+
+    def _redis_failed(self, error: Exception):
+        if self._redis_failed_at is None:
+            logger.info(f"Rate limiter falling back to local buckets: {error}")
+        self._redis_failed_at = time.monotonic()
+
+    @staticmethod
+    def _reserve_args(specs: list[tuple]) -> list:
+        args = [THROTTLE_RECOVERY, KEY_TTL_SECONDS]
+        for _, rate, capacity, cost in specs:
+            args += [rate, capacity, cost]
+        return args
+
+    @staticmethod
+    def _throttle_args(specs: list[tuple], retry_after: float | None) -> list:
+        args = [THROTTLE_DECREASE, THROTTLE_MIN_SCALE, KEY_TTL_SECONDS]
+        for _, rate, _, _ in specs:
+            args += [rate, retry_after if retry_after is not None else 1 / rate]
+        return args
+
+    async def _reserve(self, specs: list[tuple]) -> float:
+        if self._use_redis():
+            try:
+                from workers.queue import get_async_redis
+
+                keys = [spec[0] for spec in specs]
+                wait = await get_async_redis().eval(
+                    _RESERVE_SCRIPT, len(keys), *keys, *self._reserve_args(specs)
+                )
+                self._redis_failed_at = None
+                return float(wait)
+            except Exception as e:
+                self._redis_failed(e)
+        return self._local.reserve(specs)
+
+    def _reserve_blocking(self, specs: list[tuple]) -> float:
+        if self._use_redis():
+            try:
+                from workers.queue import get_redis_conn
+
+                keys = [spec[0] for spec in specs]
+                wait = get_redis_conn().eval(
+                    _RESERVE_SCRIPT, len(keys), *keys, *self._reserve_args(specs)
+                )
+                self._redis_failed_at = None
+                return float(wait)
+            except Exception as e:
+                self._redis_failed(e)
+        return self._local.reserve(specs)
+
+    async def acquire(
+        self,
+        provider: str,
+        model: str | None = None,
+        requests: int = 1,
+        tokens: int = 0,
+    ):
+        """Wait until the provider (and model) budgets cover this call."""
+        specs = self._specs(provider, model, requests, tokens)
+        if not specs:
+            return
+        wait = await self._reserve(specs)
+        self._observe_wait(provider, wait)
+        if wait > 0:
+            try:
+                await asyncio.sleep(wait)
+            except asyncio.CancelledError:
+                self._refund(specs)
+                raise
+
+    def acquire_blocking(
+        self,
+        provider: str,
+        model: str | None = None,
+        requests: int = 1,
+        tokens: int = 0,
+    ):
+        """`acquire` for code running in worker threads."""
+        specs = self._specs(provider, model, requests, tokens)
+        if not specs:
+            return
+        wait = self._reserve_blocking(specs)
+        self._observe_wait(provider, wait)
+        if wait > 0:
+            time.sleep(wait)
+
+    def _eval_nowait(self, script: str, specs: list[tuple], args: list, local):
+        """
+        Run a bookkeeping script nobody waits on (refund, throttle). Called from
+        a coroutine it goes out on the async client as a task, so the event
+        loop never blocks on Redis; from a thread it runs inline. `local`
+        applies the same change to the per-process buckets.
+        """
+        if not self._use_redis():
+            local()
+            return
+        keys = [spec[0] for spec in specs]
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            try:
+                from workers.queue import get_redis_conn
+
+                get_redis_conn().eval(script, len(keys), *keys, *args)
+            except Exception as e:
+                self._redis_failed(e)
+                local()
+            return
+        task = loop.create_task(self._eval_async(script, keys, args, local))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _eval_async(self, script: str, keys: list[str], args: list, local):
+        try:
+            from workers.queue import get_async_redis
+
+            await get_async_redis().eval(script, len(keys), *keys, *args)
+        except Exception as e:
+            self._redis_failed(e)
+            local()
+
+    def _refund(self, specs: list[tuple]):
+        self._eval_nowait(
+            _REFUND_SCRIPT,
+            specs,
+            [spec[3] for spec in specs],
+            lambda: self._local.refund(specs),
+        )
+
+    def throttled(
+        self,
+        provider: str,
+        model: str | None = None,
+        retry_after: float | None = None,
+    ):
+        """Report a 429 from the provider so every process backs off."""
+        metrics.counter(
+            "rate_limit_throttled_total",
+            {"provider": provider},
+            help="429 responses reported by callers",
+        ).inc()
+        # Only request buckets: a 429 says nothing about which unit ran out
+        specs = self._specs(provider, model, requests=1, tokens=0)
+        if not specs:
+            return
+        logger.info(f"{provider} rate limited, backing off")
+        self._eval_nowait(
+            _THROTTLE_SCRIPT,
+            specs,
+            self._throttle_args(specs, retry_after),
+            lambda: self._local.throttle(specs, retry_after),
+        )
+
+    def report(self, provider: str, error: BaseException, model: str | None = None):
+        """Call with any provider error; 429s are fed back into the budget."""
+        if is_rate_limit_error(error):
+            self.throttled(provider, model, retry_after_seconds(error))
+
+    def _observe_wait(self, provider: str, wait: float):
+        metrics.histogram(
+            "rate_limit_wait_seconds",
+            {"provider": provider},
+            help="Time calls waited for provider rate limit capacity",
+        ).observe(wait)
+
+
+rate_limiter = RateLimiter(_load_budgets())
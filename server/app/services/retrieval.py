@@ -0,0 +1,298 @@
+import argparse
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from typing import TYPE_CHECKING
+from core.metrics import metrics, timed
+from core.registry import registry
+from services.rate_limit import rate_limiter, estimate_tokens
+from services.vector_db import (
+    query_vector_store,
+    list_record_ids,
+    fetch_records,
+)
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+# "pinecone" searches the hosted index; "local" scores a downloaded copy in process
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "pinecone")
+# How long the first query of a batch waits for others to join it
+RETRIEVAL_BATCH_WINDOW_MS = float(os.getenv("RETRIEVAL_BATCH_WINDOW_MS", "3"))
+RETRIEVAL_MAX_BATCH = int(os.getenv("RETRIEVAL_MAX_BATCH", "32"))
+LOCAL_VECTOR_INDEX_DIR = os.getenv("LOCAL_VECTOR_INDEX_DIR", "data/vector_index")
+# The embedding model of the integrated Pinecone index, for query vectors
+PINECONE_EMBED_MODEL = os.getenv("PINECONE_EMBED_MODEL", "llama-text-embed-v2")
+# Filter masks kept by the local index, least recently used dropped first;
+# each is one byte per record
+LOCAL_FILTER_CACHE_SIZE = int(os.getenv("LOCAL_FILTER_CACHE_SIZE", "64"))
+
+# Their ratio is the mean batch size
+_batches = metrics.counter("retrieval_batches_total", help="Retrieval batches run")
+_batched_queries = metrics.counter(
+    "retrieval_batch_queries_total", help="Distinct queries across retrieval batches"
+)
+
+
+class PineconeSearch:
+    """
+    The integrated index takes one query per search, so a batch is run side
+    by side on a thread pool. Identical queries were already coalesced by
+    the batcher.
+    """
+
+    def __init__(self, max_workers: int = RETRIEVAL_MAX_BATCH):
+        self._executor = ThreadPoolExecutor(max_workers, "retrieval")
+
+    def search_batch(self, requests: list[tuple[str, int, dict | None]]) -> list:
+        return list(
+            self._executor.map(lambda request: query_vector_store(*request), requests)
+        )
+
+
+def _build_query_embedder():
+    from pinecone import Pinecone
+
+    client = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
+
+    def embed(texts: list[str]) -> list[list[float]]:
+        rate_limiter.acquire_blocking(
+            "pinecone", tokens=sum(estimate_tokens(text) for text in texts)
+        )
+        try:
+            response = client.inference.embed(
+                model=PINECONE_EMBED_MODEL,
+                inputs=texts,
+                parameters={"input_type": "query", "truncate": "END"},
+            )
+        except Exception as e:
+            rate_limiter.report("pinecone", e)
+            raise
+        return [list(item["values"]) for item in response]
+
+    return embed
+
+
+registry.register("query_embedder", _build_query_embedder)
+
+
+def matches_filter(fields: dict, filter: dict | None) -> bool:
+    """Whether record fields pass a filter, in the subset of Pinecone's filter language the services use."""
+    for key, condition in (filter or {}).items():
+        value = fields.get(key)
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        for op, operand in condition.items():
+            if op == "$exists" and (value is not None) != operand:
+                return False
+            if op == "$eq" and value != operand:
+                return False
+            if op == "$gte" and (value is None or value < operand):
+                return False
+            if op == "$in" and value not in operand:
+                return False
+    return True
+
+
+class LocalVectorIndex:
+    """
+    A downloaded copy of the index: unit-normalized embeddings in one float32
+    matrix with each record's fields alongside. A batch of queries is embedded
+    in one call and scored with a single matrix multiply.
+    """
+
+    def __init__(self, ids: list[str], matrix: "np.ndarray", fields: list[dict]):
+        self.ids = ids
+        self.matrix = matrix
+        self.fields = fields
+        self._masks: OrderedDict[str, "np.ndarray"] = OrderedDict()
+        # Batches can be scored on several threads at once
+        self._masks_lock = threading.Lock()
+
+    @classmethod
+    def from_records(cls, records: dict[str, tuple[list[float], dict]]):
+        import numpy as np
+
+        ids = [_id for _id, (values, _) in records.items() if values]
+        matrix = np.asarray([records[_id][0] for _id in ids], dtype=np.float32)
+        if len(ids):
+            matrix /= np.linalg.norm(matrix, axis=1, keepdims=True).clip(1e-12)
+        return cls(ids, matrix, [records[_id][1] for _id in ids])
+
+    def save(self, path: str = LOCAL_VECTOR_INDEX_DIR):
+        import numpy as np
+
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, "matrix.npy"), self.matrix)
+        with open(os.path.join(path, "records.json"), "w") as f:
+            json.dump({"ids": self.ids, "fields": self.fields}, f)
+
+    @classmethod
+    def load(cls, path: str = LOCAL_VECTOR_INDEX_DIR) -> "LocalVectorIndex":
+        import numpy as np
+
+        with open(os.path.join(path, "records.json")) as f:
+            records = json.load(f)
+        matrix = np.load(os.path.join(path, "matrix.npy"), mmap_mode="r")
+        return cls(records["ids"], matrix, records["fields"])
+
+    def _mask(self, filter: dict | None):
+        import numpy as np
+
+        if not filter:
+            return None
+        key = json.dumps(filter, sort_keys=True)
+        with self._masks_lock:
+            mask = self._masks.get(key)
+            if mask is not None:
+                self._masks.move_to_end(key)
+                return mask
+        mask = np.fromiter(
+            (matches_filter(fields, filter) for fields in self.fields),
+            dtype=bool,
+            count=len(self.fields),
+        )
+        with self._masks_lock:
+            self._masks[key] = mask
+            while len(self._masks) > LOCAL_FILTER_CACHE_SIZE:
+                self._masks.popitem(last=False)
+        return mask
+
+    def search_batch(self, requests: list[tuple[str, int, dict | None]]) -> list:
+        import numpy as np
+
+        embed = registry.get("query_embedder")
+        queries = np.asarray(embed([query for query, _, _ in requests]), np.float32)
+        queries /= np.linalg.norm(queries, axis=1, keepdims=True).clip(1e-12)
+        with timed("local_vector_scores"):
+            scores = queries @ self.matrix.T
+        results = []
+        for row, (_, top_k, filter) in zip(scores, requests):
+            mask = self._mask(filter)
+            if mask is not None:
+                row = np.where(mask, row, -np.inf)
+            k = min(top_k, len(row))
+            if k:
+                top = np.argpartition(-row, k - 1)[:k]
+                top = top[np.argsort(-row[top])]
+            else:
+                top = []
+            hits = [
+                {"_id": self.ids[i], "_score": float(row[i]), "fields": self.fields[i]}
+                for i in top
+                if row[i] > -np.inf
+            ]
+            results.append(SimpleNamespace(result=SimpleNamespace(hits=hits)))
+        return results
+
+
+def _build_backend():
+    if VECTOR_BACKEND == "local":
+        return LocalVectorIndex.load()
+    return PineconeSearch()
+
+
+registry.register("retrieval_backend", _build_backend)
+
+
+class RetrievalBatcher:
+    """
+    Collects vector searches arriving within a few milliseconds of each other
+    and hands them to the backend as one batch, so concurrent requests share
+    an embedding call and a scoring pass (on Pinecone, which searches one
+    query at a time, they run side by side). Identical queries in a window
+    are run once. A cancelled caller doesn't cancel the batch for the others.
+    """
+
+    def __init__(
+        self,
+        window_ms: float = RETRIEVAL_BATCH_WINDOW_MS,
+        max_batch: int = RETRIEVAL_MAX_BATCH,
+    ):
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self._pending: dict[tuple, asyncio.Future] = {}
+        self._timer: asyncio.TimerHandle | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    async def search(self, query: str, top_k: int = 5, filter: dict | None = None):
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # Worker jobs each run their own event loop
+            self._loop, self._pending, self._timer = loop, {}, None
+        key = (query, top_k, json.dumps(filter, sort_keys=True) if filter else None)
+        future = self._pending.get(key)
+        if future is None:
+            future = self._pending[key] = loop.create_future()
+            if len(self._pending) >= self.max_batch:
+                self._flush()
+            elif self._timer is None:
+                self._timer = loop.call_later(self.window, self._flush)
+        return await asyncio.shield(future)
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, {}
+        if batch:
+            asyncio.ensure_future(self._run(batch))
+
+    async def _run(self, batch: dict[tuple, asyncio.Future]):
+        requests = [
+            (query, top_k, json.loads(filter) if filter else None)
+            for query, top_k, filter in batch
+        ]
+        _batches.inc()
+        _batched_queries.inc(len(requests))
+        try:
+            backend = registry.get("retrieval_backend")
+            async with timed("retrieval_batch"):
+                results = await asyncio.to_thread(backend.search_batch, requests)
+        except Exception as e:
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for future, result in zip(batch.values(), results):
+            if not future.done():
+                future.set_result(result)
+
+
+retrieval_batcher = RetrievalBatcher()
+
+
+async def search_vectors(query: str, top_k: int = 5, filter: dict | None = None):
+    """Vector search through the shared batcher; same result shape as query_vector_store."""
+    return await retrieval_batcher.search(query, top_k, filter)
+
+
+def build_local_index(path: str = LOCAL_VECTOR_INDEX_DIR) -> dict:
+    """Download every record's embedding and fields from Pinecone into `path`."""
+    started = time.perf_counter()
+    index = LocalVectorIndex.from_records(fetch_records(list_record_ids("")))
+    index.save(path)
+    return {
+        "records": len(index.ids),
+        "dimensions": int(index.matrix.shape[1]) if len(index.ids) else 0,
+        "duration_seconds": round(time.perf_counter() - started, 2),
+    }
+
+
+# Usage: python -m services.retrieval build-local
+def main():
+    parser = argparse.ArgumentParser(description="Local copy of the vector index")
+    parser.add_argument("command", choices=["build-local"])
+    parser.add_argument("--path", default=LOCAL_VECTOR_INDEX_DIR)
+    args = parser.parse_args()
+    print(build_local_index(args.path))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,464 @@
+import argparse
+import asyncio
+import math
+import os
+import re
+import time
+from types import SimpleNamespace
+from typing import TYPE_CHECKING
+from core.logger import get_logger
+from core.metrics import timed
+from services.llm_models import stream_chat, get_mistral_model, MISTRAL_MODEL
+from services.rate_limit import rate_limiter, estimate_tokens
+from services.vector_db import (
+    list_record_ids,
+    fetch_records,
+    upsert_records,
+    delete_records,
+)
+from services.retrieval import search_vectors
+
+# numpy is only needed to build the tree, not to route queries
+if TYPE_CHECKING:
+    import numpy as np
+
+logger = get_logger()
+
+# Children per summary node
+SUMMARY_BRANCHING = int(os.getenv("SUMMARY_BRANCHING", "6"))
+SUMMARY_MAX_LEVELS = int(os.getenv("SUMMARY_MAX_LEVELS", "3"))
+# Summaries generated at once per file; the rate limiter paces the model calls
+SUMMARY_CONCURRENCY = 4
+SUMMARY_WORDS = 200
+
+# Hits used for broad questions; a few dense summaries replace many fragments
+SUMMARY_TOP_K = 3
+# Below this best score the summaries are no better than none: use chunks
+SUMMARY_MIN_SCORE = float(os.getenv("SUMMARY_MIN_SCORE", "0.2"))
+
+_HEADING = re.compile(r"^#{1,3}\s+(.+)$", re.MULTILINE)
+
+
+class TreeNode:
+    __slots__ = (
+        "id",
+        "text",
+        "vector",
+        "level",
+        "page_range",
+        "section",
+        "children",
+    )
+
+    def __init__(
+        self,
+        id: str,
+        text: str,
+        vector: "np.ndarray",
+        level: int,
+        page_range: tuple[int, int],
+        section: str | None = None,
+        children: list[str] | None = None,
+    ):
+        self.id = id
+        self.text = text
+        self.vector = vector
+        self.level = level
+        self.page_range = page_range
+        self.section = section
+        self.children = children or []
+
+
+def summary_id(file_id: str, level: int, index: int) -> str:
+    return f"{file_id}_summary_L{level}_{index}"
+
+
+def _page_range(value) -> tuple[int, int]:
+    try:
+        start, end = str(value).split("_", 1)
+        return int(start), int(end)
+    except ValueError:
+        return 0, 0
+
+
+def load_file_chunks(file_id: str) -> tuple[list[TreeNode], dict]:
+    """A file's chunks in page order, with their stored embeddings and the file's metadata."""
+    import numpy as np
+
+    ids = [_id for _id in list_record_ids(f"{file_id}_") if "_summary_" not in _id]
+    nodes = []
+    file_fields: dict = {}
+    for _id, (values, metadata) in fetch_records(ids).items():
+        # The id prefix can also match longer file ids
+        if metadata.get("file_id") != file_id or not values:
+            continue
+        file_fields = {
+            key: metadata[key]
+            for key in ("file_id", "file_name", "file_url", "user_id")
+            if metadata.get(key) is not None
+        }
+        nodes.append(
+            TreeNode(
+                _id,
+                metadata.get("content") or metadata.get("text", ""),
+                np.asarray(values, dtype=np.float32),
+                level=0,
+                page_range=_page_range(metadata.get("page_range")),
+            )
+        )
+    nodes.sort(key=lambda node: (node.page_range, _chunk_number(node.id)))
+
+    # Chunks inherit the last markdown heading seen before them
+    section = None
+    for node in nodes:
+        node.section = section
+        headings = _HEADING.findall(node.text)
+        if headings:
+            if node.section is None:
+                node.section = headings[0].strip()
+            section = headings[-1].strip()
+    return nodes, file_fields
+
+
+def _chunk_number(chunk_id: str) -> int:
+    try:
+        return int(chunk_id.rsplit("_", 1)[1])
+    except (IndexError, ValueError):
+        return 0
+
+
+def kmeans(vectors: "np.ndarray", k: int, iterations: int = 25) -> "np.ndarray":
+    """
+    Spherical k-means; returns a cluster label per row. Centroids start
+    evenly spaced in document order, which is deterministic and favours
+    clusters of neighbouring chunks.
+    """
+    import numpy as np
+
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    unit = vectors / np.where(norms == 0, 1, norms)
+    centroids = unit[np.linspace(0, len(unit) - 1, k).astype(int)]
+    labels = np.zeros(len(unit), dtype=int)
+    for iteration in range(iterations):
+        new_labels = np.argmax(unit @ centroids.T, axis=1)
+        if iteration > 0 and np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+        for cluster in range(k):
+            members = unit[labels == cluster]
+            if len(members):
+                centroid = members.sum(axis=0)
+                centroids[cluster] = centroid / (np.linalg.norm(centroid) or 1)
+    return labels
+
+
+def cluster_nodes(nodes: list[TreeNode], branching: int) -> list[list[TreeNode]]:
+    """Group nodes into clusters of about `branching` similar nodes, in page order."""
+    import numpy as np
+
+    if len(nodes) <= branching:
+        return [nodes]
+    k = math.ceil(len(nodes) / branching)
+    labels = kmeans(np.stack([node.vector for node in nodes]), k)
+    groups = [
+        [node for node, label in zip(nodes, labels) if label == cluster]
+        for cluster in range(k)
+    ]
+    clusters = []
+    for group in groups:
+        # Oversized clusters would make summaries lossy; split them in order
+        for start in range(0, len(group), branching * 2):
+            if group[start : start + branching * 2]:
+                clusters.append(group[start : start + branching * 2])
+    return sorted(clusters, key=lambda group: group[0].page_range)
+
+
+def _section_groups(nodes: list[TreeNode], branching: int) -> list[list[TreeNode]]:
+    """Consecutive chunks of the same section, small sections merged with the next."""
+    groups: list[list[TreeNode]] = []
+    current: list[TreeNode] = []
+    for node in nodes:
+        if (
+            current
+            and node.section != current[-1].section
+            and len(current) >= branching
+        ):
+            groups.append(current)
+            current = []
+        current.append(node)
+    if current:
+        groups.append(current)
+    return groups
+
+
+async def summarize(texts: list[str], file_name: str, section: str | None) -> str:
+    about = f"the section '{section}' of {file_name}" if section else file_name
+    excerpts = "\n\n---\n\n".join(texts)
+    messages = [
+        {
+            "role": "system",
+            "content": (
+                "You write dense summaries of medical reference material for retrieval. "
+                "Keep every key fact, condition, drug, dose, threshold and recommendation; "
+                "drop examples and repetition. Do not add information."
+            ),
+        },
+        {
+            "role": "user",
+            "content": f"Summarize these excerpts from {about} in at most "
+            f"{SUMMARY_WORDS} words:\n\n{excerpts}",
+        },
+    ]
+    await rate_limiter.acquire(
+        "mistral", model=MISTRAL_MODEL, tokens=estimate_tokens(excerpts)
+    )
+    try:
+        async with timed("summary_generate"):
+            parts = [part async for part in stream_chat(get_mistral_model(), messages)]
+    except Exception as e:
+        rate_limiter.report("mistral", e, model=MISTRAL_MODEL)
+        raise
+    return "".join(parts).strip()
+
+
+async def _build_level(
+    file_id: str,
+    file_name: str,
+    groups: list[list[TreeNode]],
+    level: int,
+) -> list[TreeNode]:
+    import numpy as np
+
+    limit = asyncio.Semaphore(SUMMARY_CONCURRENCY)
+
+    async def build(index: int, group: list[TreeNode]) -> TreeNode:
+        sections = {node.section for node in group}
+        section = group[0].section if len(sections) == 1 else None
+        async with limit:
+            text = await summarize([node.text for node in group], file_name, section)
+        # The children's centroid stands in for the summary's embedding when clustering the next level
+        centroid = np.mean([node.vector for node in group], axis=0)
+        return TreeNode(
+            summary_id(file_id, level, index),
+            text,
+            centroid / (np.linalg.norm(centroid) or 1),
+            level=level,
+            page_range=(
+                min(node.page_range[0] for node in group),
+                max(node.page_range[1] for node in group),
+            ),
+            section=section,
+            children=[node.id for node in group],
+        )
+
+    return list(
+        await asyncio.gather(*(build(i, group) for i, group in enumerate(groups)))
+    )
+
+
+def _to_record(node: TreeNode, file_fields: dict) -> dict:
+    record = {
+        **file_fields,
+        "_id": node.id,
+        "text": node.text,
+        "level": node.level,
+        "page_range": f"{node.page_range[0]}_{node.page_range[1]}",
+        "children": node.children,
+    }
+    if node.section:
+        record["section"] = node.section
+    return record
+
+
+async def build_summary_tree(
+    file_id: str,
+    branching: int = SUMMARY_BRANCHING,
+    max_levels: int = SUMMARY_MAX_LEVELS,
+    expected_chunks: int = 0,
+    wait_seconds: float = 30,
+) -> dict:
+    """
+    Build (or rebuild) a file's summary tree: level 1 summarizes clusters of
+    similar chunks within each section, each higher level clusters and
+    summarizes the level below, up to one file summary. Summaries are upserted
+    next to the chunks with a `level` field. `expected_chunks` waits for
+    freshly ingested chunks to become listable.
+    """
+    started = time.perf_counter()
+    deadline = time.monotonic() + wait_seconds
+    while True:
+        nodes, file_fields = await asyncio.to_thread(load_file_chunks, file_id)
+        if len(nodes) >= max(1, expected_chunks) or time.monotonic() > deadline:
+            break
+        await asyncio.sleep(2)
+    if not nodes:
+        raise ValueError(f"No chunks found for file {file_id}")
+    file_name = file_fields.get("file_name") or file_id
+
+    levels = {}
+    written: set[str] = set()
+    level = 1
+    current = nodes
+    while level <= max_levels:
+        groups = (
+            [
+                cluster
+                for section in _section_groups(current, branching)
+                for cluster in cluster_nodes(section, branching)
+            ]
+            if level == 1
+            else cluster_nodes(current, branching)
+        )
+        current = await _build_level(file_id, file_name, groups, level)
+        records = [_to_record(node, file_fields) for node in current]
+        errors = await asyncio.to_thread(upsert_records, records)
+        if any(errors):
+            raise Exception(next(error for error in errors if error))
+        written.update(node.id for node in current)
+        levels[level] = len(current)
+        logger.info(f"{file_id}: {len(current)} summaries at level {level}")
+        if len(current) == 1:
+            break
+        level += 1
+
+    # Drop summaries left over from a larger previous tree
+    stale = [
+        _id
+        for _id in await asyncio.to_thread(list_record_ids, f"{file_id}_summary_")
+        if _id not in written
+    ]
+    if stale:
+        await asyncio.to_thread(delete_records, stale)
+
+    return {
+        "file_id": file_id,
+        "chunks": len(nodes),
+        "levels": levels,
+        "deleted": len(stale),
+        "duration_seconds": round(time.perf_counter() - started, 2),
+    }
+
+
+# Query routing: broad questions go to summaries, specific ones to chunks
+_BROAD = re.compile(
+    r"\b(summar\w*|overview|outline|explain|describe|approach(es)? to|management of|"
+    r"principles|compare|comparison|differen\w* between|in general|key points|"
+    r"tell me about|review|everything)\b",
+    re.IGNORECASE,
+)
+_DOCUMENT = re.compile(
+    r"\b(book|textbook|chapter|whole|entire|all of|main topics|covered)\b",
+    re.IGNORECASE,
+)
+_SPECIFIC = re.compile(
+    r"\b(dose|dosage|dosing|mg|mcg|ml|units?|how (much|many|long|often)|which|"
+    r"normal (range|value)|cut-?off|threshold|contraindicat\w*|side effects?|\d+)\b",
+    re.IGNORECASE,
+)
+
+CHUNKS_ONLY = {"level": {"$exists": False}}
+
+
+class RetrievalRoute:
+    __slots__ = ("scope", "filter", "top_k", "chunk_top_k")
+
+    def __init__(
+        self,
+        scope: str,
+        filter: dict | None,
+        top_k: int,
+        chunk_top_k: int | None = None,
+    ):
+        self.scope = scope
+        self.filter = filter
+        self.top_k = top_k
+        # What the caller asked for, used when falling back to chunks
+        self.chunk_top_k = chunk_top_k or top_k
+
+
+def classify_scope(query: str) -> str:
+    """'document', 'broad' or 'specific', from cheap lexical cues."""
+    broad = len(_BROAD.findall(query))
+    specific = len(_SPECIFIC.findall(query))
+    if broad <= specific:
+        return "specific"
+    return "document" if _DOCUMENT.search(query) else "broad"
+
+
+def route_query(query: str, scope: str = "auto", top_k: int = 5) -> RetrievalRoute:
+    if scope == "auto":
+        scope = classify_scope(query)
+    summary_top_k = min(top_k, SUMMARY_TOP_K)
+    if scope == "document":
+        return RetrievalRoute(scope, {"level": {"$gte": 2}}, summary_top_k, top_k)
+    if scope == "broad":
+        return RetrievalRoute(scope, {"level": {"$gte": 1}}, summary_top_k, top_k)
+    return RetrievalRoute("specific", CHUNKS_ONLY, top_k)
+
+
+def _file_id(hit) -> str | None:
+    return (hit.get("fields") or {}).get("file_id")
+
+
+async def search_routed(query: str, route: RetrievalRoute):
+    """
+    Search at the route's level. Summary routes also search chunks, in the
+    same retrieval batch: when the summaries are missing or score below
+    SUMMARY_MIN_SCORE the chunks are used instead, and otherwise chunks from
+    files without a summary among the hits (files whose tree isn't built yet)
+    fill the remaining places up to the caller's top_k.
+    """
+    if route.scope == "specific":
+        results = await search_vectors(query, top_k=route.top_k, filter=route.filter)
+        return results, route
+
+    summaries, chunks = await asyncio.gather(
+        search_vectors(query, top_k=route.top_k, filter=route.filter),
+        search_vectors(query, top_k=route.chunk_top_k, filter=CHUNKS_ONLY),
+    )
+    summary_hits = list(summaries.result.hits or [])
+    if route.scope == "document" and not summary_hits:
+        route = RetrievalRoute(
+            "broad", {"level": {"$gte": 1}}, route.top_k, route.chunk_top_k
+        )
+        summaries = await search_vectors(query, top_k=route.top_k, filter=route.filter)
+        summary_hits = list(summaries.result.hits or [])
+
+    best = max((hit.get("_score") or 0 for hit in summary_hits), default=None)
+    if best is None or best < SUMMARY_MIN_SCORE:
+        return chunks, RetrievalRoute("specific", CHUNKS_ONLY, route.chunk_top_k)
+
+    summarized = {_file_id(hit) for hit in summary_hits}
+    others = [
+        hit for hit in chunks.result.hits or [] if _file_id(hit) not in summarized
+    ]
+    hits = summary_hits + others[: max(0, route.chunk_top_k - len(summary_hits))]
+    return SimpleNamespace(result=SimpleNamespace(hits=hits)), route
+
+
+# Usage: python -m services.summary_tree Cardiology Nephrology --branching 6
+def main():
+    parser = argparse.ArgumentParser(
+        description="Build summary trees for ingested files"
+    )
+    parser.add_argument("file_ids", nargs="+")
+    parser.add_argument("--branching", type=int, default=SUMMARY_BRANCHING)
+    parser.add_argument("--max-levels", type=int, default=SUMMARY_MAX_LEVELS)
+    args = parser.parse_args()
+
+    async def run():
+        for file_id in args.file_ids:
+            try:
+                print(
+                    await build_summary_tree(
+                        file_id, branching=args.branching, max_levels=args.max_levels
+                    )
+                )
+            except Exception as e:
+                print(f"{file_id}: {e}")
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+import asyncio
+import json
+from contextlib import suppress
+
+# Redis Stream entries kept per query for late subscribers
+STREAM_MAXLEN = 2000
+STREAM_TTL_SECONDS = 300
+
+
+class TokenChannel:
+    """
+    Streams LLM output for one job over Redis pub/sub.
+    Tokens are coalesced into a single `token` frame until `flush_interval`
+    passes or `max_frame_bytes` is reached, and each flush goes out as one
+    pipelined round trip on an async Redis client. When `stream_key` is set,
+    every frame is also appended to a capped Redis Stream so a subscriber that
+    joins late can replay it with XRANGE before switching to pub/sub.
+    """
+
+    def __init__(
+        self,
+        redis,
+        channel: str,
+        flush_interval: float = 0.02,
+        max_frame_bytes: int = 256,
+        stream_key: str | None = None,
+    ):
+        self.redis = redis
+        self.channel = channel
+        self.flush_interval = flush_interval
+        self.max_frame_bytes = max_frame_bytes
+        self.stream_key = stream_key
+        self._tokens: list[str] = []
+        self._size = 0
+        self._timer: asyncio.Task | None = None
+        self._lock = asyncio.Lock()
+        self.frames_sent = 0
+        self.round_trips = 0
+
+    async def token(self, text: str):
+        if not text:
+            return
+        self._tokens.append(text)
+        self._size += len(text.encode())
+        if self._size >= self.max_frame_bytes:
+            await self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.create_task(self._flush_later())
+
+    async def publish(self, event: str, data: dict | list | str | None = None):
+        """Send a non-token event, after any tokens buffered before it."""
+        payload = {"event": event}
+        if data is not None:
+            payload["data"] = data
+        await self.flush(json.dumps(payload))
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.flush_interval)
+        self._timer = None
+        await self.flush()
+
+    async def flush(self, *extra: str):
+        if self._timer is not None and self._timer is not asyncio.current_task():
+            self._timer.cancel()
+            self._timer = None
+
+        frames = []
+        if self._tokens:
+            frames.append(json.dumps({"event": "token", "data": "".join(self._tokens)}))
+            self._tokens, self._size = [], 0
+        frames.extend(extra)
+        if not frames:
+            return
+
+        # Serialize round trips so frames reach subscribers in order
+        async with self._lock:
+            pipe = self.redis.pipeline(transaction=False)
+            for frame in frames:
+                pipe.publish(self.channel, frame)
+                if self.stream_key:
+                    pipe.xadd(
+                        self.stream_key,
+                        {"frame": frame},
+                        maxlen=STREAM_MAXLEN,
+                        approximate=True,
+                    )
+            if self.stream_key:
+                pipe.expire(self.stream_key, STREAM_TTL_SECONDS)
+            await pipe.execute()
+        self.frames_sent += len(frames)
+        self.round_trips += 1
+
+    async def aclose(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._timer
+            self._timer = None
+        await self.flush()
+
+
+async def read_stream_backlog(redis, stream_key: str) -> list[dict]:
+    """Frames already published on a job's stream, for late subscribers."""
+    entries = await redis.xrange(stream_key)
+    return [json.loads(fields["frame"]) for _, fields in entries]
@@ -1,43 +1,45 @@
 import os
-from pinecone import Pinecone
 from dotenv import load_dotenv
+from core.registry import registry
+from core.metrics import timed
+from services.rate_limit import rate_limiter, estimate_tokens
+from services.chunk_store import store_chunks
+from services.chunking import chunk_fields
 
 load_dotenv()
 
-_pc = None
-_index = None
-_vectordb_initialized = False
-
-
-def init_vector_db():
-    global _pc, _index, _vectordb_initialized
-    if _vectordb_initialized:
-        return _index
 
+def _connect_pinecone_index():
     api_key = os.getenv("PINECONE_API_KEY")
     host_index = os.getenv("PINECONE_HOST_INDEX")
     if not api_key or not host_index:
         raise Exception("Pinecone env variables not found")
 
-    _pc = Pinecone(api_key=api_key)
-    _index = _pc.Index(host=host_index)
-    _vectordb_initialized = True
-    return _index
+    from pinecone import Pinecone
+
+    return Pinecone(api_key=api_key).Index(host=host_index)
+
+
+registry.register("pinecone_index", _connect_pinecone_index)
+
+
+def init_vector_db():
+    return registry.get("pinecone_index")
 
 
 def _ensure_index():
-    if _index is None:
-        init_vector_db()
-    return _index
+    return registry.get("pinecone_index")
 
 
 def get_chunk_id(file_id: str, page_range: str, chunk_id: int):
     return f"{file_id}_{page_range}_chunk_{chunk_id}"
 
 
-def insert_text_chunk(text: str, metadata: dict):
-    index = _ensure_index()
+# Pinecone caps integrated-embedding upserts at 96 records per request
+UPSERT_BATCH_SIZE = 96
+
 
+def _to_record(text: str, metadata: dict) -> dict:
     # Filter metadata to only include simple types (string, number, boolean, list of strings)
     # Pinecone doesn't accept nested objects or dicts
     def is_valid_pinecone_value(value):
@@ -68,20 +70,106 @@ def insert_text_chunk(text: str, metadata: dict):
     # Add required fields
     page_range = metadata["page_range"]
     cleaned_metadata["page_range"] = f"{page_range[0]}_{page_range[1]}"
-    cleaned_metadata["text"] = text
+    # Tables embed a short summary and carry the full table in `content`
+    cleaned_metadata.update(chunk_fields(text))
     cleaned_metadata["_id"] = get_chunk_id(
         metadata["file_id"],
         cleaned_metadata["page_range"],
         chunk_id=metadata["chunk_id"],
     )
+    return cleaned_metadata
+
+
+@timed("vector_upsert")
+def insert_text_chunk(text: str, metadata: dict):
+    index = _ensure_index()
 
     # Pinecone text index upsert (serverless text search)
-    index.upsert_records(namespace="__default__", records=[cleaned_metadata])
+    rate_limiter.acquire_blocking("pinecone", tokens=estimate_tokens(text))
+    try:
+        index.upsert_records(
+            namespace="__default__", records=[_to_record(text, metadata)]
+        )
+    except Exception as e:
+        rate_limiter.report("pinecone", e)
+        raise
+    store_chunks([text], [metadata])
+
+
+@timed("vector_upsert")
+def insert_text_chunks(texts: list[str], metadatas: list[dict]) -> list[str | None]:
+    """
+    Bulk upsert chunks, UPSERT_BATCH_SIZE records per request.
+    Returns one error message per chunk, None where the upsert succeeded.
+    """
+    records = [_to_record(text, metadata) for text, metadata in zip(texts, metadatas)]
+    errors = upsert_records(records)
+    # Keep a local, page-ordered copy of what made it into the index
+    stored = [i for i, error in enumerate(errors) if error is None]
+    store_chunks([texts[i] for i in stored], [metadatas[i] for i in stored])
+    return errors
+
+
+def upsert_records(records: list[dict]) -> list[str | None]:
+    """Upsert prepared records (with `_id` and `text`); one error per record."""
+    index = _ensure_index()
+    errors: list[str | None] = [None] * len(records)
+
+    for start in range(0, len(records), UPSERT_BATCH_SIZE):
+        batch = records[start : start + UPSERT_BATCH_SIZE]
+        # Integrated indexes embed on upsert, so the text counts against the token budget
+        tokens = sum(estimate_tokens(record["text"]) for record in batch)
+        rate_limiter.acquire_blocking("pinecone", tokens=tokens)
+        try:
+            index.upsert_records(namespace="__default__", records=batch)
+        except Exception as e:
+            rate_limiter.report("pinecone", e)
+            errors[start : start + len(batch)] = [str(e)] * len(batch)
+    return errors
+
+
+@timed("vector_search")
+def query_vector_store(query: str, top_k: int = 5, filter: dict | None = None):
+    index = _ensure_index()
+    search_query = {"inputs": {"text": query}, "top_k": top_k}
+    if filter:
+        search_query["filter"] = filter
+    rate_limiter.acquire_blocking("pinecone", tokens=estimate_tokens(query))
+    try:
+        return index.search(namespace="__default__", query=search_query)
+    except Exception as e:
+        rate_limiter.report("pinecone", e)
+        raise
+
 
+# Fetch accepts at most 1000 ids; smaller requests keep responses manageable
+FETCH_BATCH_SIZE = 100
 
-def query_vector_store(query: str, top_k: int = 5):
+
+def list_record_ids(prefix: str) -> list[str]:
     index = _ensure_index()
-    return index.search(
-        namespace="__default__",
-        query={"inputs": {"text": query}, "top_k": top_k},
-    )
+    ids = []
+    for page in index.list(prefix=prefix, namespace="__default__"):
+        ids.extend(page)
+    return ids
+
+
+def fetch_records(ids: list[str]) -> dict[str, tuple[list[float], dict]]:
+    """Stored embedding and metadata for each id that exists."""
+    index = _ensure_index()
+    records = {}
+    for start in range(0, len(ids), FETCH_BATCH_SIZE):
+        rate_limiter.acquire_blocking("pinecone")
+        response = index.fetch(
+            ids=ids[start : start + FETCH_BATCH_SIZE], namespace="__default__"
+        )
+        for _id, vector in response.vectors.items():
+            records[_id] = (list(vector.values), dict(vector.metadata or {}))
+    return records
+
+
+def delete_records(ids: list[str]):
+    index = _ensure_index()
+    for start in range(0, len(ids), FETCH_BATCH_SIZE):
+        rate_limiter.acquire_blocking("pinecone")
+        index.delete(ids=ids[start : start + FETCH_BATCH_SIZE], namespace="__default__")
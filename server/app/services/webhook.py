@@ -0,0 +1,216 @@
+import asyncio
+import gzip
+import json
+import os
+import random
+import time
+import httpx
+from core.logger import get_logger
+
+logger = get_logger()
+
+# Both change the wire format, so the receiver must opt in: gzip needs it to
+# honour Content-Encoding, coalescing needs it to unwrap {"batches": [...]}
+WEBHOOK_GZIP = os.getenv("WEBHOOK_GZIP", "false").lower() == "true"
+WEBHOOK_COALESCE_MS = float(os.getenv("WEBHOOK_COALESCE_MS", "0"))
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class RetryableStatusError(Exception):
+    pass
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and fails fast until
+    `reset_timeout` has passed, then lets a single trial request through.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: float | None = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._trial_in_flight = False
+        if self.failures >= self.failure_threshold or self.opened_at is not None:
+            self.opened_at = time.monotonic()
+
+    def release_trial(self):
+        """Free the half-open slot of a trial that ended without an outcome."""
+        self._trial_in_flight = False
+
+
+class WebhookDispatcher:
+    """
+    Delivers webhook payloads over one shared keep-alive client.
+    With a `coalesce_window`, payloads sent within it of each other go out in
+    a single POST as `{"batches": [...]}` and a lone payload is sent as is;
+    with none (the default) every payload is its own POST.
+    Failed POSTs are retried with full-jitter exponential backoff behind a
+    circuit breaker, and every caller awaits the delivery of its own payload.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        coalesce_window: float = WEBHOOK_COALESCE_MS / 1000,
+        max_batch_items: int = 8,
+        max_batch_bytes: int = 4 * 1024 * 1024,
+        max_retries: int = 4,
+        backoff_base: float = 0.5,
+        backoff_max: float = 10,
+        timeout: float = 30,
+        breaker: CircuitBreaker | None = None,
+    ):
+        self.url = url
+        self.coalesce_window = coalesce_window
+        self.max_batch_items = max_batch_items
+        self.max_batch_bytes = max_batch_bytes
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.breaker = breaker or CircuitBreaker()
+        self._client: httpx.AsyncClient | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._pending: list[tuple[bytes, asyncio.Future]] = []
+        self._pending_bytes = 0
+        self._timer: asyncio.TimerHandle | None = None
+
+    def _bind(self):
+        # The client and futures belong to one event loop
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(max_keepalive_connections=10, max_connections=20),
+            )
+            self._pending, self._pending_bytes, self._timer = [], 0, None
+        return loop
+
+    async def send(self, payload: dict):
+        loop = self._bind()
+        # Fail fast instead of queueing behind an unhealthy endpoint
+        if self.breaker.state == "open":
+            raise CircuitOpenError(f"Webhook circuit open for {self.url}")
+
+        encoded = json.dumps(payload).encode()
+        if self.coalesce_window <= 0:
+            await self._post(encoded)
+            return
+
+        future = loop.create_future()
+        self._pending.append((encoded, future))
+        self._pending_bytes += len(encoded)
+
+        if (
+            len(self._pending) >= self.max_batch_items
+            or self._pending_bytes >= self.max_batch_bytes
+        ):
+            self._flush_now()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.coalesce_window, self._flush_now)
+
+        await future
+
+    def _flush_now(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending, self._pending_bytes = self._pending, [], 0
+        if batch:
+            self._loop.create_task(self._deliver(batch))
+
+    async def _deliver(self, batch: list[tuple[bytes, asyncio.Future]]):
+        if len(batch) == 1:
+            body = batch[0][0]
+        else:
+            body = (
+                b'{"batches": [' + b", ".join(encoded for encoded, _ in batch) + b"]}"
+            )
+        try:
+            await self._post(body)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        else:
+            for _, future in batch:
+                if not future.done():
+                    future.set_result(None)
+
+    async def _post(self, body: bytes):
+        headers = {"Content-Type": "application/json"}
+        if WEBHOOK_GZIP:
+            body = gzip.compress(body, compresslevel=5)
+            headers["Content-Encoding"] = "gzip"
+
+        for attempt in range(self.max_retries + 1):
+            trial = self.breaker.state == "half_open"
+            if not self.breaker.allow():
+                raise CircuitOpenError(f"Webhook circuit open for {self.url}")
+            try:
+                try:
+                    response = await self._client.post(
+                        self.url, content=body, headers=headers
+                    )
+                finally:
+                    # A cancelled or otherwise failed trial must not block the
+                    # circuit; the outcome below is recorded without awaiting
+                    if trial:
+                        self.breaker.release_trial()
+                if response.status_code == 429 or response.status_code >= 500:
+                    raise RetryableStatusError(
+                        f"Webhook returned {response.status_code}"
+                    )
+                # Other 4xx responses will not succeed on retry
+                self.breaker.record_success()
+                response.raise_for_status()
+                return
+            except (httpx.TransportError, RetryableStatusError) as e:
+                self.breaker.record_failure()
+                if attempt == self.max_retries:
+                    raise
+                delay = random.uniform(
+                    0, min(self.backoff_max, self.backoff_base * 2**attempt)
+                )
+                logger.info(
+                    f"Webhook attempt {attempt + 1} failed ({e}), retrying in {delay:.2f}s"
+                )
+                await asyncio.sleep(delay)
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            self._loop = None
@@ -0,0 +1,38 @@
+import argparse
+import os
+import signal
+from core.metrics import serve_metrics
+from workers.runtime import AsyncWorker, DEFAULT_CONCURRENCY, runtime
+
+
+# Usage: python -m workers pdf-jobs markdown-jobs --concurrency 8
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run RQ queues on a persistent event loop"
+    )
+    parser.add_argument(
+        "queues", nargs="+", help="Queue names, eg: pdf-jobs markdown-jobs"
+    )
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        default=int(os.getenv("WORKER_METRICS_PORT", "0")),
+        help="Serve Prometheus metrics on this port (0 disables)",
+    )
+    args = parser.parse_args()
+
+    if args.metrics_port:
+        serve_metrics(args.metrics_port)
+
+    runtime.persistent = True
+    worker = AsyncWorker(args.queues, concurrency=args.concurrency)
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: worker.stop())
+
+    runtime.run(worker.serve())
+    runtime.shutdown()
+
+
+if __name__ == "__main__":
+    main()
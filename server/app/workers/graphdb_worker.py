@@ -2,11 +2,17 @@ import asyncio
 from datetime import datetime
 from models.worker_db import WorkerDB
 from core.logger import get_logger
-from models.db_models import update_job_status, JobStatus
-from services.graph_db import insert_chunk_to_graphdb
+from workers.runtime import run_job
+from models.db_models import JobStatus, build_chunk_results
+from models.job_status import job_status_buffer
+from services.graph_db import insert_chunk_to_graphdb, insert_chunks_to_graphdb_batch
+from services.graph_communities import build_graph_communities
+from services.graph_snapshot import build_graph_snapshot
 
 logger = get_logger()
 
+ACTION = "graphDB"
+
 
 async def insert_chunks_to_graphdb_async(
     job_id: str,
@@ -14,18 +20,21 @@ async def insert_chunks_to_graphdb_async(
     file_metadata: dict,
     page_range: tuple[int, int],
     chunk_id: int,
+    parent_job_id: str | None = None,
+    root_job_id: str | None = None,
 ):
     await WorkerDB.ensure_connection()
     WorkerDB.ensure_graph_db_connection()
+    lineage = dict(action=ACTION, parent_job_id=parent_job_id, root_job_id=root_job_id)
+    previous_status = None
     try:
         logger.info(
             f"Starting graph processing for job {job_id}, chunk {chunk_id}, page:{page_range}"
         )
 
-        # Update job status to STARTED
-        await update_job_status(
-            job_id=job_id, status=JobStatus.STARTED, started_time=datetime.now()
-        )
+        # Mark STARTED from the stored status; an RQ retry starts from FAILED
+        await job_status_buffer.record_started(job_id, datetime.now(), **lineage)
+        previous_status = JobStatus.STARTED
 
         # Prepare metadata for graph DB
         metadata = dict(file_metadata)
@@ -41,19 +50,25 @@ async def insert_chunks_to_graphdb_async(
         logger.info(f"Successfully inserted chunk {chunk_id} to graph database")
 
         # Update Job Status to FINISHED
-        await update_job_status(
-            job_id, JobStatus.FINISHED, completed_time=datetime.now()
+        await job_status_buffer.record(
+            job_id,
+            JobStatus.FINISHED,
+            completed_time=datetime.now(),
+            previous_status=previous_status,
+            **lineage,
         )
 
     except Exception as e:
         logger.error(f"Error in graph processing for job {job_id}: {str(e)}")
 
         # Update job status to FAILED
-        await update_job_status(
+        await job_status_buffer.record(
             job_id,
             JobStatus.FAILED,
             completed_time=datetime.now(),
             error_message=str(e),
+            previous_status=previous_status,
+            **lineage,
         )
         raise e
 
@@ -64,9 +79,130 @@ def insert_chunks_to_graphdb(
     file_metadata: dict,
     page_range: tuple[int, int],
     chunk_id: int,
+    parent_job_id: str | None = None,
+    root_job_id: str | None = None,
 ):
-    return asyncio.run(
+    return run_job(
         insert_chunks_to_graphdb_async(
-            job_id, chunk_text, file_metadata, page_range, chunk_id
+            job_id,
+            chunk_text,
+            file_metadata,
+            page_range,
+            chunk_id,
+            parent_job_id,
+            root_job_id,
         )
     )
+
+
+async def insert_chunk_batch_to_graphdb_async(
+    job_id: str,
+    chunks: list[str],
+    file_metadata: dict,
+    page_range: tuple[int, int],
+    chunk_ids: list[int] | None = None,
+    parent_job_id: str | None = None,
+    root_job_id: str | None = None,
+):
+    """Extract and write a whole markdown batch's chunks, tracking each chunk on one job."""
+    await WorkerDB.ensure_connection()
+    WorkerDB.ensure_graph_db_connection()
+    lineage = dict(action=ACTION, parent_job_id=parent_job_id, root_job_id=root_job_id)
+    previous_status = None
+    chunk_ids = chunk_ids or list(range(len(chunks)))
+    try:
+        logger.info(
+            f"Starting graph processing for job {job_id}, {len(chunks)} chunks, page:{page_range}"
+        )
+
+        # Mark STARTED from the stored status; an RQ retry starts from FAILED
+        await job_status_buffer.record_started(job_id, datetime.now(), **lineage)
+        previous_status = JobStatus.STARTED
+
+        metadatas = [
+            {
+                **file_metadata,
+                "page_range": page_range,
+                "chunk_id": chunk_id,
+                "job_id": job_id,
+            }
+            for chunk_id in chunk_ids
+        ]
+        errors = await insert_chunks_to_graphdb_batch(chunks, metadatas)
+        chunk_results = build_chunk_results(chunk_ids, errors)
+
+        failed = sum(1 for error in errors if error)
+        if chunks and failed == len(chunks):
+            raise Exception(f"All {failed} chunks failed: {errors[0]}")
+
+        logger.info(
+            f"Inserted {len(chunks) - failed}/{len(chunks)} chunks to graph database"
+        )
+
+        await job_status_buffer.record(
+            job_id,
+            JobStatus.FINISHED,
+            completed_time=datetime.now(),
+            error_message=(
+                f"{failed} of {len(chunks)} chunks failed" if failed else None
+            ),
+            chunk_results=chunk_results,
+            previous_status=previous_status,
+            **lineage,
+        )
+
+    except Exception as e:
+        logger.error(f"Error in graph batch processing for job {job_id}: {str(e)}")
+        await job_status_buffer.record(
+            job_id,
+            JobStatus.FAILED,
+            completed_time=datetime.now(),
+            error_message=str(e),
+            previous_status=previous_status,
+            **lineage,
+        )
+        raise e
+
+
+def insert_chunk_batch_to_graphdb(
+    job_id: str,
+    chunks: list[str],
+    file_metadata: dict,
+    page_range: tuple[int, int],
+    chunk_ids: list[int] | None = None,
+    parent_job_id: str | None = None,
+    root_job_id: str | None = None,
+):
+    return run_job(
+        insert_chunk_batch_to_graphdb_async(
+            job_id,
+            chunks,
+            file_metadata,
+            page_range,
+            chunk_ids,
+            parent_job_id,
+            root_job_id,
+        )
+    )
+
+
+async def rebuild_graph_communities_async():
+    WorkerDB.ensure_graph_db_connection()
+    result = await build_graph_communities()
+    logger.info(f"Rebuilt graph communities: {result}")
+    return result
+
+
+def rebuild_graph_communities():
+    return run_job(rebuild_graph_communities_async())
+
+
+async def rebuild_graph_snapshot_async():
+    WorkerDB.ensure_graph_db_connection()
+    result = await asyncio.to_thread(build_graph_snapshot)
+    logger.info(f"Rebuilt graph snapshot: {result}")
+    return result
+
+
+def rebuild_graph_snapshot():
+    return run_job(rebuild_graph_snapshot_async())
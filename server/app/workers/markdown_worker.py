@@ -1,28 +1,131 @@
 import asyncio
 import os
-import requests
 from io import BytesIO
 from datetime import datetime
-from services.data_processing import convert_pdf_to_markdown
+from services.data_processing import convert_pdf_to_markdown_async, get_text_splitter
+from services.blob_store import open_blob
+from services.webhook import WebhookDispatcher
 from models.worker_db import WorkerDB
-from models.db_models import update_job_status, JobStatus
+from models.db_models import (
+    update_job_status,
+    register_child_jobs,
+    QueueJob,
+    JobStatus,
+)
+from workers.queue import get_queue, VECTORDB_QUEUE, GRAPHDB_QUEUE
+from workers.vectordb_worker import (
+    ACTION as VECTORDB_ACTION,
+    insert_chunk_batch_to_vectordb,
+)
+from workers.graphdb_worker import (
+    ACTION as GRAPHDB_ACTION,
+    insert_chunk_batch_to_graphdb,
+)
 from core.logger import get_logger
+from workers.runtime import run_job
 
 logger = get_logger()
 
 # Next.js service URL for webhook
 NEXTJS_SERVICE_URL = os.getenv("NEXTJS_SERVICE_URL", "http://localhost:3000")
 
+# Embed through the vectordb/graphdb queues instead of the Next.js webhook
+EMBED_IN_WORKERS = os.getenv("EMBED_IN_WORKERS", "false").lower() == "true"
+
+
+async def enqueue_chunk_batch_jobs(
+    job_id: str,
+    chunks: list[str],
+    page_range: tuple[int, int],
+    file_metadata: dict[str, any],
+    root_job_id: str | None = None,
+) -> list[str]:
+    """
+    Enqueue one vectorDB and one graphDB job carrying all chunks of a markdown batch,
+    instead of one job per chunk on each queue.
+    """
+    if not chunks:
+        return []
+
+    chunk_ids = list(range(len(chunks)))
+    enqueued = []
+    for action, queue_name, func in (
+        (VECTORDB_ACTION, VECTORDB_QUEUE, insert_chunk_batch_to_vectordb),
+        (GRAPHDB_ACTION, GRAPHDB_QUEUE, insert_chunk_batch_to_graphdb),
+    ):
+        batch_job = QueueJob(
+            user_id=file_metadata.get("user_id", ""),
+            status=JobStatus.QUEUED,
+            action=action,
+            parent_job_id=job_id,
+            root_job_id=root_job_id,
+            file_id=file_metadata.get("file_id", ""),
+            file_metadata=file_metadata,
+            page_range=page_range,
+        )
+        await batch_job.insert()
+        batch_job_id = str(batch_job.id)
+        await register_child_jobs(job_id, [batch_job_id], action, root_job_id)
+
+        await asyncio.to_thread(
+            get_queue(queue_name).enqueue,
+            func,
+            job_id=batch_job_id,
+            chunks=chunks,
+            file_metadata=file_metadata,
+            page_range=page_range,
+            chunk_ids=chunk_ids,
+            parent_job_id=job_id,
+            root_job_id=root_job_id,
+            job_timeout=1800,
+        )
+        enqueued.append(batch_job_id)
+    return enqueued
+
+
+# Shared across jobs on the worker's event loop
+webhook_dispatcher = WebhookDispatcher(
+    f"{NEXTJS_SERVICE_URL}/api/webhook/process-markdown"
+)
+
+
+async def send_markdown_to_webhook(
+    job_id: str,
+    page_range: tuple[int, int],
+    markdown_text: str,
+    file_metadata: dict[str, any],
+):
+    try:
+        await webhook_dispatcher.send(
+            {
+                "job_id": job_id,
+                "page_range": list(page_range),
+                "markdown_content": markdown_text,
+                "file_metadata": file_metadata,
+            }
+        )
+        logger.info(
+            f"Successfully sent markdown batch (pages {page_range}) to Next.js service"
+        )
+    except Exception as req_err:
+        logger.error(f"Failed to send markdown to Next.js: {req_err}")
+        raise Exception(f"Webhook failed: {req_err}")
+
 
 async def process_markdown_batch_async(
     job_id: str,
-    file_stream: BytesIO,
     page_range: tuple[int, int],
     file_metadata: dict[str, any],
+    parent_job_id: str | None = None,
+    blob_ref: str | None = None,
+    file_stream: BytesIO | None = None,
 ):
     """
     Convert PDF batch to markdown and send to Next.js service.
-    Next.js will handle Vector DB and Graph DB embedding.
+    Next.js will handle Vector DB and Graph DB embedding, unless EMBED_IN_WORKERS
+    is set, in which case the chunks go to the vectordb/graphdb batch jobs.
+    The batch PDF is read from the blob store via `blob_ref`; `file_stream` is
+    only accepted for jobs enqueued before staging was introduced.
     """
     await WorkerDB.ensure_connection()
     try:
@@ -33,30 +136,33 @@ async def process_markdown_batch_async(
         await update_job_status(job_id, JobStatus.STARTED, started_time=datetime.now())
 
         # Convert PDF pages to Markdown
-        markdown_text = convert_pdf_to_markdown(file_stream, page_range)
+        file_name = file_metadata.get("file_name")
+        if blob_ref:
+            async with open_blob(blob_ref) as pdf_bytes:
+                markdown_text = await convert_pdf_to_markdown_async(
+                    pdf_bytes, page_range, file_name=file_name
+                )
+        else:
+            markdown_text = await convert_pdf_to_markdown_async(
+                file_stream, page_range, file_name=file_name
+            )
         logger.info(
             f"Converted pages {page_range} to markdown ({len(markdown_text)} chars)"
         )
 
-        # Send markdown to Next.js webhook for Vector/Graph DB processing
-        try:
-            response = requests.post(
-                f"{NEXTJS_SERVICE_URL}/api/webhook/process-markdown",
-                json={
-                    "job_id": job_id,
-                    "page_range": list(page_range),
-                    "markdown_content": markdown_text,
-                    "file_metadata": file_metadata,
-                },
-                timeout=30,
+        if EMBED_IN_WORKERS:
+            chunks = get_text_splitter().split_text(markdown_text)
+            await enqueue_chunk_batch_jobs(
+                job_id, chunks, page_range, file_metadata, root_job_id=parent_job_id
             )
-            response.raise_for_status()
             logger.info(
-                f"Successfully sent markdown batch (pages {page_range}) to Next.js service"
+                f"Enqueued chunk batch jobs for {len(chunks)} chunks (pages {page_range})"
+            )
+        else:
+            # Send markdown to Next.js webhook for Vector/Graph DB processing
+            await send_markdown_to_webhook(
+                job_id, page_range, markdown_text, file_metadata
             )
-        except requests.exceptions.RequestException as req_err:
-            logger.error(f"Failed to send markdown to Next.js: {req_err}")
-            raise Exception(f"Webhook failed: {req_err}")
 
         # Update job status to FINISHED
         await update_job_status(
@@ -80,16 +186,20 @@ async def process_markdown_batch_async(
 # Sync wrapper for RQ compatibility
 def process_markdown_batch(
     job_id: str,
-    file_stream: BytesIO,
     page_range: tuple[int, int],
     file_metadata: dict[str, any],
+    parent_job_id: str | None = None,
+    blob_ref: str | None = None,
+    file_stream: BytesIO | None = None,
 ):
     """Sync wrapper to run async function in RQ worker."""
-    return asyncio.run(
+    return run_job(
         process_markdown_batch_async(
             job_id=job_id,
-            file_stream=file_stream,
             page_range=page_range,
             file_metadata=file_metadata,
+            parent_job_id=parent_job_id,
+            blob_ref=blob_ref,
+            file_stream=file_stream,
         )
     )
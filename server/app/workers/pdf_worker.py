@@ -1,4 +1,3 @@
-import fitz
 import asyncio
 from datetime import datetime
 from services.data_processing import (
@@ -6,16 +5,34 @@ from services.data_processing import (
     get_page_batches,
     get_batch_stream,
 )
+from services.blob_store import get_blob_store, stage_blob
 from core.logger import get_logger
+from workers.runtime import run_job
 from models.worker_db import WorkerDB
-from models.db_models import update_job_status, QueueJob, JobStatus
-from workers.queue import markdown_queue
+from models.db_models import (
+    update_job_status,
+    register_child_jobs,
+    QueueJob,
+    JobStatus,
+)
+from workers.queue import get_queue, MARKDOWN_QUEUE
 from workers.markdown_worker import process_markdown_batch
 
-
 logger = get_logger()
 
 
+def _open_pdf(file_stream):
+    import fitz
+
+    file_stream.seek(0)
+    return fitz.open(stream=file_stream, filetype="pdf")
+
+
+def _page_count(file_stream) -> int:
+    with _open_pdf(file_stream) as doc:
+        return doc.page_count
+
+
 # PDF Job Worker
 async def pdf_download_and_batch_async(
     job_id: str,
@@ -32,27 +49,22 @@ async def pdf_download_and_batch_async(
         # Update Job Status to STARTED
         await update_job_status(job_id, JobStatus.STARTED, started_time=datetime.now())
 
-        # Get File Bytes Stream
-        file_stream = get_file_bytes_stream(file_url)
+        # Get File Bytes Stream; download and PDF work run off the shared worker loop
+        file_stream = await asyncio.to_thread(get_file_bytes_stream, file_url)
         if not file_stream:
             raise Exception("Failed to get File byte stream")
         logger.info("Got file stream")
 
         # Get total pages
-        file_stream.seek(0)
-        with fitz.open(stream=file_stream, filetype="pdf") as doc:
-            total_pages = doc.page_count
+        total_pages = await asyncio.to_thread(_page_count, file_stream)
         logger.info(f"Total pages detected: {total_pages}")
 
-        child_job_ids = []
-
-        # Process PDF in batches
-        for page_range in get_page_batches(total_pages, batch_size):
-            logger.info(f"Processing batch: pages {page_range}")
-
-            batch_stream = get_batch_stream(file_stream, page_range)
+        page_ranges = list(get_page_batches(total_pages, batch_size))
 
-            markdown_job = QueueJob(
+        # Create all child jobs in one round trip, then count them on the parent
+        # before any of them can start
+        markdown_jobs = [
+            QueueJob(
                 user_id=user_id,
                 status=JobStatus.QUEUED,
                 action="markdown_conversion",
@@ -61,23 +73,40 @@ async def pdf_download_and_batch_async(
                 file_metadata=file_metadata,
                 page_range=page_range,
             )
-            await markdown_job.insert()
-            child_job_ids.append(str(markdown_job.id))
-
-            # Enqueue markdown job with batch stream
-            markdown_queue.enqueue(
-                process_markdown_batch,
-                job_id=str(markdown_job.id),
-                file_stream=batch_stream,
-                page_range=page_range,
-                file_metadata=file_metadata,
-                job_timeout=600,
-            )
-            logger.info(f"Enqueued markdown job for pages {page_range}")
-        # Update Parent Job with the child IDs
-        parent_job = await QueueJob.get(job_id)
-        parent_job.child_job_ids = child_job_ids
-        await parent_job.save()
+            for page_range in page_ranges
+        ]
+        child_job_ids = []
+        if markdown_jobs:
+            result = await QueueJob.insert_many(markdown_jobs)
+            child_job_ids = [str(inserted_id) for inserted_id in result.inserted_ids]
+            await register_child_jobs(job_id, child_job_ids, "markdown_conversion")
+
+        # Drop page batches staged by jobs that finished long ago
+        await get_blob_store().prune()
+
+        # Process PDF in batches
+        doc = await asyncio.to_thread(_open_pdf, file_stream)
+        with doc:
+            for markdown_job_id, page_range in zip(child_job_ids, page_ranges):
+                logger.info(f"Processing batch: pages {page_range}")
+
+                # Stage the batch PDF once; the job payload only carries its reference
+                batch_stream = await asyncio.to_thread(
+                    get_batch_stream, doc, page_range
+                )
+                blob_ref = await stage_blob(batch_stream.getvalue())
+
+                await asyncio.to_thread(
+                    get_queue(MARKDOWN_QUEUE).enqueue,
+                    process_markdown_batch,
+                    job_id=markdown_job_id,
+                    blob_ref=blob_ref,
+                    page_range=page_range,
+                    file_metadata=file_metadata,
+                    parent_job_id=job_id,
+                    job_timeout=600,
+                )
+                logger.info(f"Enqueued markdown job for pages {page_range}")
 
         # Update Job Status to FINISHED
         await update_job_status(
@@ -108,7 +137,7 @@ def pdf_download_and_batch(
     file_metadata: dict,
     batch_size: int = 2,
 ):
-    return asyncio.run(
+    return run_job(
         pdf_download_and_batch_async(
             job_id, user_id, file_id, file_url, file_metadata, batch_size
         )
@@ -1,22 +1,26 @@
 import asyncio
-import json
+import os
 from datetime import datetime
-from workers.queue import redis_conn
-from services.vector_db import query_vector_store
-from services.llm_models import gemini_model, mistal_model
+from workers.queue import get_async_redis
+from services.token_stream import TokenChannel
+from services.summary_tree import route_query, search_routed
+from services.hits import to_hits, build_hit_context
+from services.chunk_store import expand_hits
+from services.model_router import get_model_router, preferred_model_name
 from models.db_models import update_job_status, JobStatus
 from core.logger import get_logger
+from workers.runtime import run_job
 from models.worker_db import WorkerDB
 
-
 logger = get_logger()
 
 
-def publish(job_id: str, event: str, data: dict | str | None = None):
-    payload = {"event": event}
-    if data is not None:
-        payload["data"] = data
-    redis_conn.publish(job_id, json.dumps(payload))
+# Also append frames to a Redis Stream so late subscribers can catch up
+TOKEN_STREAM_BACKLOG = os.getenv("TOKEN_STREAM_BACKLOG", "true").lower() == "true"
+
+
+def token_stream_key(job_id: str) -> str:
+    return f"{job_id}:frames"
 
 
 async def process_query_async(
@@ -24,118 +28,67 @@ async def process_query_async(
     query: str,
     model: str = "gemini",
     top_k: int = 5,
+    scope: str = "auto",
 ):
     await WorkerDB.ensure_connection()
+    channel = TokenChannel(
+        get_async_redis(),
+        job_id,
+        stream_key=token_stream_key(job_id) if TOKEN_STREAM_BACKLOG else None,
+    )
+    try:
+        await _process_query(channel, job_id, query, model, top_k, scope)
+    finally:
+        await channel.aclose()
+
+
+async def _process_query(
+    channel: TokenChannel,
+    job_id: str,
+    query: str,
+    model: str,
+    top_k: int,
+    scope: str = "auto",
+):
     try:
         logger.info(f"Starting Query Processing for Job: {job_id}")
         await update_job_status(job_id, JobStatus.STARTED, started_time=datetime.now())
 
-        publish(job_id, "status", "Job started")
-        await asyncio.sleep(0)
+        await channel.publish("status", "Job started")
 
         # Vector search (skip GraphDB)
-        publish(job_id, "status", "Searching vectorDB")
-        results = query_vector_store(query, top_k=top_k)
-        # Normalize results to a list of records
-        if isinstance(results, dict):
-            records = results.get("records") or results.get("matches") or []
-        else:
-            records = getattr(results, "records", None) or getattr(
-                results, "matches", []
-            )
-
-        references: list[dict] = []
-        contexts: list[str] = []
-        for rec in records:
-            meta = rec
-            text = rec.get("text") or rec.get("values") or ""
-            file_id = meta.get("file_id")
-            file_name = meta.get("file_name")
-            file_url = meta.get("file_url")
-            page_range = meta.get("page_range")
-            chunk_id = meta.get("chunk_id")
-            # Normalize page range
-            page_tuple = None
-            try:
-                if isinstance(page_range, str) and "_" in page_range:
-                    s, e = page_range.split("_", 1)
-                    page_tuple = (int(s), int(e))
-                elif isinstance(page_range, (list, tuple)) and len(page_range) == 2:
-                    page_tuple = (int(page_range[0]), int(page_range[1]))
-            except Exception:
-                page_tuple = None
-
-            references.append(
-                {
-                    "file_id": file_id,
-                    "file_name": file_name,
-                    "file_url": file_url,
-                    "page_range": page_tuple,
-                    "chunk_id": chunk_id,
-                }
-            )
-            if text:
-                contexts.append(text)
+        await channel.publish("status", "Searching vectorDB")
+        # Routed like /query: batched with concurrent searches, at the
+        # summary level the question calls for
+        vector_results, _ = await search_routed(query, route_query(query, scope, top_k))
+        # Chunk-store reads run off the shared worker loop
+        hits = await asyncio.to_thread(expand_hits, to_hits(vector_results))
+        references = [hit.reference() for hit in hits]
 
-        publish(job_id, "references", references)
-        publish(job_id, "status", "Finished searching vectorDB")
+        await channel.publish("references", references)
+        await channel.publish("status", "Finished searching vectorDB")
 
         # LLM generation
-        publish(job_id, "status", "Generating LLM response")
-        model_obj = (
-            gemini_model
-            if (model or "gemini").lower().startswith("gem")
-            else mistal_model
-        )
+        await channel.publish("status", "Generating LLM response")
         system_prompt = (
             "You are a helpful medical assistant. Use the provided context to answer the question. "
             "Cite the references by file_name and page_range when relevant. If unsure, say you don't know."
         )
-        context_blob = "\n\n---\n\n".join(contexts[:top_k])
+        context_blob = build_hit_context([hit for hit in hits[:top_k] if hit.text])
         user_prompt = f"Question: {query}\n\nContext:\n{context_blob}"
 
-        # Try async streaming if available, else run sync in a thread
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt},
+        ]
         try:
-            if hasattr(model_obj, "astream"):
-                async for chunk in model_obj.astream(
-                    [
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": user_prompt},
-                    ]
-                ):
-                    content = getattr(chunk, "content", None) or str(chunk)
-                    publish(job_id, "token", content)
-                    await asyncio.sleep(0)
-            elif hasattr(model_obj, "stream"):
-
-                def _run_stream():
-                    for chunk in model_obj.stream(
-                        [
-                            {"role": "system", "content": system_prompt},
-                            {"role": "user", "content": user_prompt},
-                        ]
-                    ):
-                        content = getattr(chunk, "content", None) or str(chunk)
-                        publish(job_id, "token", content)
-
-                await asyncio.to_thread(_run_stream)
-            else:
-                # Non-streaming fallback: invoke then chunk
-                def _invoke():
-                    resp = model_obj.invoke(
-                        [
-                            {"role": "system", "content": system_prompt},
-                            {"role": "user", "content": user_prompt},
-                        ]
-                    )
-                    return getattr(resp, "content", None) or str(resp)
-
-                content = await asyncio.to_thread(_invoke)
-                for i in range(0, len(content), 512):
-                    publish(job_id, "token", content[i : i + 512])
-                    await asyncio.sleep(0)
+            answer = get_model_router().stream(
+                messages, preferred=preferred_model_name(model)
+            )
+            async for content in answer:
+                await channel.token(content)
         except Exception as e:
-            publish(job_id, "error", str(e))
+            await channel.publish("error", str(e))
             await update_job_status(
                 job_id,
                 JobStatus.FAILED,
@@ -144,14 +97,14 @@ async def process_query_async(
             )
             return
 
-        publish(job_id, "done", {})
+        await channel.publish("done", {"model": answer.model})
         await update_job_status(
             job_id, JobStatus.FINISHED, completed_time=datetime.now()
         )
         logger.info(f"Query processing completed for Job: {job_id}")
     except Exception as e:
         logger.error(f"Error in Query worker for job {job_id}: {e}")
-        publish(job_id, "error", str(e))
+        await channel.publish("error", str(e))
         await update_job_status(
             job_id,
             JobStatus.FAILED,
@@ -166,8 +119,11 @@ def process_query(
     query: str,
     model: str = "gemini",
     top_k: int = 5,
+    scope: str = "auto",
 ):
     """Sync wrapper for RQ compatibility."""
-    return asyncio.run(
-        process_query_async(job_id=job_id, query=query, model=model, top_k=top_k)
+    return run_job(
+        process_query_async(
+            job_id=job_id, query=query, model=model, top_k=top_k, scope=scope
+        )
     )
@@ -1,7 +1,14 @@
 import os
-import redis
-from rq import Queue
+import asyncio
+import weakref
+from typing import TYPE_CHECKING
 from dotenv import load_dotenv
+from core.registry import registry
+
+if TYPE_CHECKING:
+    import redis
+    import redis.asyncio
+    from rq import Queue
 
 load_dotenv()
 
@@ -9,26 +16,92 @@ redis_conn_host = os.getenv("REDIS_HOST")
 redis_conn_port = os.getenv("REDIS_PORT")
 redis_conn_pass = os.getenv("REDIS_PASSWORD")
 
-if not redis_conn_host or not redis_conn_port:
-    raise Exception("REDIS env variables not found")
-
-redis_conn = redis.Redis(
-    host=redis_conn_host,
-    port=int(redis_conn_port),
-    password=redis_conn_pass,
-    decode_responses=True,
-)
-
-pdf_queue = Queue("pdf-jobs", connection=redis_conn)
-markdown_queue = Queue("markdown-jobs", connection=redis_conn)
-vectorDB_queue = Queue("vectordb-jobs", connection=redis_conn)
-graphDB_queue = Queue("graphdb-jobs", connection=redis_conn)
-query_queue = Queue("queries", connection=redis_conn)
-
-
-print("Queues initialized successfully:")
-print(f" - {pdf_queue.name}")
-print(f" - {markdown_queue.name}")
-print(f" - {vectorDB_queue.name}")
-print(f" - {graphDB_queue.name}")
-print(f" - {query_queue.name}")
+PDF_QUEUE = "pdf-jobs"
+MARKDOWN_QUEUE = "markdown-jobs"
+VECTORDB_QUEUE = "vectordb-jobs"
+GRAPHDB_QUEUE = "graphdb-jobs"
+QUERY_QUEUE = "queries"
+
+# Names the queues used to be exported under, resolved lazily by __getattr__
+_LEGACY_QUEUE_NAMES = {
+    "pdf_queue": PDF_QUEUE,
+    "markdown_queue": MARKDOWN_QUEUE,
+    "vectorDB_queue": VECTORDB_QUEUE,
+    "graphDB_queue": GRAPHDB_QUEUE,
+    "query_queue": QUERY_QUEUE,
+}
+
+
+def _redis_kwargs() -> dict:
+    if not redis_conn_host or not redis_conn_port:
+        raise Exception("REDIS env variables not found")
+    return {
+        "host": redis_conn_host,
+        "port": int(redis_conn_port),
+        "password": redis_conn_pass,
+    }
+
+
+def _connect_redis():
+    import redis
+
+    return redis.Redis(**_redis_kwargs(), decode_responses=True)
+
+
+def _connect_rq():
+    import redis
+
+    # RQ stores pickled payloads, so queues need a connection without decoding
+    return redis.Redis(**_redis_kwargs())
+
+
+registry.register("redis_conn", _connect_redis)
+registry.register("rq_conn", _connect_rq)
+
+
+def get_redis_conn() -> "redis.Redis":
+    return registry.get("redis_conn")
+
+
+def get_rq_conn() -> "redis.Redis":
+    return registry.get("rq_conn")
+
+
+def get_queue(name: str) -> "Queue":
+    key = f"queue:{name}"
+    if not registry.is_loaded(key):
+
+        def build():
+            from rq import Queue
+
+            queue = Queue(name, connection=get_rq_conn())
+            print(f"Queue initialized: {queue.name}")
+            return queue
+
+        registry.register(key, build)
+    return registry.get(key)
+
+
+# Async client for pub/sub streaming; one per event loop it is used on
+_async_redis: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+
+def get_async_redis() -> "redis.asyncio.Redis":
+    loop = asyncio.get_running_loop()
+    if loop not in _async_redis:
+        import redis.asyncio
+
+        _async_redis[loop] = redis.asyncio.Redis(
+            **_redis_kwargs(), decode_responses=True
+        )
+    return _async_redis[loop]
+
+
+def __getattr__(name: str):
+    if name in _LEGACY_QUEUE_NAMES:
+        return get_queue(_LEGACY_QUEUE_NAMES[name])
+    if name == "redis_conn":
+        return get_redis_conn()
+    if name == "rq_conn":
+        return get_rq_conn()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,280 @@
+import asyncio
+import atexit
+import os
+import socket
+import threading
+import time
+import traceback
+from contextlib import suppress
+from concurrent.futures import Future, ThreadPoolExecutor
+from rq import Queue
+from rq.defaults import DEFAULT_RESULT_TTL
+from rq.exceptions import DequeueTimeout
+from rq.executions import Execution
+from rq.job import JobStatus as RQJobStatus
+from rq.utils import now
+from models.job_status import job_status_buffer, run_and_flush
+from models.worker_db import WorkerDB
+from core.logger import get_logger
+from core.metrics import metrics
+
+logger = get_logger()
+
+DEQUEUE_TIMEOUT_SECONDS = 5
+DEFAULT_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", "8"))
+# StartedJobRegistry entries outlive the job timeout by this much; past that,
+# RQ's registry cleanup moves a job whose process died to the failed registry
+STARTED_TTL_GRACE_SECONDS = 60
+DEFAULT_JOB_TIMEOUT_SECONDS = 180
+# A slot whose Redis calls fail waits this long, doubling up to the max
+SLOT_RETRY_SECONDS = 1
+SLOT_RETRY_MAX_SECONDS = 30
+
+
+class AsyncRuntime:
+    """
+    One long-lived event loop per worker process, running in a background thread.
+    Jobs submitted from any thread share the loop, so loop-bound clients such as
+    Motor stay valid across jobs instead of dying with a per-job `asyncio.run`.
+    """
+
+    def __init__(self):
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._thread: threading.Thread | None = None
+        self._pid: int | None = None
+        self._lock = threading.Lock()
+        # Set by `serve`: the process outlives its jobs, so status buffers are
+        # flushed periodically instead of after every job
+        self.persistent = False
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            # A forked RQ work-horse inherits a loop whose thread does not exist
+            if self._loop is None or self._pid != os.getpid():
+                self._start()
+            return self._loop
+
+    def _start(self):
+        loop = asyncio.new_event_loop()
+        thread = threading.Thread(
+            target=self._run_loop, args=(loop,), name="async-runtime", daemon=True
+        )
+        thread.start()
+        self._loop, self._thread, self._pid = loop, thread, os.getpid()
+
+    @staticmethod
+    def _run_loop(loop: asyncio.AbstractEventLoop):
+        asyncio.set_event_loop(loop)
+        loop.run_forever()
+
+    def submit(self, coro) -> Future:
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro):
+        """Run a coroutine on the runtime loop and block until it finishes."""
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("AsyncRuntime.run called from the runtime loop")
+        return self.submit(coro).result()
+
+    def shutdown(self, timeout: float = 10):
+        if self._loop is None or self._pid != os.getpid():
+            return
+        try:
+            self.submit(job_status_buffer.stop()).result(timeout=timeout)
+        except Exception as e:
+            logger.error(f"Failed to flush job statuses on shutdown: {e}")
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=timeout)
+        self._loop = None
+
+
+runtime = AsyncRuntime()
+atexit.register(runtime.shutdown)
+
+
+def run_job(coro):
+    """Entry point for RQ sync wrappers: run a job coroutine on the process runtime."""
+    if runtime.persistent:
+        return runtime.run(coro)
+    # Forking workers exit right after the job, so flush before returning
+    return runtime.run(run_and_flush(coro))
+
+
+def _async_entrypoints() -> dict:
+    # Imported lazily: the worker modules import this one for `run_job`
+    from workers import (
+        graphdb_worker,
+        markdown_worker,
+        pdf_worker,
+        query_worker,
+        vectordb_worker,
+    )
+
+    entrypoints = {
+        pdf_worker.pdf_download_and_batch: pdf_worker.pdf_download_and_batch_async,
+        markdown_worker.process_markdown_batch: markdown_worker.process_markdown_batch_async,
+        vectordb_worker.insert_chunks_to_vectordb: vectordb_worker.insert_chunks_to_vectordb_async,
+        graphdb_worker.insert_chunks_to_graphdb: graphdb_worker.insert_chunks_to_graphdb_async,
+        vectordb_worker.insert_chunk_batch_to_vectordb: vectordb_worker.insert_chunk_batch_to_vectordb_async,
+        graphdb_worker.insert_chunk_batch_to_graphdb: graphdb_worker.insert_chunk_batch_to_graphdb_async,
+        query_worker.process_query: query_worker.process_query_async,
+        graphdb_worker.rebuild_graph_communities: graphdb_worker.rebuild_graph_communities_async,
+        graphdb_worker.rebuild_graph_snapshot: graphdb_worker.rebuild_graph_snapshot_async,
+    }
+    return {
+        f"{func.__module__}.{func.__name__}": async_func
+        for func, async_func in entrypoints.items()
+    }
+
+
+class AsyncWorker:
+    """
+    RQ consumer that runs up to `concurrency` jobs at once on the runtime loop.
+    Known entry points are awaited directly as coroutines; any other job runs
+    its sync function in a thread.
+    """
+
+    def __init__(self, queue_names: list[str], concurrency: int = DEFAULT_CONCURRENCY):
+        from workers.queue import get_queue
+
+        self.queues = [get_queue(name) for name in queue_names]
+        self.concurrency = concurrency
+        self.entrypoints = _async_entrypoints()
+        self.name = f"async-{socket.gethostname()}-{os.getpid()}"
+        # Blocking Redis calls (dequeue, RQ bookkeeping) stay off the loop
+        self._executor = ThreadPoolExecutor(
+            max_workers=concurrency * 2, thread_name_prefix="rq-io"
+        )
+        self._stopping: asyncio.Event | None = None
+
+    def stop(self):
+        if self._stopping is not None:
+            runtime.loop.call_soon_threadsafe(self._stopping.set)
+
+    async def _io(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, lambda: func(*args, **kwargs))
+
+    async def _dequeue(self):
+        try:
+            return await self._io(
+                Queue.dequeue_any,
+                self.queues,
+                DEQUEUE_TIMEOUT_SECONDS,
+                connection=self.queues[0].connection,
+            )
+        except DequeueTimeout:
+            return None
+
+    def _start_execution(self, job, queue) -> Execution:
+        # What rq.Worker does before running a job: mark it STARTED and add an
+        # execution to the StartedJobRegistry, so a crash doesn't lose it
+        timeout = job.timeout if job.timeout and job.timeout > 0 else None
+        ttl = (timeout or DEFAULT_JOB_TIMEOUT_SECONDS) + STARTED_TTL_GRACE_SECONDS
+        with queue.connection.pipeline() as pipeline:
+            job.prepare_for_execution(self.name, pipeline=pipeline)
+            execution = Execution.create(
+                job, ttl, pipeline=pipeline, worker_name=self.name
+            )
+            pipeline.execute()
+        return execution
+
+    def _end_execution(
+        self,
+        job,
+        queue,
+        execution: Execution,
+        result=None,
+        exc_string: str | None = None,
+    ):
+        # What rq.Worker.handle_job_success/handle_job_failure do: save the
+        # result and expire the job hash after result_ttl, or keep it in the
+        # FailedJobRegistry for failure_ttl
+        job.ended_at = now()
+        execution_info = {
+            "worker_name": self.name,
+            "execution_id": execution.id,
+            "execution_started_at": execution.created_at,
+            "execution_ended_at": job.ended_at,
+        }
+        with queue.connection.pipeline() as pipeline:
+            execution.delete(job, pipeline=pipeline)
+            if exc_string is None:
+                job._result = result
+                result_ttl = job.get_result_ttl(DEFAULT_RESULT_TTL)
+                if result_ttl != 0:
+                    job._handle_success(result_ttl, pipeline=pipeline, **execution_info)
+                job.cleanup(result_ttl, pipeline=pipeline, remove_from_queue=False)
+            else:
+                job.set_status(RQJobStatus.FAILED, pipeline=pipeline)
+                job._handle_failure(exc_string, pipeline=pipeline, **execution_info)
+            pipeline.execute()
+
+    async def _perform(self, job, queue):
+        execution = await self._io(self._start_execution, job, queue)
+        job_name = job.func_name.rsplit(".", 1)[-1]
+        started = time.perf_counter()
+        status = "finished"
+        try:
+            async_func = self.entrypoints.get(job.func_name)
+            if async_func:
+                coro = async_func(*job.args, **job.kwargs)
+            else:
+                coro = self._io(job.perform)
+            timeout = job.timeout if job.timeout and job.timeout > 0 else None
+            result = await asyncio.wait_for(coro, timeout=timeout)
+        except Exception:
+            status = "failed"
+            exc_string = traceback.format_exc()
+            logger.error(f"Job {job.id} from {queue.name} failed:\n{exc_string}")
+            await self._io(
+                self._end_execution, job, queue, execution, exc_string=exc_string
+            )
+        else:
+            await self._io(self._end_execution, job, queue, execution, result)
+        finally:
+            metrics.histogram(
+                "worker_job_duration_seconds",
+                {"job": job_name},
+                help="Queued job run time",
+            ).observe(time.perf_counter() - started)
+            metrics.counter(
+                "worker_jobs_total",
+                {"job": job_name, "status": status},
+                help="Queued jobs by outcome",
+            ).inc()
+
+    async def _slot(self):
+        backoff = SLOT_RETRY_SECONDS
+        while not self._stopping.is_set():
+            try:
+                result = await self._dequeue()
+                if result is not None:
+                    job, queue = result
+                    await self._perform(job, queue)
+                backoff = SLOT_RETRY_SECONDS
+            except Exception as e:
+                # A Redis blip must not end the slot for good
+                logger.error(f"Worker slot error, retrying in {backoff}s: {e}")
+                with suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self._stopping.wait(), timeout=backoff)
+                backoff = min(backoff * 2, SLOT_RETRY_MAX_SECONDS)
+
+    async def serve(self):
+        self._stopping = asyncio.Event()
+        # Warm the pooled clients once; every job on this loop reuses them
+        await WorkerDB.ensure_all_connections()
+        job_status_buffer.start()
+
+        logger.info(
+            f"Async worker listening on {[q.name for q in self.queues]} "
+            f"with concurrency {self.concurrency}"
+        )
+        slots = [asyncio.create_task(self._slot()) for _ in range(self.concurrency)]
+        await self._stopping.wait()
+
+        # Let in-flight jobs finish; idle slots exit after their dequeue timeout
+        await asyncio.gather(*slots, return_exceptions=True)
+        await job_status_buffer.stop()
+        self._executor.shutdown(wait=False)
@@ -1,12 +1,16 @@
 import asyncio
 from datetime import datetime
-from services.vector_db import insert_text_chunk
-from models.db_models import update_job_status, JobStatus
+from services.vector_db import insert_text_chunk, insert_text_chunks
+from models.db_models import JobStatus, build_chunk_results
+from models.job_status import job_status_buffer
 from models.worker_db import WorkerDB
 from core.logger import get_logger
+from workers.runtime import run_job
 
 logger = get_logger()
 
+ACTION = "vectorDB"
+
 
 async def insert_chunks_to_vectordb_async(
     job_id: str,
@@ -14,43 +18,52 @@ async def insert_chunks_to_vectordb_async(
     file_metadata: dict[str, any],
     page_range: tuple[int, int],
     chunk_id: int,
+    parent_job_id: str | None = None,
+    root_job_id: str | None = None,
 ):
     await WorkerDB.ensure_connection()
     WorkerDB.ensure_vector_db_connection()
+    lineage = dict(action=ACTION, parent_job_id=parent_job_id, root_job_id=root_job_id)
+    previous_status = None
+    start_time = datetime.now()
     try:
         logger.info(f"Inserting Chunks in Range: {page_range}")
 
-        # Update job status to STARTED
-        await update_job_status(job_id, JobStatus.STARTED, started_time=datetime.now())
+        # Mark STARTED from the stored status; an RQ retry starts from FAILED
+        await job_status_buffer.record_started(job_id, start_time, **lineage)
+        previous_status = JobStatus.STARTED
 
         # Update Metadata
         metadata = dict(file_metadata)
         metadata["page_range"] = page_range
         metadata["chunk_id"] = chunk_id
 
-        # Insert Chunks to VectorDB
-        start_time = datetime.now()
-        insert_text_chunk(chunk_text, metadata)
+        # Insert Chunks to VectorDB; the blocking upsert runs off the shared worker loop
+        await asyncio.to_thread(insert_text_chunk, chunk_text, metadata)
         completed_time = datetime.now()
 
         logger.info(f"Embedded chunk {chunk_id} from pages {page_range}")
 
         # Update Job Status to FINISHED
-        await update_job_status(
+        await job_status_buffer.record(
             job_id,
             status=JobStatus.FINISHED,
             started_time=start_time,
             completed_time=completed_time,
+            previous_status=previous_status,
+            **lineage,
         )
 
     except Exception as e:
         logger.error(f"Error is vectorDB worker: {e}")
-        await update_job_status(
+        await job_status_buffer.record(
             job_id,
             JobStatus.FAILED,
-            completed_time=completed_time,
+            completed_time=datetime.now(),
             started_time=start_time,
             error_message=str(e),
+            previous_status=previous_status,
+            **lineage,
         )
         raise e
 
@@ -61,13 +74,105 @@ def insert_chunks_to_vectordb(
     file_metadata: dict[str, any],
     page_range: tuple[int, int],
     chunk_id: int,
+    parent_job_id: str | None = None,
+    root_job_id: str | None = None,
 ):
-    return asyncio.run(
+    return run_job(
         insert_chunks_to_vectordb_async(
             job_id,
             chunk_text,
             file_metadata,
             page_range,
             chunk_id,
+            parent_job_id,
+            root_job_id,
+        )
+    )
+
+
+async def insert_chunk_batch_to_vectordb_async(
+    job_id: str,
+    chunks: list[str],
+    file_metadata: dict[str, any],
+    page_range: tuple[int, int],
+    chunk_ids: list[int] | None = None,
+    parent_job_id: str | None = None,
+    root_job_id: str | None = None,
+):
+    """Upsert a whole markdown batch's chunks in bulk, tracking each chunk on one job."""
+    await WorkerDB.ensure_connection()
+    WorkerDB.ensure_vector_db_connection()
+    lineage = dict(action=ACTION, parent_job_id=parent_job_id, root_job_id=root_job_id)
+    previous_status = None
+    chunk_ids = chunk_ids or list(range(len(chunks)))
+    start_time = datetime.now()
+    try:
+        logger.info(f"Inserting {len(chunks)} chunks in range: {page_range}")
+
+        # Mark STARTED from the stored status; an RQ retry starts from FAILED
+        await job_status_buffer.record_started(job_id, start_time, **lineage)
+        previous_status = JobStatus.STARTED
+
+        metadatas = [
+            {**file_metadata, "page_range": page_range, "chunk_id": chunk_id}
+            for chunk_id in chunk_ids
+        ]
+        # Blocking Pinecone calls run off the shared worker loop
+        errors = await asyncio.to_thread(insert_text_chunks, chunks, metadatas)
+        chunk_results = build_chunk_results(chunk_ids, errors)
+
+        failed = sum(1 for error in errors if error)
+        if chunks and failed == len(chunks):
+            raise Exception(f"All {failed} chunks failed: {errors[0]}")
+
+        logger.info(
+            f"Embedded {len(chunks) - failed}/{len(chunks)} chunks from pages {page_range}"
+        )
+
+        await job_status_buffer.record(
+            job_id,
+            JobStatus.FINISHED,
+            started_time=start_time,
+            completed_time=datetime.now(),
+            error_message=(
+                f"{failed} of {len(chunks)} chunks failed" if failed else None
+            ),
+            chunk_results=chunk_results,
+            previous_status=previous_status,
+            **lineage,
+        )
+
+    except Exception as e:
+        logger.error(f"Error in vectorDB batch worker: {e}")
+        await job_status_buffer.record(
+            job_id,
+            JobStatus.FAILED,
+            started_time=start_time,
+            completed_time=datetime.now(),
+            error_message=str(e),
+            previous_status=previous_status,
+            **lineage,
+        )
+        raise e
+
+
+def insert_chunk_batch_to_vectordb(
+    job_id: str,
+    chunks: list[str],
+    file_metadata: dict[str, any],
+    page_range: tuple[int, int],
+    chunk_ids: list[int] | None = None,
+    parent_job_id: str | None = None,
+    root_job_id: str | None = None,
+):
+    return run_job(
+        insert_chunk_batch_to_vectordb_async(
+            job_id,
+            chunks,
+            file_metadata,
+            page_range,
+            chunk_ids,
+            parent_job_id,
+            root_job_id,
         )
     )